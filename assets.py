@@ -0,0 +1,145 @@
+"""
+
+Images for the game, decoded once in the background and kept ready to blit.
+
+Decoding (png / webp) does not need a display, so it starts on a worker
+thread as soon as a screen's images are asked for. Converting to the display
+format does need one, that happens on the first get() after set_mode() and
+the result is cached along with any scaled copies.
+
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+# the images each screen needs, screens are loaded lazily as they are entered
+SCREENS = {
+    "race": ["track.png", "car.png", "econobox.png", "rally.png", "cardinal.png"],
+    "title": ["dragster.webp"],
+    "menu": ["menu-art.webp", "menu-art-2.webp", "menu-art-3.webp"],
+    "shop": ["upgrade-shop.webp"],
+}
+
+
+class AssetManager:
+
+    def __init__(self, base_dir: str | None = None):
+        if base_dir is None:
+            base_dir = os.path.dirname(os.path.abspath(__file__))
+        self.base_dir = base_dir
+
+        self.decode_times = {}
+
+        self._loader = ThreadPoolExecutor(max_workers=1)
+        self._decoded = {}
+        self._converted = {}
+        self._scaled = {}
+
+    def _decode(self, name: str) -> pygame.Surface:
+        start = time.perf_counter()
+        surface = pygame.image.load(os.path.join(self.base_dir, name))
+        self.decode_times[name] = time.perf_counter() - start
+        return surface
+
+    def preload(self, names: list[str]):
+        # queue images for decoding, returns immediately
+        for name in names:
+            if name not in self._decoded:
+                self._decoded[name] = self._loader.submit(self._decode, name)
+
+    def preload_screen(self, screen: str):
+        self.preload(SCREENS[screen])
+
+    def ready(self, screen: str) -> bool:
+        # True once every image of a screen has been decoded
+        return all(
+            name in self._decoded and self._decoded[name].done()
+            for name in SCREENS[screen]
+        )
+
+    def get(self, name: str, size: tuple | None = None) -> pygame.Surface:
+        """
+        The image in display format, optionally scaled to size (w, h).
+
+        Blocks if the image is still being decoded, decodes it right away if
+        it was never preloaded. Needs the display mode to be set.
+        """
+
+        if name not in self._converted:
+            self.preload([name])
+            surface = self._decoded[name].result()
+
+            if surface.get_flags() & pygame.SRCALPHA:
+                surface = surface.convert_alpha()
+            else:
+                surface = surface.convert()
+
+            self._converted[name] = surface
+
+        if size is None:
+            return self._converted[name]
+
+        key = (name, size)
+        if key not in self._scaled:
+            self._scaled[key] = pygame.transform.smoothscale(
+                self._converted[name], size
+            )
+        return self._scaled[key]
+
+    def load_screen(self, screen: str) -> dict:
+        # everything a screen needs, converted and ready
+        self.preload_screen(screen)
+        return {name: self.get(name) for name in SCREENS[screen]}
+
+    def unload_screen(self, screen: str):
+        # drop a screen's images (and scaled copies) that no other screen uses
+        keep = {
+            name
+            for other, names in SCREENS.items()
+            if other != screen
+            for name in names
+        }
+        for name in SCREENS[screen]:
+            if name in keep:
+                continue
+            self._decoded.pop(name, None)
+            self._converted.pop(name, None)
+            for key in [key for key in self._scaled if key[0] == name]:
+                del self._scaled[key]
+
+    def shutdown(self):
+        self._loader.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    pygame.init()
+
+    assets = AssetManager()
+
+    start = time.perf_counter()
+    for screen in SCREENS:
+        assets.preload_screen(screen)
+    queued = time.perf_counter() - start
+
+    pygame.display.set_mode((1280, 720))
+
+    start = time.perf_counter()
+    race_assets = assets.load_screen("race")
+    race_ready = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for screen in SCREENS:
+        assets.load_screen(screen)
+    all_ready = time.perf_counter() - start
+
+    print(f"queue all screens:   {queued * 1000:.2f} ms")
+    print(f"race screen ready:   {race_ready * 1000:.2f} ms")
+    print(f"all screens ready:   {all_ready * 1000:.2f} ms")
+    for name, elapsed in assets.decode_times.items():
+        print(f"  decode {name:<20} {elapsed * 1000:.2f} ms")
+
+    assets.shutdown()
+    pygame.quit()
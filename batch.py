@@ -0,0 +1,327 @@
+"""
+
+Headless batch runs, split across as many machines as you have.
+
+A job is a json file: cars, variants of them, distances and conditions.
+Every combination of car x variant x condition is a task with a fixed index,
+so the same job always splits the same way.
+
+    {
+        "cars": ["puffin", "cardinal"],
+        "variants": {"weight_lbs": [2000, 2500], "transmission.final_drive": [3.5, 4.1]},
+        "distances": [0.25, 1.0],
+        "conditions": [{"air_density": 1.225}, {"air_density": 1.1}]
+    }
+
+Variants are dotted paths into the car config (list items by number, like
+transmission.forward_gears.0), every combination of their values is run.
+Conditions override top level config values for the whole pass.
+
+Two ways to spread a job out:
+
+static shards   every node runs `batch.py run job.json --shard i/N --out DIR`
+                and takes every N-th task starting at i
+work queue      `batch.py queue init job.json DIR` once, then any number of
+                `batch.py queue work DIR` on any nodes that share DIR. Work
+                is split in chunks and a node claims a chunk by creating its
+                lock file with O_EXCL, which only one node can do. A lock
+                older than --stale seconds without a result is taken over
+                (if its node was only slow the chunk runs twice, merge keeps
+                one copy).
+
+Either way every shard / chunk writes its own jsonl file, `batch.py merge`
+puts them back together into one report.
+
+"""
+
+import argparse
+import itertools
+import json
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cars
+import race
+
+EXAMPLE = {
+    "cars": ["puffin", "blue_jay", "cardinal"],
+    "variants": {
+        "weight_lbs": [2000, 2400, 2800],
+        "transmission.final_drive": [3.5, 4.1, 4.7],
+    },
+    "distances": [0.25, 1.0],
+    "conditions": [{"air_density": 1.225}, {"air_density": 1.1}],
+}
+
+
+def _path(dotted: str) -> tuple:
+    return tuple(int(key) if key.isdigit() else key for key in dotted.split("."))
+
+
+def tasks(job: dict) -> list:
+    # every (car, variant, conditions) of a job, always in the same order
+    variants = job.get("variants", {})
+    names = list(variants)
+    combinations = list(itertools.product(*(variants[name] for name in names)))
+    conditions = job.get("conditions") or [{}]
+
+    return [
+        (car, dict(zip(names, values)), condition)
+        for car in job["cars"]
+        for values in combinations
+        for condition in conditions
+    ]
+
+
+def run_task(index: int, task: tuple, distances: list) -> dict:
+    car, variant, condition = task
+    config = cars.get_config(car)
+    config = cars.with_values(config, {_path(name): v for name, v in variant.items()})
+    config.update(condition)
+
+    # one pass out to the furthest distance, timed at each on the way
+    times = race.evaluate(config, list(distances))
+    results = {str(distance): times[distance] for distance in sorted(distances)}
+
+    return {
+        "task": index,
+        "car": car if isinstance(car, str) else cars.config_key(car)[:8],
+        "variant": variant,
+        "conditions": condition,
+        "results": results,
+    }
+
+
+def _run_many(pool: ProcessPoolExecutor, indexes: list, job: dict) -> list:
+    everything = tasks(job)
+    return list(
+        pool.map(
+            run_task,
+            indexes,
+            [everything[i] for i in indexes],
+            [job["distances"]] * len(indexes),
+            chunksize=max(1, len(indexes) // 64),
+        )
+    )
+
+
+def _write(path: str, records: list):
+    # write next to the target and rename, a reader never sees half a file
+    partial = f"{path}.{socket.gethostname()}.{os.getpid()}.partial"
+    with open(partial, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    os.replace(partial, path)
+
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    index, count = (int(part) for part in shard.split("/"))
+    if not 0 <= index < count:
+        raise ValueError(f"Invalid shard: {shard}. Must be i/N with 0 <= i < N.")
+    return index, count
+
+
+def run_shard(job: dict, shard: str, out: str, workers: int | None = None) -> str:
+    index, count = parse_shard(shard)
+    mine = list(range(index, len(tasks(job)), count))
+    os.makedirs(out, exist_ok=True)
+    path = os.path.join(out, f"shard-{index:04d}-of-{count:04d}.jsonl")
+    with ProcessPoolExecutor(workers) as pool:
+        _write(path, _run_many(pool, mine, job))
+    return path
+
+
+class WorkQueue:
+    # a job split into chunks in a shared directory, see the module docstring
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.locks = os.path.join(directory, "locks")
+        self.results = os.path.join(directory, "results")
+
+    def init(self, job: dict, chunk: int = 32):
+        os.makedirs(self.locks, exist_ok=True)
+        os.makedirs(self.results, exist_ok=True)
+        with open(os.path.join(self.directory, "job.json"), "w") as f:
+            json.dump({"job": job, "chunk": chunk}, f, indent=4)
+
+    def load(self) -> tuple[dict, int]:
+        with open(os.path.join(self.directory, "job.json")) as f:
+            queue = json.load(f)
+        return queue["job"], queue["chunk"]
+
+    def _result_path(self, chunk: int) -> str:
+        return os.path.join(self.results, f"chunk-{chunk:06d}.jsonl")
+
+    def claim(self, chunk: int, stale: float) -> bool:
+        if os.path.exists(self._result_path(chunk)):
+            return False
+
+        lock = os.path.join(self.locks, f"chunk-{chunk:06d}.lock")
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                age = time.time() - os.stat(lock).st_mtime
+            except FileNotFoundError:
+                return False
+            if age < stale:
+                return False
+
+            # whoever held it is gone, move the lock aside (only one node can)
+            # and try to claim it fresh
+            try:
+                os.rename(lock, f"{lock}.stale-{socket.gethostname()}-{os.getpid()}")
+            except FileNotFoundError:
+                return False
+            return self.claim(chunk, stale)
+
+        with os.fdopen(fd, "w") as f:
+            f.write(f"{socket.gethostname()} {os.getpid()}\n")
+        return True
+
+    def work(self, workers: int | None = None, stale: float = 3600.0) -> int:
+        # run chunks until none are left unclaimed, returns how many this node did
+        job, chunk = self.load()
+        count = len(tasks(job))
+        done = 0
+        with ProcessPoolExecutor(workers) as pool:
+            for number in range((count + chunk - 1) // chunk):
+                if not self.claim(number, stale):
+                    continue
+                indexes = range(number * chunk, min(count, (number + 1) * chunk))
+                _write(self._result_path(number), _run_many(pool, list(indexes), job))
+                done += 1
+        return done
+
+
+def merge(paths: list, job: dict | None = None) -> list:
+    """
+    Every record from the given jsonl files (or directories of them), one per
+    task in task order. With the job given, missing tasks raise ValueError.
+    """
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(
+                os.path.join(path, name)
+                for name in os.listdir(path)
+                if name.endswith(".jsonl")
+            )
+        else:
+            files.append(path)
+
+    records = {}
+    for name in files:
+        with open(name) as f:
+            for line in f:
+                record = json.loads(line)
+                records[record["task"]] = record
+
+    if job is not None:
+        missing = sorted(set(range(len(tasks(job)))) - set(records))
+        if missing:
+            raise ValueError(
+                f"{len(missing)} tasks have no result, first missing: {missing[0]}."
+            )
+
+    return [records[index] for index in sorted(records)]
+
+
+def print_report(records: list):
+    distances = sorted({d for r in records for d in r["results"]}, key=float)
+    print(f"{len(records)} results")
+    for distance in distances:
+        ranked = sorted(records, key=lambda r: r["results"][distance][0])
+        print("*" * 80)
+        print(f"{distance} mile, quickest")
+        print("-" * 80)
+        for record in ranked[:5]:
+            et, speed = record["results"][distance]
+            setup = ", ".join(
+                f"{k}={v}"
+                for k, v in {**record["variant"], **record["conditions"]}.items()
+            )
+            print(f"{record['car']:<16} {et:>8.3f} sec @ {speed:>6.1f} mph  {setup}")
+
+
+def write_csv(records: list, path: str):
+    from csv import writer
+
+    distances = sorted({d for r in records for d in r["results"]}, key=float)
+    keys = sorted({k for r in records for k in {**r["variant"], **r["conditions"]}})
+    with open(path, "w") as f:
+        csv = writer(f, lineterminator="\n")
+        csv.writerow(
+            ["task", "car"]
+            + keys
+            + [f"{d} {name}" for d in distances for name in ("ET", "Speed")]
+        )
+        for r in records:
+            setup = {**r["variant"], **r["conditions"]}
+            csv.writerow(
+                [r["task"], r["car"]]
+                + [setup.get(key, "") for key in keys]
+                + [value for d in distances for value in r["results"][d]]
+            )
+
+
+def _load_job(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless batch runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("example", help="print an example job")
+
+    run = commands.add_parser("run", help="run one static shard of a job")
+    run.add_argument("job")
+    run.add_argument("--shard", default="0/1")
+    run.add_argument("--out", default="batch_results")
+    run.add_argument("--workers", type=int)
+
+    queue = commands.add_parser("queue", help="shared directory work queue")
+    queue.add_argument("action", choices=["init", "work"])
+    queue.add_argument("args", nargs="+", help="init: job directory, work: directory")
+    queue.add_argument("--chunk", type=int, default=32)
+    queue.add_argument("--workers", type=int)
+    queue.add_argument("--stale", type=float, default=3600.0)
+
+    merging = commands.add_parser("merge", help="merge shard / chunk results")
+    merging.add_argument("paths", nargs="+")
+    merging.add_argument("--job", help="check that every task has a result")
+    merging.add_argument("--csv")
+
+    args = parser.parse_args()
+
+    if args.command == "example":
+        json.dump(EXAMPLE, sys.stdout, indent=4)
+        print()
+
+    elif args.command == "run":
+        path = run_shard(_load_job(args.job), args.shard, args.out, args.workers)
+        print(f"Saved shard {args.shard} to {path}")
+
+    elif args.command == "queue" and args.action == "init":
+        job, directory = args.args
+        WorkQueue(directory).init(_load_job(job), args.chunk)
+        print(f"Queue ready in {directory}")
+
+    elif args.command == "queue":
+        directory = args.args[0]
+        done = WorkQueue(directory).work(args.workers, args.stale)
+        print(f"Ran {done} chunks")
+
+    else:
+        job = _load_job(args.job) if args.job else None
+        records = merge(args.paths, job)
+        print_report(records)
+        if args.csv:
+            write_csv(records, args.csv)
+            print(f"Saved {args.csv}")
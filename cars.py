@@ -14,6 +14,10 @@ baja - ???
 
 """
 
+import copy
+import hashlib
+import json
+
 from vehicle import Vehicle
 from engine import Engine
 from transmission import Transmission
@@ -120,3 +124,112 @@ def cardinal() -> Vehicle:
         drag_coefficient=0.325,
         drivetrain_efficiency=0.88,
     )
+
+
+# the catalog of factories, keyed by the name used in race results and logs
+CATALOG = {
+    "puffin": puffin,
+    "blue_jay": blue_jay,
+    "cardinal": cardinal,
+    "budgie": budgie,
+    "painted_bunting": painted_bunting,
+}
+
+
+# config keys that are plain vehicle attributes rather than constructor arguments
+SETTINGS = ("rolling_resistance", "frontal_area", "air_density", "tick_rate")
+
+
+def to_config(vehicle: Vehicle) -> dict:
+    # plain (json friendly) description of everything a factory sets up
+    return {
+        "engine": {
+            "torque_curve": [list(point) for point in vehicle.engine.torque_curve],
+            "shift_rpm": vehicle.engine.shift_rpm,
+            "launch_rpm": vehicle.engine.launch_rpm,
+        },
+        "transmission": {
+            "forward_gears": list(vehicle.transmission.forward_gears),
+            "reverse_gear": vehicle.transmission.reverse_gear,
+            "final_drive": vehicle.transmission.final_drive,
+        },
+        "wheel": {"diameter_inches": vehicle.wheel.get_diameter_inches()},
+        "weight_lbs": vehicle.weight_lbs,
+        "drag_coefficient": vehicle.drag_coefficient,
+        "drivetrain_efficiency": vehicle.drivetrain_efficiency,
+        "rolling_resistance": vehicle.rolling_resistance,
+        "frontal_area": vehicle.frontal_area,
+        "air_density": vehicle.air_density,
+        "tick_rate": vehicle.tick_rate,
+    }
+
+
+def from_config(config: dict) -> Vehicle:
+    # build a fresh vehicle from a config made by to_config (or by hand)
+    engine = config["engine"]
+    transmission = config["transmission"]
+
+    vehicle = Vehicle(
+        Engine(
+            [tuple(point) for point in engine["torque_curve"]],
+            shift_rpm=engine["shift_rpm"],
+            launch_rpm=engine["launch_rpm"],
+        ),
+        Transmission(
+            forward_gears=list(transmission["forward_gears"]),
+            reverse_gear=transmission["reverse_gear"],
+            final_drive=transmission["final_drive"],
+        ),
+        Wheel(float(config["wheel"]["diameter_inches"])),
+        weight_lbs=config["weight_lbs"],
+        drag_coefficient=config["drag_coefficient"],
+        drivetrain_efficiency=config["drivetrain_efficiency"],
+    )
+
+    # these are not constructor arguments, only override them when given
+    for key in SETTINGS:
+        if key in config:
+            setattr(vehicle, key, config[key])
+
+    return vehicle
+
+
+def get_value(config: dict, path: tuple):
+    # the value at path (keys and list indexes) in config
+    for key in path:
+        config = config[key]
+    return config
+
+
+def with_values(config: dict, values: dict) -> dict:
+    # a copy of config with {path: value} applied
+    config = copy.deepcopy(config)
+    for path, value in values.items():
+        target = config
+        for key in path[:-1]:
+            target = target[key]
+        target[path[-1]] = value
+    return config
+
+
+def get_config(car: str | dict) -> dict:
+    # accept either a catalog name, a car defined in car_defs/ or an already
+    # built config
+    if isinstance(car, str):
+        if car in CATALOG:
+            return to_config(CATALOG[car]())
+
+        import definitions
+
+        defined = definitions.catalog()
+        if car not in defined:
+            raise ValueError(
+                f"Unknown car: {car}. Must be one of {list(CATALOG | defined)}."
+            )
+        return json.loads(json.dumps(defined[car]["config"]))
+    return car
+
+
+def config_key(config: dict) -> str:
+    # stable identity of a config, identical configs hash the same
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
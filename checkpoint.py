@@ -0,0 +1,144 @@
+"""
+
+Incremental re-simulation for setup sweeps.
+
+Most of a pass does not depend on the upper gears, a car in 3rd has run the
+same ticks whatever 6th looks like. record() runs the baseline pass once and
+snapshots the vehicle right after every shift. A changed setup whose first
+difference is in gear n is then restored from the checkpoint taken as the car
+went into gear n and only the rest of the pass is simulated. The result is
+bit for bit what a full pass from launch gives, because nothing before that
+checkpoint ever read the changed ratio.
+
+Changes that matter from the first tick (weight, drag, the torque curve, the
+final drive...) fall back to a full pass from the launch checkpoint.
+
+    trace = record("budgie", 1.0)
+    et, trap = trace.resimulate(config_with_a_taller_7th)
+
+"""
+
+import copy
+
+import cars
+import race
+
+
+class Trace:
+    # the baseline pass of one config with its checkpoints
+    def __init__(self, config: dict, distance: float):
+        self.config = config
+        self.distance = distance
+
+        # gear -> snapshot taken as the car first went into it, 1 is the launch
+        self.checkpoints = {}
+        self.result = None
+        self.ticks = 0
+
+        # ticks actually simulated by resimulate() and what full passes would cost
+        self.simulated_ticks = 0
+        self.full_ticks = 0
+
+    def divergence_gear(self, config: dict) -> int | None:
+        """
+        The first gear whose behaviour config changes, 1 for anything that
+        matters from launch, None if config is the same as the baseline.
+        """
+
+        if config == self.config:
+            return None
+
+        base_gears = self.config["transmission"]["forward_gears"]
+        gears = config["transmission"]["forward_gears"]
+        if len(gears) != len(base_gears):
+            return 1
+
+        # everything else must match for a gear change to be late
+        base = copy.deepcopy(self.config)
+        other = copy.deepcopy(config)
+        base["transmission"]["forward_gears"] = None
+        other["transmission"]["forward_gears"] = None
+        if base != other:
+            return 1
+
+        return next(i + 1 for i, (a, b) in enumerate(zip(base_gears, gears)) if a != b)
+
+    def resimulate(self, config: dict) -> tuple[float, float]:
+        # (elapsed time, trap speed) of config, from the latest usable checkpoint
+        gear = self.divergence_gear(config)
+        self.full_ticks += self.ticks
+        if gear is None or gear not in self.checkpoints:
+            # the same car, or it never gets into the changed gear
+            return self.result
+
+        vehicle = cars.from_config(config)
+        vehicle.logging = False
+        vehicle.restore(self.checkpoints[gear])
+        start = vehicle.ticks
+
+        result = race.finish_time(vehicle, self.distance)
+        self.simulated_ticks += vehicle.ticks - start
+        return result
+
+
+def record(car: str | dict, distance: float = 0.25) -> Trace:
+    # run the baseline pass of car and checkpoint every shift
+    config = cars.get_config(car)
+    trace = Trace(config, distance)
+
+    vehicle = cars.from_config(config)
+    vehicle.logging = False
+    trace.checkpoints[vehicle.current_gear] = vehicle.snapshot()
+
+    def on_shift(v):
+        trace.checkpoints.setdefault(v.current_gear, v.snapshot())
+
+    trace.result = race.finish_time(vehicle, distance, on_shift=on_shift)
+    trace.ticks = vehicle.ticks
+    return trace
+
+
+def sweep_gear(
+    car: str | dict, gear: int, ratios: list, distance: float = 0.25
+) -> tuple[list, Trace]:
+    # [(ratio, elapsed time, trap speed)] for every ratio of one gear, and the trace
+    trace = record(car, distance)
+    results = []
+    for ratio in ratios:
+        config = copy.deepcopy(trace.config)
+        config["transmission"]["forward_gears"][gear - 1] = ratio
+        results.append((ratio, *trace.resimulate(config)))
+    return results, trace
+
+
+if __name__ == "__main__":
+    import time
+
+    distance = 1.0
+    base = cars.get_config("budgie")
+
+    for gear in range(4, 9):
+        ratio = base["transmission"]["forward_gears"][gear - 1]
+        ratios = [ratio * (0.8 + 0.4 * i / 99) for i in range(100)]
+
+        start = time.perf_counter()
+        results, trace = sweep_gear(base, gear, ratios, distance)
+        incremental = time.perf_counter() - start
+
+        # the same sweep from launch every time, to check and to compare
+        start = time.perf_counter()
+        same = True
+        for value, et, trap in results:
+            config = copy.deepcopy(base)
+            config["transmission"]["forward_gears"][gear - 1] = value
+            vehicle = cars.from_config(config)
+            vehicle.logging = False
+            same = same and race.finish_time(vehicle, distance) == (et, trap)
+        full = time.perf_counter() - start
+
+        best = min(results, key=lambda r: r[1])
+        print(
+            f"gear {gear}: best ratio {best[0]:.3f} -> {best[1]:.3f} sec @ {best[2]:.1f} mph"
+            f"  identical: {same}  ticks {trace.simulated_ticks}/{trace.full_ticks}"
+            f"  {full:.2f} -> {incremental:.2f} sec ({full / incremental:.1f}x)"
+        )
@@ -0,0 +1,306 @@
+"""
+
+Compare passes against each other by distance.
+
+A Run is one pass as arrays of Time, Distance, Speed, RPM and Gear, from a
+vehicle's log or from a csv game.py wrote. Its distance index is the
+distance covered as it first reaches each new distance and the time it got
+there, sorted, so what time a run was at a distance, or where it was at a
+time, is a binary search and an interpolation (O(log n)) for one query or a
+whole array of them.
+
+A Comparison lines N runs up on a common grid of distances and gives every
+channel as an (N runs, grid) array, with the time each run is behind a
+reference (the quickest by default) and its speed and RPM against it at the
+same spot on the track. Building one only interpolates each run onto the
+grid, hundreds of runs still compare in milliseconds.
+
+    python compare.py logs/2024-01-01_12-00-00/*.csv
+    python compare.py --car cardinal --variants 50      # final drive sweep
+
+"""
+
+import argparse
+import csv
+import os
+
+import numpy as np
+
+import cars
+import race
+
+CHANNELS = ("Time", "Speed", "RPM", "Gear")
+
+
+class Run:
+
+    def __init__(
+        self,
+        name: str,
+        time,
+        distance,
+        speed,
+        rpm,
+        gear=None,
+    ):
+        self.name = name
+        self.time = np.asarray(time, dtype=float)
+        # the furthest the car has got, a run that rolls back does not go
+        # back down the index
+        self.distance = np.maximum.accumulate(np.asarray(distance, dtype=float))
+        self.speed = np.asarray(speed, dtype=float)
+        self.rpm = np.asarray(rpm, dtype=float)
+        self.gear = np.zeros_like(self.time) if gear is None else np.asarray(gear)
+
+        if not (
+            len(self.time) == len(self.distance) == len(self.speed) == len(self.rpm)
+        ):
+            raise ValueError(f"Run {name}: every channel needs the same length.")
+        if len(self.time) < 2 or np.any(np.diff(self.time) <= 0):
+            raise ValueError(f"Run {name}: needs 2 or more ticks in time order.")
+
+        # the distance index, where each new distance is first reached
+        self.index_distance, first = np.unique(self.distance, return_index=True)
+        self.index_time = self.time[first]
+        self.first = first
+
+    @classmethod
+    def from_log(cls, name: str, log) -> "Run":
+        # a VehicleLog
+        columns = log.columns()
+        return cls(
+            name,
+            columns["Time"],
+            columns["Distance"],
+            columns["Speed"],
+            columns["RPM"],
+            columns["Gear"],
+        )
+
+    @classmethod
+    def from_csv(cls, path: str, name: str | None = None) -> "Run":
+        # a log csv as game.py saves them
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        for channel in CHANNELS + ("Distance",):
+            if not rows or channel not in rows[0]:
+                raise ValueError(f"{path}: needs a {channel} column.")
+        columns = {
+            channel: [float(row[channel]) for row in rows]
+            for channel in CHANNELS + ("Distance",)
+        }
+        return cls(
+            name or os.path.splitext(os.path.basename(path))[0],
+            columns["Time"],
+            columns["Distance"],
+            columns["Speed"],
+            columns["RPM"],
+            columns["Gear"],
+        )
+
+    @property
+    def length(self) -> float:
+        return float(self.index_distance[-1])
+
+    def time_at(self, distance):
+        # when the run first got to distance (miles), nan past its end
+        return np.interp(distance, self.index_distance, self.index_time, right=np.nan)
+
+    def distance_at(self, time):
+        # how far the run had got at time (seconds), nan past its end
+        return np.interp(time, self.time, self.distance, right=np.nan)
+
+    def at_distance(self, channel: str, distance):
+        # a channel where the run first got to distance, gear is not interpolated
+        if channel == "Time":
+            return self.time_at(distance)
+        if channel == "Gear":
+            i = np.searchsorted(self.index_distance, distance, side="right") - 1
+            i = np.clip(i, 0, len(self.first) - 1)
+            gear = self.gear[self.first[i]].astype(float)
+            return np.where(np.asarray(distance) > self.length, np.nan, gear)
+        values = {"Speed": self.speed, "RPM": self.rpm}[channel]
+        return np.interp(
+            distance, self.index_distance, values[self.first], right=np.nan
+        )
+
+
+class Comparison:
+    """
+    runs lined up every step miles up to the shortest run's length (or on
+    the distances given). reference is the index or name of the run the
+    others are compared to, the quickest to the end of the grid if None.
+    """
+
+    def __init__(
+        self,
+        runs: list,
+        reference: int | str | None = None,
+        step: float = 5 / race.FEET_PER_MILE,
+        distances=None,
+    ):
+        if not runs:
+            raise ValueError("Nothing to compare.")
+        self.runs = list(runs)
+        self.names = [run.name for run in self.runs]
+
+        if distances is None:
+            end = min(run.length for run in self.runs)
+            distances = np.append(np.arange(0.0, end, step), end)
+        self.distances = np.asarray(distances, dtype=float)
+
+        self.channels = {
+            channel: np.vstack(
+                [run.at_distance(channel, self.distances) for run in self.runs]
+            )
+            for channel in CHANNELS
+        }
+
+        if reference is None:
+            reference = int(np.nanargmin(self.channels["Time"][:, -1]))
+        elif isinstance(reference, str):
+            if reference not in self.names:
+                raise ValueError(
+                    f"Unknown run: {reference}. Must be one of {self.names}."
+                )
+            reference = self.names.index(reference)
+        self.reference = reference
+
+    def difference(self, channel: str) -> np.ndarray:
+        # (runs, distances) of every run's channel minus the reference's
+        values = self.channels[channel]
+        return values - values[self.reference]
+
+    @property
+    def delta_time(self) -> np.ndarray:
+        # how far behind the reference each run is at every distance (seconds)
+        return self.difference("Time")
+
+    @property
+    def speed_difference(self) -> np.ndarray:
+        return self.difference("Speed")
+
+    @property
+    def rpm_difference(self) -> np.ndarray:
+        return self.difference("RPM")
+
+    def splits(self, milestones: dict | None = None) -> dict:
+        # milestone name -> (runs,) times at it, milestones past the grid left out
+        milestones = milestones or race.MILESTONES
+        return {
+            name: np.array([run.time_at(distance) for run in self.runs])
+            for name, distance in milestones.items()
+            if distance <= self.distances[-1]
+        }
+
+    def ranking(self) -> list:
+        # run indexes, quickest to the end of the grid first
+        return np.argsort(self.channels["Time"][:, -1], kind="stable").tolist()
+
+
+def print_report(comparison: Comparison, top: int = 10):
+    splits = comparison.splits()
+    reference = comparison.reference
+    print("*" * 80)
+    print(
+        f"{len(comparison.runs)} runs against {comparison.names[reference]},"
+        f" delta time at each split"
+    )
+    print("-" * 80)
+    print(f"{'':<20}" + "".join(f"{name:>15}" for name in splits))
+    print(
+        f"{comparison.names[reference]:<20}"
+        + "".join(f"{times[reference]:>15.3f}" for times in splits.values())
+    )
+    for i in comparison.ranking()[:top]:
+        if i == reference:
+            continue
+        print(
+            f"{comparison.names[i]:<20}"
+            + "".join(
+                f"{times[i] - times[reference]:>+15.3f}" for times in splits.values()
+            )
+        )
+
+
+def overlay(comparison: Comparison, runs: list | None = None):
+    # delta time, speed and rpm traces of the runs (all by default) by distance
+    import matplotlib.pyplot as plt
+
+    runs = range(len(comparison.runs)) if runs is None else runs
+    feet = comparison.distances * race.FEET_PER_MILE
+    traces = (
+        ("Delta time (s)", comparison.delta_time),
+        ("Speed (mph)", comparison.channels["Speed"]),
+        ("RPM", comparison.channels["RPM"]),
+    )
+    _, axes = plt.subplots(len(traces), 1, sharex=True)
+    for axis, (label, values) in zip(axes, traces):
+        for i in runs:
+            axis.plot(
+                feet,
+                values[i],
+                label=comparison.names[i],
+                linewidth=2 if i == comparison.reference else 0.8,
+            )
+        axis.set_ylabel(label)
+        axis.grid()
+    axes[-1].set_xlabel("Distance (ft)")
+    if len(runs) <= 10:
+        axes[0].legend()
+    plt.show()
+
+
+def _sweep(car: str, variants: int, distance: float) -> list:
+    # logged passes of car with its final drive spread +/- 15%
+    config = cars.get_config(car)
+    final_drive = config["transmission"]["final_drive"]
+    runs = []
+    for scale in np.linspace(0.85, 1.15, variants):
+        config["transmission"]["final_drive"] = final_drive * scale
+        vehicle = cars.from_config(config)
+        for _ in race.run_pass(vehicle, distance):
+            pass
+        runs.append(Run.from_log(f"{car} fd x{scale:.3f}", vehicle.log))
+    return runs
+
+
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="Compare passes by distance")
+    parser.add_argument("csv", nargs="*", help="logs saved by game.py")
+    parser.add_argument("--car", default="cardinal")
+    parser.add_argument("--variants", type=int, default=20)
+    parser.add_argument("--distance", type=float, default=0.25)
+    parser.add_argument("--reference", help="name of the run to compare to")
+    parser.add_argument("--plot", action="store_true")
+    args = parser.parse_args()
+
+    if args.csv:
+        runs = [Run.from_csv(path) for path in args.csv]
+    else:
+        runs = _sweep(args.car, args.variants, args.distance)
+
+    start = time.perf_counter()
+    comparison = Comparison(runs, args.reference)
+    elapsed = time.perf_counter() - start
+    print_report(comparison)
+    print(
+        f"{len(runs)} runs lined up on {len(comparison.distances)} distances"
+        f" in {elapsed * 1000:.1f} ms"
+    )
+
+    # one query on the quickest run, as the game would ask it
+    best = comparison.runs[comparison.reference]
+    start = time.perf_counter()
+    for _ in range(10000):
+        best.time_at(0.125)
+    print(
+        f"time at 1/8 mile: {best.time_at(0.125):.3f} sec,"
+        f" distance at 5 sec: {best.distance_at(5.0) * race.FEET_PER_MILE:.0f} ft,"
+        f" {(time.perf_counter() - start) / 10000 * 1e6:.1f} us per query"
+    )
+
+    if args.plot:
+        overlay(comparison)
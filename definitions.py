@@ -0,0 +1,413 @@
+"""
+
+Cars defined in data files instead of code.
+
+Every .toml or .json file in car_defs/ is one car, named after the file. It
+maps onto the Engine, Transmission and Wheel constructors:
+
+    description = "super car"
+    weight_lbs = 2400
+    drag_coefficient = 0.325          # optional, like the Vehicle defaults
+    drivetrain_efficiency = 0.88      # optional
+    # rolling_resistance, frontal_area, air_density, tick_rate are optional too
+
+    [engine]
+    torque_curve = [[1000, 100], [2000, 200], [7000, 0]]   # [rpm, torque]
+    shift_rpm = 6500
+    launch_rpm = 1500
+
+    [transmission]
+    forward_gears = [2.76, 1.7, 1.24, 1, 0.77]
+    reverse_gear = 4.0                # optional
+    final_drive = 2.88
+
+    [wheel]
+    tire = [335, 35, 17]              # or diameter_inches = 26.2
+
+Every file is checked against the schema (unknown keys included, they are
+usually typos) and a bad one raises ValueError naming the file and the key.
+
+A checked file is compiled once into everything a race needs up front: the
+config (cars.to_config format, torque curve sorted, tire worked out to a
+diameter), max_horsepower and max_torque and the overall ratio of every gear.
+Compiled cars are kept in a pickle in the same directory, keyed by each
+file's mtime and size and, when those changed, by the hash of its contents.
+Loading a catalog that has not changed only stats the files and reads that
+one pickle. A process does even that once per directory: catalog() keeps
+what it loaded, get_config() and cars.get_config() look cars up in it, and
+catalog(directory, refresh=True) picks up files changed since.
+
+"""
+
+import hashlib
+import json
+import math
+import os
+import pickle
+import tomllib
+
+import cars
+from vehicle import Vehicle
+from wheel import Wheel
+
+DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "car_defs")
+
+CACHE_NAME = ".compiled.pickle"
+
+# bump when compile_definition() changes, every cached car is compiled again
+CACHE_VERSION = 1
+
+SUFFIXES = (".toml", ".json")
+
+# top level keys that may be left out, and where their default comes from
+OPTIONAL = (
+    "drag_coefficient",
+    "drivetrain_efficiency",
+    "rolling_resistance",
+    "frontal_area",
+    "air_density",
+    "tick_rate",
+)
+
+SCHEMA = {
+    "name": "text",
+    "description": "text",
+    "weight_lbs": "positive",
+    "drag_coefficient": "positive",
+    "drivetrain_efficiency": "fraction",
+    "rolling_resistance": "positive",
+    "frontal_area": "positive",
+    "air_density": "positive",
+    "tick_rate": "positive",
+    "engine": {
+        "torque_curve": "curve",
+        "shift_rpm": "positive",
+        "launch_rpm": "positive",
+    },
+    "transmission": {
+        "forward_gears": "ratios",
+        "reverse_gear": "positive",
+        "final_drive": "positive",
+    },
+    "wheel": {
+        "tire": "tire",
+        "diameter_inches": "positive",
+    },
+}
+
+REQUIRED = {
+    "": ("weight_lbs", "engine", "transmission", "wheel"),
+    "engine": ("torque_curve", "shift_rpm", "launch_rpm"),
+    "transmission": ("forward_gears", "final_drive"),
+}
+
+
+def _number(value) -> bool:
+    return (
+        isinstance(value, (int, float))
+        and not isinstance(value, bool)
+        and math.isfinite(value)
+    )
+
+
+def _check_value(kind: str, value, where: str):
+    if kind == "text":
+        if not isinstance(value, str):
+            raise ValueError(f"{where} must be text, got {value!r}.")
+
+    elif kind == "positive":
+        if not _number(value) or value <= 0:
+            raise ValueError(f"{where} must be a positive number, got {value!r}.")
+
+    elif kind == "fraction":
+        if not _number(value) or not 0 < value <= 1:
+            raise ValueError(f"{where} must be a number in (0, 1], got {value!r}.")
+
+    elif kind == "ratios":
+        if (
+            not isinstance(value, list)
+            or not value
+            or not all(_number(ratio) and ratio > 0 for ratio in value)
+        ):
+            raise ValueError(
+                f"{where} must be a list of positive numbers, got {value!r}."
+            )
+
+    elif kind == "tire":
+        if (
+            not isinstance(value, list)
+            or len(value) != 3
+            or not all(_number(size) and size > 0 for size in value)
+        ):
+            raise ValueError(
+                f"{where} must be [width mm, aspect ratio, rim inches], got {value!r}."
+            )
+
+    elif kind == "curve":
+        if not isinstance(value, list) or len(value) < 2:
+            raise ValueError(f"{where} must be a list of at least 2 [rpm, torque].")
+        for point in value:
+            if (
+                not isinstance(point, list)
+                or len(point) != 2
+                or not all(_number(x) and x >= 0 for x in point)
+            ):
+                raise ValueError(
+                    f"{where} points must be [rpm, torque] of numbers >= 0,"
+                    f" got {point!r}."
+                )
+        rpms = sorted(rpm for rpm, _ in value)
+        for low, high in zip(rpms, rpms[1:]):
+            if low == high:
+                raise ValueError(f"{where} has two points at {low} rpm.")
+
+
+def validate(definition: dict, source: str = "<definition>"):
+    # raise ValueError for anything in definition that does not fit SCHEMA
+    def check(table: dict, schema: dict, prefix: str):
+        for key, value in table.items():
+            where = f"{source}: {prefix}{key}"
+            if key not in schema:
+                raise ValueError(
+                    f"{where} is not a known key. Must be one of {list(schema)}."
+                )
+            if isinstance(schema[key], dict):
+                if not isinstance(value, dict):
+                    raise ValueError(f"{where} must be a table.")
+                check(value, schema[key], f"{prefix}{key}.")
+            else:
+                _check_value(schema[key], value, where)
+
+        for key in REQUIRED.get(prefix.rstrip("."), ()):
+            if key not in table:
+                raise ValueError(f"{source}: {prefix}{key} is missing.")
+
+    if not isinstance(definition, dict):
+        raise ValueError(f"{source}: must be a table of keys.")
+    check(definition, SCHEMA, "")
+
+    wheel = definition["wheel"]
+    if ("tire" in wheel) == ("diameter_inches" in wheel):
+        raise ValueError(f"{source}: wheel needs one of tire or diameter_inches.")
+
+    engine = definition["engine"]
+    top_rpm = max(rpm for rpm, _ in engine["torque_curve"])
+    for key in ("shift_rpm", "launch_rpm"):
+        if engine[key] > top_rpm:
+            raise ValueError(
+                f"{source}: engine.{key} {engine[key]} is past the end of the"
+                f" torque curve ({top_rpm} rpm)."
+            )
+
+
+def parse(path: str, data: bytes | None = None) -> dict:
+    # the raw definition in a toml or json file
+    if data is None:
+        with open(path, "rb") as f:
+            data = f.read()
+    try:
+        if path.endswith(".toml"):
+            return tomllib.loads(data.decode("utf-8"))
+        return json.loads(data)
+    except (tomllib.TOMLDecodeError, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError(f"{path}: {e}") from e
+
+
+_DEFAULTS = cars.to_config(Vehicle())
+
+
+def compile_definition(definition: dict, name: str) -> dict:
+    """
+    A validated definition precompiled for racing: the full config, ready for
+    cars.from_config, and what is derived from it.
+    """
+
+    engine = definition["engine"]
+    transmission = definition["transmission"]
+    wheel = definition["wheel"]
+
+    if "tire" in wheel:
+        diameter = Wheel(tuple(wheel["tire"])).get_diameter_inches()
+    else:
+        diameter = float(wheel["diameter_inches"])
+
+    curve = sorted(list(point) for point in engine["torque_curve"])
+    forward_gears = list(transmission["forward_gears"])
+    reverse_gear = transmission.get(
+        "reverse_gear", _DEFAULTS["transmission"]["reverse_gear"]
+    )
+    final_drive = transmission["final_drive"]
+
+    config = {
+        "engine": {
+            "torque_curve": curve,
+            "shift_rpm": engine["shift_rpm"],
+            "launch_rpm": engine["launch_rpm"],
+        },
+        "transmission": {
+            "forward_gears": forward_gears,
+            "reverse_gear": reverse_gear,
+            "final_drive": final_drive,
+        },
+        "wheel": {"diameter_inches": diameter},
+        "weight_lbs": definition["weight_lbs"],
+    }
+    for key in OPTIONAL:
+        config[key] = definition.get(key, _DEFAULTS[key])
+
+    return {
+        "name": definition.get("name", name),
+        "description": definition.get("description", ""),
+        "config": config,
+        "key": cars.config_key(config),
+        "max_horsepower": max(rpm * torque / 5252 for rpm, torque in curve),
+        "max_torque": max(torque for _, torque in curve),
+        # overall (gearbox x final drive) ratio of reverse, neutral, 1st, 2nd...
+        "ratios": [reverse_gear * final_drive, 0.0]
+        + [ratio * final_drive for ratio in forward_gears],
+    }
+
+
+def _load_cache(path: str) -> dict:
+    try:
+        with open(path, "rb") as f:
+            cache = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION:
+        return {}
+    return cache["files"]
+
+
+def _save_cache(path: str, files: dict):
+    # a read only catalog still loads, just without the speed up next time
+    partial = f"{path}.{os.getpid()}.partial"
+    try:
+        with open(partial, "wb") as f:
+            pickle.dump(
+                {"version": CACHE_VERSION, "files": files},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(partial, path)
+    except OSError:
+        pass
+
+
+def load(directory: str = DIRECTORY, cache: bool = True) -> dict:
+    """
+    Every car defined in directory, name -> compiled car (see
+    compile_definition()), in file name order. With cache, unchanged files
+    come from the cache.
+    """
+
+    cache_path = os.path.join(directory, CACHE_NAME)
+    cached = _load_cache(cache_path) if cache else {}
+    files = {}
+    changed = False
+
+    for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+        stem, suffix = os.path.splitext(entry.name)
+        if suffix not in SUFFIXES or not entry.is_file():
+            continue
+
+        stat = entry.stat()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        previous = cached.get(entry.name)
+        if previous is not None and previous["stamp"] == stamp:
+            files[entry.name] = previous
+            continue
+
+        # touched or new, only compile it again if the contents changed
+        with open(entry.path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        if previous is not None and previous["hash"] == digest:
+            compiled = previous["car"]
+        else:
+            definition = parse(entry.path, data)
+            validate(definition, entry.path)
+            compiled = compile_definition(definition, stem)
+
+        files[entry.name] = {"stamp": stamp, "hash": digest, "car": compiled}
+        changed = True
+
+    if cache and (changed or files.keys() != cached.keys()):
+        _save_cache(cache_path, files)
+
+    catalog = {}
+    for filename, entry in files.items():
+        name = entry["car"]["name"]
+        if name in catalog:
+            raise ValueError(
+                f"{os.path.join(directory, filename)}: {name} is defined twice."
+            )
+        catalog[name] = entry["car"]
+    return catalog
+
+
+# directory -> the catalog this process loaded from it
+_catalogs = {}
+
+
+def catalog(directory: str = DIRECTORY, refresh: bool = False) -> dict:
+    # load(directory), the first time it is asked for (or with refresh) only
+    if refresh or directory not in _catalogs:
+        _catalogs[directory] = load(directory)
+    return _catalogs[directory]
+
+
+def get_config(name: str, directory: str = DIRECTORY) -> dict:
+    # a fresh copy of a defined car's config, safe to change
+    cars_defined = catalog(directory)
+    if name not in cars_defined:
+        raise ValueError(f"Unknown car: {name}. Must be one of {list(cars_defined)}.")
+    return json.loads(json.dumps(cars_defined[name]["config"]))
+
+
+def vehicle(name: str, directory: str = DIRECTORY) -> Vehicle:
+    return cars.from_config(get_config(name, directory))
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+    import time
+
+    # the definitions match the factories in cars.py
+    defined = load()
+    for name, car in defined.items():
+        same = name in cars.CATALOG and car["key"] == cars.config_key(
+            cars.get_config(name)
+        )
+        print(
+            f"{name:<16} {car['description']:<10} {car['max_horsepower']:>7.1f} hp"
+            f"  {len(car['ratios']) - 2} gears  same as cars.py: {same}"
+        )
+
+    # the cost of a catalog of a thousand cars, parsed or from the cache
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(1000):
+            name = list(defined)[i % len(defined)]
+            source = next(
+                os.path.join(DIRECTORY, f"{name}{suffix}")
+                for suffix in SUFFIXES
+                if os.path.exists(os.path.join(DIRECTORY, f"{name}{suffix}"))
+            )
+            stem, suffix = os.path.splitext(os.path.basename(source))
+            shutil.copy(source, os.path.join(directory, f"{stem}_{i:04d}{suffix}"))
+
+        for label, use_cache in (("parsed", False), ("cold cache", True)):
+            start = time.perf_counter()
+            load(directory, cache=use_cache)
+            print(f"1000 cars {label}: {(time.perf_counter() - start) * 1000:.1f} ms")
+        start = time.perf_counter()
+        load(directory)
+        print(f"1000 cars cached: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        # and a lookup once the process has the catalog
+        get_config("cardinal_0002", directory)
+        start = time.perf_counter()
+        for i in range(1000):
+            get_config(f"cardinal_{i // 5 * 5 + 2:04d}", directory)
+        print(f"get_config: {(time.perf_counter() - start) * 1000:.1f} us per lookup")
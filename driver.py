@@ -0,0 +1,78 @@
+"""
+
+What the driver does between ticks, when to shift and when to stop.
+
+Shift policies are called with the vehicle after every tick and return the
+gear to be in. Stop conditions are called with the vehicle after the shift
+and return True to stop. Both are used by Vehicle.run(), which recognizes the
+built in ones and checks them inline instead of calling them.
+
+"""
+
+
+class RpmShift:
+    # shift up once past the shift rpm (the engine's own if not given)
+    def __init__(self, shift_rpm: float | None = None):
+        self.shift_rpm = shift_rpm
+
+    def __call__(self, vehicle) -> int:
+        shift_rpm = self.shift_rpm
+        if shift_rpm is None:
+            shift_rpm = vehicle.engine.shift_rpm
+
+        if vehicle.current_engine_rpm > shift_rpm:
+            # dont try to shift out of the max gear
+            return min(vehicle.transmission.max_gear, vehicle.current_gear + 1)
+        return vehicle.current_gear
+
+
+class GearTableShift:
+    # a shift rpm for each gear, shift_rpms[0] is the 1-2 shift
+    def __init__(self, shift_rpms: list):
+        self.shift_rpms = list(shift_rpms)
+
+    def __call__(self, vehicle) -> int:
+        gear = vehicle.current_gear
+        if 1 <= gear <= len(self.shift_rpms):
+            if vehicle.current_engine_rpm > self.shift_rpms[gear - 1]:
+                return min(vehicle.transmission.max_gear, gear + 1)
+        return gear
+
+
+class CallbackShift:
+    # anything else, callback(vehicle) returns the gear to be in
+    def __init__(self, callback):
+        self.callback = callback
+
+    def __call__(self, vehicle) -> int:
+        return self.callback(vehicle)
+
+
+class NoShift:
+    # stay in the current gear
+    def __call__(self, vehicle) -> int:
+        return vehicle.current_gear
+
+
+class UntilDistance:
+    def __init__(self, miles: float):
+        self.miles = miles
+
+    def __call__(self, vehicle) -> bool:
+        return vehicle.odometer_miles >= self.miles
+
+
+class UntilSpeed:
+    def __init__(self, mph: float):
+        self.mph = mph
+
+    def __call__(self, vehicle) -> bool:
+        return vehicle.current_speed_mph >= self.mph
+
+
+class UntilTime:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def __call__(self, vehicle) -> bool:
+        return vehicle.ticks * vehicle.tick_rate >= self.seconds
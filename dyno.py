@@ -0,0 +1,339 @@
+"""
+
+Torque curves from real dyno pulls.
+
+A dyno pull is thousands of noisy (rpm, torque) samples, out of order and
+with repeats, but Engine.torque() scans its curve breakpoint by breakpoint
+every tick and needs it sorted. ingest() turns a pull into a short curve:
+
+clean      sort by rpm, drop anything not finite, average repeated rpms
+smooth     average into bins of resolution rpm, then a moving average over
+           window bins
+fit        method "linear" joins the smoothed points, "spline" runs a monotone
+           cubic (Fritsch-Carlson, it never overshoots between points) through
+           them
+simplify   drop breakpoints (Ramer-Douglas-Peucker) while the curve stays
+           within tolerance ft-lb of the smoothed points, rpms are rounded
+           to whole numbers and torques to a hundredth (never below 0) first
+
+and reports what that cost: breakpoints before and after, the torque error
+against the smoothed and the raw samples, how far the torque and power peaks
+moved, what a torque() call costs and, given a car, the ET it runs with the
+smoothed curve against the simplified one.
+
+    python dyno.py pull.csv --tolerance 2 --car cardinal
+    python dyno.py --car budgie --samples 20000     # made up pull of a catalog car
+
+A csv needs an rpm column and a torque column (or horsepower, it is
+converted).
+
+"""
+
+import argparse
+import csv
+import random
+import timeit
+
+import numpy as np
+
+import cars
+import race
+from engine import Engine
+
+METHODS = ("linear", "spline")
+
+
+def read_csv(path: str) -> np.ndarray:
+    # (n, 2) array of rpm, torque from a dyno export
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        raise ValueError(f"{path}: no samples.")
+
+    columns = {name.strip().lower(): name for name in rows[0]}
+    if "rpm" not in columns:
+        raise ValueError(f"{path}: needs an rpm column, has {list(rows[0])}.")
+    rpm = np.array([float(row[columns["rpm"]]) for row in rows])
+
+    if "torque" in columns:
+        torque = np.array([float(row[columns["torque"]]) for row in rows])
+    elif "horsepower" in columns or "hp" in columns:
+        hp = columns.get("horsepower", columns.get("hp"))
+        power = np.array([float(row[hp]) for row in rows])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            torque = np.where(rpm > 0, power * 5252 / rpm, np.nan)
+    else:
+        raise ValueError(
+            f"{path}: needs a torque or horsepower column, has {list(rows[0])}."
+        )
+    return np.column_stack([rpm, torque])
+
+
+def synthetic_pull(
+    engine: Engine, samples: int = 5000, noise: float = 4.0, seed: int = 0
+) -> np.ndarray:
+    # a made up pull of engine: rpm logged to the nearest whole rpm, noisy torque
+    rng = random.Random(seed)
+    pull = []
+    for _ in range(samples):
+        rpm = round(rng.uniform(engine.min_rpm, engine.max_rpm))
+        pull.append((rpm, engine.torque(rpm) + rng.gauss(0.0, noise)))
+    return np.array(pull)
+
+
+def clean(samples) -> tuple[np.ndarray, np.ndarray]:
+    # sorted, unique rpms and the mean torque at each
+    samples = np.asarray(samples, dtype=float).reshape(-1, 2)
+    samples = samples[np.all(np.isfinite(samples), axis=1) & (samples[:, 0] >= 0)]
+    if len(samples) < 2:
+        raise ValueError("A dyno pull needs at least 2 usable samples.")
+
+    rpm, inverse, counts = np.unique(
+        samples[:, 0], return_inverse=True, return_counts=True
+    )
+    torque = np.bincount(inverse, weights=samples[:, 1]) / counts
+    return rpm, torque
+
+
+def smooth(
+    rpm: np.ndarray, torque: np.ndarray, resolution: float = 50.0, window: int = 5
+) -> tuple[np.ndarray, np.ndarray]:
+    # bin means every resolution rpm, then a centered moving average of window bins
+    bins = np.floor((rpm - rpm[0]) / resolution).astype(int)
+    _, inverse, counts = np.unique(bins, return_inverse=True, return_counts=True)
+    rpm = np.bincount(inverse, weights=rpm) / counts
+    torque = np.bincount(inverse, weights=torque) / counts
+
+    # the window shrinks at the ends rather than padding them
+    half = window // 2
+    total = np.concatenate([[0.0], np.cumsum(torque)])
+    index = np.arange(len(torque))
+    low = np.maximum(index - half, 0)
+    high = np.minimum(index + half + 1, len(torque))
+    return rpm, (total[high] - total[low]) / (high - low)
+
+
+def monotone_spline(rpm: np.ndarray, torque: np.ndarray):
+    """
+    Fritsch-Carlson monotone cubic through the points, returned as a function
+    of an rpm array. Between two points it stays within their torques.
+    """
+
+    h = np.diff(rpm)
+    slope = np.diff(torque) / h
+
+    tangent = np.zeros_like(torque)
+    tangent[0], tangent[-1] = slope[0], slope[-1]
+    inner = slope[:-1] * slope[1:] > 0  # flat or turning points get a flat tangent
+    w1 = 2 * h[1:] + h[:-1]
+    w2 = h[1:] + 2 * h[:-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        harmonic = (w1 + w2) / (w1 / slope[:-1] + w2 / slope[1:])
+    tangent[1:-1] = np.where(inner, harmonic, 0.0)
+
+    def spline(x):
+        x = np.asarray(x, dtype=float)
+        i = np.clip(np.searchsorted(rpm, x) - 1, 0, len(rpm) - 2)
+        t = (x - rpm[i]) / h[i]
+        return (
+            (2 * t**3 - 3 * t**2 + 1) * torque[i]
+            + (t**3 - 2 * t**2 + t) * h[i] * tangent[i]
+            + (-2 * t**3 + 3 * t**2) * torque[i + 1]
+            + (t**3 - t**2) * h[i] * tangent[i + 1]
+        )
+
+    return spline
+
+
+def simplify(rpm: np.ndarray, torque: np.ndarray, tolerance: float) -> np.ndarray:
+    # indexes of the fewest points Ramer-Douglas-Peucker keeps within tolerance
+    keep = np.zeros(len(rpm), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(rpm) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        inside = slice(first + 1, last)
+        line = torque[first] + (torque[last] - torque[first]) * (
+            rpm[inside] - rpm[first]
+        ) / (rpm[last] - rpm[first])
+        error = np.abs(torque[inside] - line)
+        worst = int(np.argmax(error))
+        if error[worst] > tolerance:
+            split = first + 1 + worst
+            keep[split] = True
+            stack += [(first, split), (split, last)]
+    return np.flatnonzero(keep)
+
+
+def _curve_torque(curve: list, rpm: np.ndarray) -> np.ndarray:
+    return Engine([tuple(point) for point in curve]).torque_array(rpm)
+
+
+def _peaks(curve: list) -> dict:
+    engine = Engine([tuple(point) for point in curve])
+    rpm = np.arange(curve[0][0], curve[-1][0] + 1.0, 10.0)
+    torque = engine.torque_array(rpm)
+    power = engine.horsepower_array(rpm)
+    return {
+        "peak_torque": float(torque.max()),
+        "peak_torque_rpm": float(rpm[np.argmax(torque)]),
+        "peak_hp": float(power.max()),
+        "peak_hp_rpm": float(rpm[np.argmax(power)]),
+    }
+
+
+def _torque_cost(curve: list, calls: int = 20000) -> float:
+    # seconds per Engine.torque() call, over rpms spread across the curve
+    engine = Engine([tuple(point) for point in curve])
+    rpms = np.linspace(engine.min_rpm, engine.max_rpm, calls).tolist()
+    return timeit.timeit(lambda: [engine.torque(r) for r in rpms], number=1) / calls
+
+
+def ingest(
+    samples,
+    tolerance: float = 2.0,
+    method: str = "linear",
+    resolution: float = 50.0,
+    window: int = 5,
+) -> tuple[list, dict]:
+    """
+    The simplified torque curve of a dyno pull, as [rpm, torque] breakpoints
+    for an Engine or a car definition, and the fidelity report.
+    """
+
+    if method not in METHODS:
+        raise ValueError(f"Unknown method: {method}. Must be one of {list(METHODS)}.")
+    if tolerance <= 0:
+        raise ValueError(f"Invalid tolerance: {tolerance}. Must be positive.")
+    if resolution < 1:
+        raise ValueError(f"Invalid resolution: {resolution}. Must be at least 1 rpm.")
+
+    samples = np.asarray(samples, dtype=float).reshape(-1, 2)
+    rpm, torque = clean(samples)
+    unique = len(rpm)
+    rpm, torque = smooth(rpm, torque, resolution, window)
+    # whole rpms and hundredths of a ft-lb are plenty for a curve in a file,
+    # round before simplifying so the tolerance still holds for the curve as
+    # written. a car definition takes no torque below 0
+    rpm = np.round(rpm)
+    torque = np.maximum(np.round(torque, 2), 0.0)
+    smoothed = [[float(r), float(t)] for r, t in zip(rpm, torque)]
+
+    if method == "spline":
+        # simplify a fine sampling of the spline instead of the points themselves,
+        # the points included so the tolerance holds at them too
+        fine = np.linspace(rpm[0], rpm[-1], 10 * len(rpm) - 9)
+        fine = np.unique(np.concatenate([rpm, np.round(fine)]))
+        spline = np.maximum(np.round(monotone_spline(rpm, torque)(fine), 2), 0.0)
+        kept = simplify(fine, spline, tolerance)
+        curve_rpm, curve_torque = fine[kept], spline[kept]
+    else:
+        kept = simplify(rpm, torque, tolerance)
+        curve_rpm, curve_torque = rpm[kept], torque[kept]
+
+    curve = [[int(r), float(t)] for r, t in zip(curve_rpm, curve_torque)]
+
+    error = _curve_torque(curve, rpm) - torque
+    inside = (samples[:, 0] >= curve[0][0]) & (samples[:, 0] <= curve[-1][0])
+    raw_error = _curve_torque(curve, samples[inside, 0]) - samples[inside, 1]
+    finite = np.isfinite(raw_error)
+
+    report = {
+        "method": method,
+        "tolerance": tolerance,
+        "samples": len(samples),
+        "unique_rpms": unique,
+        "smoothed_points": len(smoothed),
+        "breakpoints": len(curve),
+        "max_error": float(np.abs(error).max()),
+        "rms_error": float(np.sqrt(np.mean(error**2))),
+        "raw_rms_error": float(np.sqrt(np.mean(raw_error[finite] ** 2))),
+        "smoothed": _peaks(smoothed),
+        "simplified": _peaks(curve),
+        "torque_call_smoothed": _torque_cost(smoothed),
+        "torque_call_simplified": _torque_cost(curve),
+        "smoothed_curve": smoothed,
+    }
+    return curve, report
+
+
+def race_impact(car: str | dict, curve: list, report: dict, distance: float = 0.25):
+    """
+    Adds what simplifying cost on track to the report: ET and trap speed of
+    the car with the smoothed curve and with the simplified one.
+    """
+
+    config = cars.get_config(car)
+    for name, points in (("smoothed", report["smoothed_curve"]), ("simplified", curve)):
+        config["engine"]["torque_curve"] = [list(point) for point in points]
+        report[name]["et"], report[name]["trap"] = race.evaluate(config, distance)
+    report["distance"] = distance
+
+
+def print_report(report: dict):
+    smoothed, simplified = report["smoothed"], report["simplified"]
+    print("*" * 80)
+    print(f"DYNO INGESTION ({report['method']}, tolerance {report['tolerance']} ft-lb)")
+    print("-" * 80)
+    print(
+        f"{report['samples']} samples, {report['unique_rpms']} unique rpms,"
+        f" {report['smoothed_points']} smoothed points,"
+        f" {report['breakpoints']} breakpoints"
+    )
+    print(
+        f"torque error vs smoothed: max {report['max_error']:.2f}"
+        f" rms {report['rms_error']:.2f} ft-lb,"
+        f" vs raw samples: rms {report['raw_rms_error']:.2f} ft-lb"
+    )
+    print(f"{'':<12}{'smoothed':>14}{'simplified':>14}")
+    for key, label in (
+        ("peak_torque", "peak torque"),
+        ("peak_torque_rpm", "  at rpm"),
+        ("peak_hp", "peak hp"),
+        ("peak_hp_rpm", "  at rpm"),
+        ("et", "ET"),
+        ("trap", "trap mph"),
+    ):
+        if key in smoothed:
+            print(f"{label:<12}{smoothed[key]:>14.3f}{simplified[key]:>14.3f}")
+    print(
+        f"torque() call: {report['torque_call_smoothed'] * 1e6:.2f} us smoothed,"
+        f" {report['torque_call_simplified'] * 1e6:.2f} us simplified"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Torque curve from a dyno pull")
+    parser.add_argument("csv", nargs="?", help="dyno pull, a made up one if left out")
+    parser.add_argument("--car", default="cardinal", help="car to race the curve in")
+    parser.add_argument("--tolerance", type=float, default=2.0)
+    parser.add_argument("--method", choices=METHODS, default="linear")
+    parser.add_argument("--resolution", type=float, default=50.0)
+    parser.add_argument("--window", type=int, default=5)
+    parser.add_argument("--samples", type=int, default=5000)
+    parser.add_argument("--noise", type=float, default=4.0)
+    args = parser.parse_args()
+
+    if args.csv:
+        pull = read_csv(args.csv)
+    else:
+        pull = synthetic_pull(
+            cars.from_config(cars.get_config(args.car)).engine,
+            args.samples,
+            args.noise,
+        )
+
+    curve, report = ingest(
+        pull, args.tolerance, args.method, args.resolution, args.window
+    )
+    race_impact(args.car, curve, report)
+    print_report(report)
+
+    # ready to paste into a car definition
+    print("-" * 80)
+    print("torque_curve = [")
+    for rpm, torque in curve:
+        print(f"    [{rpm}, {torque:g}],")
+    print("]")
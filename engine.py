@@ -47,30 +47,82 @@ class Engine:
         torque = self.torque(rpm)
         return (torque * rpm) / 5252
 
+    def torque_array(self, rpm):
+        # torque() over a numpy array of rpms, the same float math element by element
+        import numpy as np
 
-if __name__ == "__main__":
+        rpm = np.asarray(rpm, dtype=float)
+        points = np.array(self.torque_curve, dtype=float).reshape(-1, 2)
+        curve_rpm, curve_torque = points[:, 0], points[:, 1]
+        if len(points) < 2 or np.any(np.diff(curve_rpm) <= 0):
+            # only a strictly increasing curve can be searched, scan the rest
+            return np.array([self.torque(r) for r in rpm.ravel()]).reshape(rpm.shape)
+
+        # the segment torque() would pick, an rpm on a breakpoint takes the lower one
+        segment = np.clip(np.searchsorted(curve_rpm, rpm) - 1, 0, len(points) - 2)
+        rpm1 = curve_rpm[segment]
+        torque1 = curve_torque[segment]
+        torque = torque1 + (curve_torque[segment + 1] - torque1) * (rpm - rpm1) / (
+            curve_rpm[segment + 1] - rpm1
+        )
+        inside = (rpm >= curve_rpm[0]) & (rpm <= curve_rpm[-1])
+        return np.where(inside, torque, 0.0)
+
+    def horsepower_array(self, rpm):
+        return (self.torque_array(rpm) * rpm) / 5252
+
+
+def plot_dyno(
+    engine: Engine,
+    title: str = "Torque and Horsepower Curve",
+    transmission=None,
+    wheel=None,
+):
+    # plotting is the only thing that needs matplotlib / numpy, import them here
     import matplotlib.pyplot as plt
     import numpy as np
 
-    # Example usage
-    engine = Engine()
-    print("Max RPM:", engine.max_rpm)
-    print("Max Torque:", engine.max_torque)
-    print("Max Horsepower:", engine.max_horsepower)
-    # print("Torque at 2500 RPM:", engine.torque(2500))
-    # print("Horsepower at 2500 RPM:", engine.horsepower(2500))
-    print("Min RPM:", engine.min_rpm)
-
     # make a plot of the torque and power curve vs rpm like a dyno chart
     x = np.arange(0, engine.max_rpm + 500, 100)
-    y = np.array([engine.torque(i) for i in x])
-    y2 = np.array([engine.horsepower(i) for i in x])
+    y = engine.torque_array(x)
+    y2 = engine.horsepower_array(x)
+
+    if transmission is not None and wheel is not None:
+        # and next to it the road speed every gear gives over the rev range
+        _, (dyno, gearing) = plt.subplots(1, 2, figsize=(12, 5))
+        gears = np.arange(1, transmission.max_gear + 1)
+        speeds = wheel.speed_mph_array(
+            transmission.output_rpm_array(x[:, None], gears[None, :])
+        )
+        for gear in gears:
+            gearing.plot(x, speeds[:, gear - 1], label=transmission.gear_name(gear))
+        gearing.axvline(engine.shift_rpm, color="gray", linestyle="--")
+        gearing.set_xlabel("RPM")
+        gearing.set_ylabel("Speed (mph)")
+        gearing.set_title("Gearing")
+        gearing.legend()
+        gearing.grid()
+        plt.sca(dyno)
+
     plt.plot(x, y, label="Torque", color="blue")
     plt.plot(x, y2, label="Horsepower", color="red")
     plt.xlabel("RPM")
     plt.ylabel("Torque / Horsepower")
-    plt.title("Torque and Horsepower Curve")
+    plt.title(title)
     plt.legend()
 
     plt.grid()
     plt.show()
+
+
+if __name__ == "__main__":
+    # Example usage
+    engine = Engine()
+    print("Max RPM:", engine.max_rpm)
+    print("Max Torque:", engine.max_torque)
+    print("Max Horsepower:", engine.max_horsepower)
+    # print("Torque at 2500 RPM:", engine.torque(2500))
+    # print("Horsepower at 2500 RPM:", engine.horsepower(2500))
+    print("Min RPM:", engine.min_rpm)
+
+    plot_dyno(engine)
@@ -0,0 +1,271 @@
+"""
+
+Engine sound made up on the fly from rpm and throttle.
+
+One turn of the engine's cycle (two crank revolutions) is precomputed as a
+wavetable for each engine layout: a pulse for every cylinder at its firing
+angle, shaped by the layout's harmonics. There is a table for on throttle
+(more harmonics, slower decay) and one for off throttle, and playing is
+only stepping through them at rpm / 120 cycles a second and fading between
+the two by throttle. A chunk is a few hundred samples of numpy, tens of
+microseconds.
+
+Chunks are short (256 samples, under 6 ms, longer only if the game cannot
+keep up with that) and go to a pygame mixer channel
+one at a time: one playing, at most one queued. pump() tops the channel up
+whenever its queue has room and does nothing otherwise, so it can be called
+as often as the game likes without ever waiting on the mixer, and a shift is
+in the next chunk to play, not behind a long buffer. The rpm glides from
+one chunk to the next instead of jumping.
+
+    python engine_sound.py --out sweep.wav     # a rev sweep with shifts to listen to
+
+"""
+
+import argparse
+import math
+import time
+from functools import lru_cache
+
+import numpy as np
+
+SAMPLE_RATE = 44100
+CHUNK = 256
+MAX_CHUNK = 2048
+TABLE_SIZE = 4096
+IDLE_RPM = 900
+
+# firing angles (degrees of the 720 degree cycle), the loudness of each
+# cylinder's pulse, and the harmonics of a pulse on and off throttle
+PROFILES = {
+    "inline4": {
+        "firing": (0, 180, 360, 540),
+        "gain": (1.0, 0.95, 1.0, 0.92),
+        "on": (1.0, 0.6, 0.35, 0.2, 0.12),
+        "off": (1.0, 0.3, 0.1),
+    },
+    "v6": {
+        "firing": (0, 120, 240, 360, 480, 600),
+        "gain": (1.0, 0.9, 0.97, 1.0, 0.9, 0.95),
+        "on": (1.0, 0.7, 0.4, 0.25, 0.15),
+        "off": (1.0, 0.35, 0.1),
+    },
+    "flat_plane_v8": {
+        "firing": (0, 90, 180, 270, 360, 450, 540, 630),
+        "gain": (1.0, 0.96, 1.0, 0.96, 1.0, 0.96, 1.0, 0.96),
+        "on": (1.0, 0.8, 0.5, 0.35, 0.2, 0.1),
+        "off": (1.0, 0.4, 0.15),
+    },
+    # each bank fires unevenly, the burble comes from the louder pairs
+    "cross_plane_v8": {
+        "firing": (0, 90, 180, 270, 360, 450, 540, 630),
+        "gain": (1.0, 0.7, 1.15, 0.8, 0.95, 0.75, 1.2, 0.7),
+        "on": (1.0, 0.75, 0.55, 0.3, 0.2),
+        "off": (1.0, 0.45, 0.2),
+    },
+}
+
+
+def _pulse_table(profile: dict, harmonics: tuple, decay: float) -> np.ndarray:
+    # one engine cycle, every cylinder's pulse added in at its firing angle
+    cylinders = len(profile["firing"])
+    t = np.arange(TABLE_SIZE) / TABLE_SIZE
+    table = np.zeros(TABLE_SIZE)
+    for angle, gain in zip(profile["firing"], profile["gain"]):
+        # time since this cylinder fired, in firing intervals
+        x = ((t - angle / 720) % 1.0) * cylinders
+        shape = sum(
+            h * np.sin(2 * np.pi * (k + 1) * x) for k, h in enumerate(harmonics)
+        )
+        table += gain * np.exp(-x / decay) * shape
+    table -= table.mean()
+    return table / np.abs(table).max()
+
+
+@lru_cache(maxsize=None)
+def wavetables(profile: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (on throttle, off throttle) tables of a profile, each TABLE_SIZE + 1
+    float32 samples of one cycle (the extra one wraps, for interpolation).
+    """
+
+    if profile not in PROFILES:
+        raise ValueError(
+            f"Unknown profile: {profile}. Must be one of {list(PROFILES)}."
+        )
+    settings = PROFILES[profile]
+    tables = []
+    for harmonics, decay in ((settings["on"], 0.45), (settings["off"], 0.25)):
+        table = _pulse_table(settings, harmonics, decay)
+        tables.append(np.append(table, table[0]).astype(np.float32))
+    return tables[0], tables[1]
+
+
+class EngineSynth:
+    """
+    Turns rpm and throttle into samples. render() continues where the last
+    chunk left off, gliding rpm and throttle from their last values.
+    """
+
+    def __init__(
+        self,
+        profile: str = "inline4",
+        sample_rate: int = SAMPLE_RATE,
+        volume: float = 0.5,
+    ):
+        self.on, self.off = wavetables(profile)
+        self.sample_rate = sample_rate
+        self.volume = volume
+        self.phase = 0.0  # position in the table
+        self.rpm = IDLE_RPM
+        self.throttle = 0.0
+        self.ramp = np.arange(1, CHUNK + 1, dtype=np.float64) / CHUNK
+
+    def render(self, rpm: float, throttle: float, samples: int = CHUNK) -> np.ndarray:
+        # samples float32 samples in -1..1
+        if samples != len(self.ramp):
+            self.ramp = np.arange(1, samples + 1, dtype=np.float64) / samples
+        rpm = max(rpm, IDLE_RPM)
+
+        # table steps per sample, rpm / 120 engine cycles a second
+        start = self.rpm * TABLE_SIZE / (120 * self.sample_rate)
+        end = rpm * TABLE_SIZE / (120 * self.sample_rate)
+        phases = self.phase + np.cumsum(start + (end - start) * self.ramp)
+        self.phase = phases[-1] % TABLE_SIZE
+        phases %= TABLE_SIZE
+
+        index = phases.astype(np.int64)
+        fraction = (phases - index).astype(np.float32)
+        on = self.on[index] + (self.on[index + 1] - self.on[index]) * fraction
+        off = self.off[index] + (self.off[index + 1] - self.off[index]) * fraction
+
+        mix = (self.throttle + (throttle - self.throttle) * self.ramp).astype(
+            np.float32
+        )
+        self.rpm, self.throttle = rpm, throttle
+        return (off + (on - off) * mix) * (self.volume * (0.45 + 0.55 * mix))
+
+
+class EngineSound:
+    """
+    An EngineSynth playing on a pygame mixer channel. update() sets what the
+    engine is doing, pump() keeps the channel fed, neither ever waits.
+    """
+
+    def __init__(self, profile: str = "inline4", volume: float = 0.5):
+        import pygame
+
+        self.pygame = pygame
+        if not pygame.mixer.get_init():
+            pygame.mixer.init(SAMPLE_RATE, -16, 1, CHUNK)
+        frequency, _, self.channels = pygame.mixer.get_init()
+        self.synth = EngineSynth(profile, frequency, volume)
+        self.channel = pygame.mixer.find_channel(True)
+        self.target = (IDLE_RPM, 0.0)
+        self.samples = CHUNK  # grows if the game cannot pump often enough
+        self.playing = False  # sound has been sent since the last stop()
+        self.playing_until = 0.0  # perf_counter time the sound sent runs out
+        self.chunks = 0
+        self.underruns = 0
+        self.render_ns = 0
+
+    def update(self, rpm: float, throttle: float):
+        self.target = (rpm, float(throttle))
+
+    def update_from_vehicle(self, vehicle):
+        self.update(vehicle.current_engine_rpm, vehicle.current_throttle)
+
+    def _chunk(self):
+        start = time.perf_counter_ns()
+        samples = self.synth.render(*self.target, self.samples)
+        pcm = (samples * 32767).astype(np.int16)
+        if self.channels > 1:
+            pcm = np.repeat(pcm, self.channels)
+        sound = self.pygame.mixer.Sound(buffer=pcm.tobytes())
+        self.render_ns += time.perf_counter_ns() - start
+        self.chunks += 1
+        return sound
+
+    def pump(self):
+        # queue the next chunk if there is room for it, an idle channel plays
+        # it straight away
+        if self.channel.get_queue() is not None:
+            return
+
+        now = time.perf_counter()
+        if self.playing and now > self.playing_until:
+            # everything sent has been played, the frame was busier than a
+            # chunk is long. Longer chunks cost latency but not gaps
+            self.underruns += 1
+            self.samples = min(2 * self.samples, MAX_CHUNK)
+        sound = self._chunk()
+        self.playing_until = max(self.playing_until, now) + (sound.get_length())
+        self.channel.queue(sound)
+        self.playing = True
+
+    def stop(self):
+        # silence, the next pump() starts afresh with short chunks, the gap
+        # in between is not an underrun
+        self.channel.stop()
+        self.playing = False
+        self.playing_until = 0.0
+        self.samples = CHUNK
+
+    def stats(self) -> str:
+        average = self.render_ns / max(1, self.chunks) / 1000
+        return (
+            f"{self.chunks} chunks, {average:.0f} us each to make"
+            f" ({self.samples / self.synth.sample_rate * 1000:.1f} ms of sound now),"
+            f" {self.underruns} underruns"
+        )
+
+
+def rev_sweep(profile: str, seconds: float = 6.0) -> np.ndarray:
+    # full throttle through four gears and a lift at the end, as samples
+    synth = EngineSynth(profile)
+    chunks = int(seconds * SAMPLE_RATE / CHUNK)
+    out = []
+    for i in range(chunks):
+        t = i / chunks
+        gear_time = (t * 5) % 1.0
+        rpm = 2500 + 4800 * gear_time if t < 0.8 else 2500 + 2000 * (1 - t) / 0.2
+        out.append(synth.render(rpm, 1.0 if t < 0.8 else 0.0))
+    return np.concatenate(out)
+
+
+if __name__ == "__main__":
+    import wave
+
+    parser = argparse.ArgumentParser(description="Engine sound synthesis")
+    parser.add_argument("--profile", choices=list(PROFILES), default="inline4")
+    parser.add_argument("--out", help="write a rev sweep to this wav file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for name in PROFILES:
+        wavetables(name)
+    print(
+        f"wavetables for {len(PROFILES)} profiles: {(time.perf_counter() - start) * 1000:.1f} ms"
+    )
+
+    synth = EngineSynth(args.profile)
+    count = 2000
+    start = time.perf_counter()
+    for i in range(count):
+        synth.render(2000 + 3 * i, (i // 100) % 2)
+    per_chunk = (time.perf_counter() - start) / count
+    chunk_ms = CHUNK / SAMPLE_RATE * 1000
+    print(
+        f"{per_chunk * 1e6:.0f} us to make a {chunk_ms:.1f} ms chunk"
+        f" ({per_chunk * 1000 / chunk_ms:.1%} of real time,"
+        f" {math.ceil(1000 / 60 / chunk_ms)} chunks a 60 Hz frame)"
+    )
+
+    if args.out:
+        samples = (rev_sweep(args.profile) * 32767).astype(np.int16)
+        with wave.open(args.out, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(SAMPLE_RATE)
+            f.writeframes(samples.tobytes())
+        print(f"Saved {len(samples) / SAMPLE_RATE:.1f} sec to {args.out}")
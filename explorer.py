@@ -0,0 +1,385 @@
+"""
+
+Design space explorer, the setups of a car that are not beaten at everything.
+
+Tuning trades quarter mile ET against top speed (the speed at five miles),
+the five mile time, weight and what the changes would cost. A setup is on a
+car's Pareto frontier when no other setup found is at least as good at all
+of them and better at one.
+
+An Explorer samples setups around one car (its car class) in batches: a
+Latin hypercube over the parameter ranges to start with, after that mostly
+small mutations of setups already on the frontier and a few fresh samples so
+it keeps looking elsewhere. Each batch goes to a process pool at once, one
+pass per setup out to five miles. Every new result is offered to the
+archive, which keeps it only if nothing in it dominates it and drops the
+members it dominates, so the archive is always the frontier so far.
+
+Parameters are snapped to a fine grid before a setup is built and every
+setup is cached by its config hash, a setup that comes up again (a mutation
+that lands where another already did) is never run twice. save() writes the
+cache and the archive to json and load() picks the search up from there.
+
+    python explorer.py cardinal budgie --evaluations 1000 --out frontiers
+    python explorer.py cardinal --evaluations 2000 --out frontiers   # resumes
+
+"""
+
+import argparse
+import copy
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import cars
+import race
+
+# parameter -> (low, high) scale of the car's own value
+BOUNDS = {
+    "torque_scale": (0.6, 2.0),
+    "weight_scale": (0.7, 1.2),
+    "final_drive_scale": (0.8, 1.25),
+    "tire_scale": (0.9, 1.1),
+    "drag_scale": (0.6, 1.2),
+}
+
+# objective -> True if bigger is better
+OBJECTIVES = {
+    "et": False,
+    "top_speed": True,
+    "five_mile": False,
+    "weight": False,
+    "cost": False,
+}
+
+# a cost proxy in dollars at flat rates: every peak horsepower, every pound
+# taken out and every percent of drag taken off, adding weight or drag is free
+COST_PER_HP = 40.0
+COST_PER_LB_REMOVED = 25.0
+COST_PER_DRAG_PERCENT = 400.0
+
+# parameters are snapped to this fraction of their range
+RESOLUTION = 1e-3
+
+# batches in a row that found nothing new before a search gives up
+PATIENCE = 3
+
+
+def configure(base: dict, parameters: dict) -> dict:
+    # a copy of base with the parameters applied
+    config = copy.deepcopy(base)
+    config["engine"]["torque_curve"] = [
+        [rpm, torque * parameters["torque_scale"]]
+        for rpm, torque in config["engine"]["torque_curve"]
+    ]
+    config["weight_lbs"] *= parameters["weight_scale"]
+    config["transmission"]["final_drive"] *= parameters["final_drive_scale"]
+    config["wheel"]["diameter_inches"] *= parameters["tire_scale"]
+    config["drag_coefficient"] *= parameters["drag_scale"]
+    return config
+
+
+def cost(base: dict, config: dict) -> float:
+    # cost proxy of config as a build of base
+    peak_hp = max(
+        torque * rpm / 5252 for rpm, torque in config["engine"]["torque_curve"]
+    )
+    removed = max(0.0, base["weight_lbs"] - config["weight_lbs"])
+    drag = max(0.0, 1 - config["drag_coefficient"] / base["drag_coefficient"])
+    return (
+        COST_PER_HP * peak_hp
+        + COST_PER_LB_REMOVED * removed
+        + COST_PER_DRAG_PERCENT * 100 * drag
+    )
+
+
+def evaluate(config: dict) -> tuple[float, float, float]:
+    # (ET, top speed, five mile time) of one pass, runs in the worker processes
+    times = race.evaluate(config, [0.25, 5.0])
+    (et, _), (five_mile, top_speed) = times[0.25], times[5.0]
+    return et, top_speed, five_mile
+
+
+def dominates(a: dict, b: dict) -> bool:
+    # a is at least as good as b at every objective and better at one
+    better = False
+    for objective, bigger in OBJECTIVES.items():
+        x, y = (a[objective], b[objective]) if bigger else (b[objective], a[objective])
+        if x < y:
+            return False
+        better = better or x > y
+    return better
+
+
+class ParetoArchive:
+    # the non dominated setups, as {"key", "parameters", "objectives"}
+
+    def __init__(self):
+        self.members = []
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def add(self, entry: dict) -> bool:
+        # keep entry if nothing dominates or equals it, drop what it dominates
+        objectives = entry["objectives"]
+        for member in self.members:
+            if member["objectives"] == objectives or dominates(
+                member["objectives"], objectives
+            ):
+                return False
+        self.members = [
+            member
+            for member in self.members
+            if not dominates(objectives, member["objectives"])
+        ]
+        self.members.append(entry)
+        return True
+
+    def best(self, objective: str) -> dict:
+        pick = max if OBJECTIVES[objective] else min
+        return pick(self.members, key=lambda member: member["objectives"][objective])
+
+
+class Explorer:
+
+    def __init__(
+        self,
+        car: str | dict,
+        bounds: dict | None = None,
+        batch: int = 64,
+        mutation: float = 0.08,
+        fresh: float = 0.25,
+        seed: int = 0,
+    ):
+        self.name = car if isinstance(car, str) else cars.config_key(car)[:8]
+        self.base = cars.get_config(car)
+        self.bounds = dict(bounds or BOUNDS)
+        self.batch = batch
+        self.mutation = mutation  # spread of a mutation, as a fraction of the range
+        self.fresh = fresh  # share of each batch sampled fresh after the first
+        self.seed = seed
+
+        self.archive = ParetoArchive()
+        self.cache = {}  # config key -> {"parameters", "objectives"}
+        self.batches = 0
+        self.duplicates = 0  # proposals answered by the cache
+
+    def _latin_hypercube(self, rng: np.random.Generator, count: int) -> np.ndarray:
+        # count points in the unit cube, one in every 1 / count slice of each axis
+        dimensions = len(self.bounds)
+        slices = np.array([rng.permutation(count) for _ in range(dimensions)]).T
+        return (slices + rng.random((count, dimensions))) / count
+
+    def propose(self, rng: np.random.Generator, count: int) -> list:
+        # count parameter sets, mutations of the frontier and fresh samples
+        names = list(self.bounds)
+        low = np.array([self.bounds[name][0] for name in names])
+        high = np.array([self.bounds[name][1] for name in names])
+        # a parameter fixed at one value (low == high) spans nothing
+        span = np.where(high > low, high - low, 1.0)
+
+        fresh = count if not self.archive else int(round(count * self.fresh))
+        units = [self._latin_hypercube(rng, fresh)] if fresh else []
+        if count > fresh:
+            parents = rng.integers(len(self.archive), size=count - fresh)
+            start = np.array(
+                [
+                    [
+                        (self.archive.members[i]["parameters"][name] - low[j]) / span[j]
+                        for j, name in enumerate(names)
+                    ]
+                    for i in parents
+                ]
+            )
+            units.append(start + rng.normal(0.0, self.mutation, start.shape))
+        units = np.clip(np.concatenate(units), 0.0, 1.0)
+
+        # snapped, so setups closer than the resolution are the same setup
+        units = np.round(units / RESOLUTION) * RESOLUTION
+        values = np.round(low + units * (high - low), 6)
+        return [dict(zip(names, map(float, row))) for row in values]
+
+    def step(self, pool: ProcessPoolExecutor) -> int:
+        # run one batch, returns how many setups were simulated
+        rng = np.random.default_rng([self.seed, self.batches])
+        missing = {}
+        for parameters in self.propose(rng, self.batch):
+            config = configure(self.base, parameters)
+            key = cars.config_key(config)
+            if key in self.cache or key in missing:
+                self.duplicates += 1
+                continue
+            missing[key] = (parameters, config)
+
+        results = pool.map(
+            evaluate,
+            [config for _, config in missing.values()],
+            chunksize=max(1, len(missing) // 64),
+        )
+        for (key, (parameters, config)), (et, top_speed, five_mile) in zip(
+            missing.items(), results
+        ):
+            entry = {
+                "key": key,
+                "parameters": parameters,
+                "objectives": {
+                    "et": et,
+                    "top_speed": top_speed,
+                    "five_mile": five_mile,
+                    "weight": config["weight_lbs"],
+                    "cost": cost(self.base, config),
+                },
+            }
+            self.cache[key] = entry
+            self.archive.add(entry)
+
+        self.batches += 1
+        return len(missing)
+
+    def run(
+        self,
+        evaluations: int,
+        workers: int | None = None,
+        path: str | None = None,
+    ) -> ParetoArchive:
+        """
+        Explore until evaluations setups have been simulated (counting the
+        ones from before a resume), saving to path after every batch. Stops
+        early once PATIENCE batches in a row were all setups already cached,
+        the search space has run out of new ones at this resolution.
+        """
+
+        idle = 0
+        with ProcessPoolExecutor(workers) as pool:
+            while len(self.cache) < evaluations and idle < PATIENCE:
+                idle = 0 if self.step(pool) else idle + 1
+                if path is not None:
+                    self.save(path)
+        return self.archive
+
+    def save(self, path: str):
+        state = {
+            "name": self.name,
+            "base": self.base,
+            "bounds": self.bounds,
+            "batch": self.batch,
+            "mutation": self.mutation,
+            "fresh": self.fresh,
+            "seed": self.seed,
+            "batches": self.batches,
+            "duplicates": self.duplicates,
+            "evaluated": list(self.cache.values()),
+            "archive": [member["key"] for member in self.archive.members],
+        }
+        # write next to the target and rename, a crash never leaves half a file
+        partial = f"{path}.{os.getpid()}.partial"
+        with open(partial, "w") as f:
+            json.dump(state, f)
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Explorer":
+        with open(path) as f:
+            state = json.load(f)
+
+        explorer = cls(
+            state["base"],
+            state["bounds"],
+            state["batch"],
+            state["mutation"],
+            state["fresh"],
+            state["seed"],
+        )
+        explorer.name = state["name"]
+        explorer.batches = state["batches"]
+        explorer.duplicates = state["duplicates"]
+        explorer.cache = {entry["key"]: entry for entry in state["evaluated"]}
+        explorer.archive.members = [explorer.cache[key] for key in state["archive"]]
+        return explorer
+
+
+def explore(
+    car: str,
+    evaluations: int,
+    out: str | None = None,
+    workers: int | None = None,
+    **kwargs,
+) -> Explorer:
+    """
+    The frontier of one car. With out given it is saved as out/<car>.json
+    after every batch, and picked up from there if that file already exists
+    (the remaining keyword arguments only apply to a new search).
+    """
+
+    path = None
+    explorer = None
+    if out is not None:
+        os.makedirs(out, exist_ok=True)
+        path = os.path.join(out, f"{car}.json")
+        if os.path.exists(path):
+            explorer = Explorer.load(path)
+            if explorer.base != cars.get_config(car):
+                raise ValueError(
+                    f"{path} was explored from a different {car}, remove it to start over."
+                )
+    if explorer is None:
+        explorer = Explorer(car, **kwargs)
+
+    explorer.run(evaluations, workers, path)
+    return explorer
+
+
+def print_frontier(explorer: Explorer, top: int = 10):
+    archive = explorer.archive
+    print("*" * 80)
+    print(
+        f"{explorer.name}: {len(archive)} setups on the frontier of"
+        f" {len(explorer.cache)} simulated ({explorer.duplicates} duplicates skipped)"
+    )
+    print("-" * 80)
+    print(
+        f"{'best at':<12}{'ET':>8}{'top mph':>9}{'5 mile':>9}{'lbs':>7}{'cost':>9}"
+        f"  parameters"
+    )
+    picks = [(objective, archive.best(objective)) for objective in OBJECTIVES]
+    ranked = sorted(archive.members, key=lambda member: member["objectives"]["et"])
+    step = max(1, len(ranked) // top)
+    picks += [("", member) for member in ranked[::step][:top]]
+    for label, member in picks:
+        o = member["objectives"]
+        setup = " ".join(f"{v:.3f}" for v in member["parameters"].values())
+        print(
+            f"{label:<12}{o['et']:>8.3f}{o['top_speed']:>9.1f}{o['five_mile']:>9.2f}"
+            f"{o['weight']:>7.0f}{o['cost']:>9.0f}  {setup}"
+        )
+
+
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="Pareto frontier of car setups")
+    parser.add_argument("cars", nargs="*", default=list(cars.CATALOG))
+    parser.add_argument("--evaluations", type=int, default=500, help="per car")
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--out", help="save (and resume) frontiers in this directory")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"parameters (low high, scale of the car's own): {BOUNDS}")
+    for car in args.cars:
+        start = time.perf_counter()
+        explorer = explore(
+            car,
+            args.evaluations,
+            args.out,
+            args.workers,
+            batch=args.batch,
+            seed=args.seed,
+        )
+        elapsed = time.perf_counter() - start
+        print_frontier(explorer)
+        print(f"{elapsed:.2f} sec")
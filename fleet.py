@@ -0,0 +1,430 @@
+"""
+
+A fleet of vehicles stepped together.
+
+Every car keeps its own engine, gearing, tires and body, but the state lives
+in numpy arrays (one slot per car) and one call to step() advances the whole
+field by a tick. The math is the same as Vehicle.update(), done in the same
+order, so a car in a fleet ends up in exactly the same place as the same car
+simulated on its own.
+
+For huge batches a fleet can be float32 instead (Fleet(vehicles, np.float32)),
+half the bytes per car in its state and in a FleetLog, so twice the cars fit
+in the same memory. Rounding then adds up tick after tick, mostly in the
+odometer: measured against Vehicle.update() it is microseconds of ET over a
+quarter mile but around a hundredth of a second over five miles.
+choose_dtype() measures it on a sample of the batch and only hands out
+float32 where it stays within TOLERANCE.
+
+"""
+
+import copy
+
+import numpy as np
+
+import race
+from vehicle import Vehicle
+
+DTYPES = (np.dtype(np.float64), np.dtype(np.float32))
+
+# how far a float32 fleet may be off a float64 Vehicle.update() pass, the
+# timing system's thousandth of a second and a hundredth of a mph
+TOLERANCE = {"et": 0.001, "trap": 0.01}
+
+
+class Fleet:
+    """
+    dtype is the float type of every per car array. float64 (the default)
+    matches Vehicle.update() exactly, float32 halves the memory of a fleet
+    (gears and ticks go to int8 and int32 with it) at the price of rounding,
+    see error_bound() and choose_dtype() before trusting it.
+    """
+
+    def __init__(self, vehicles: list[Vehicle], dtype=np.float64):
+        self.size = len(vehicles)
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in DTYPES:
+            raise ValueError(
+                f"Invalid dtype: {self.dtype}. Must be one of {[str(d) for d in DTYPES]}."
+            )
+        lean = self.dtype == np.float32
+        gear_dtype = np.int8 if lean else int
+        ticks_dtype = np.int32 if lean else int
+
+        def array(values):
+            return np.array(values, dtype=self.dtype)
+
+        # per car constants
+        self.weight_kg = array([v.weight_kg for v in vehicles])
+        self.drag_coefficient = array([v.drag_coefficient for v in vehicles])
+        self.drivetrain_efficiency = array([v.drivetrain_efficiency for v in vehicles])
+        self.rolling_resistance = array([v.rolling_resistance for v in vehicles])
+        self.frontal_area = array([v.frontal_area for v in vehicles])
+        self.air_density = array([v.air_density for v in vehicles])
+        self.tick_rate = array([v.tick_rate for v in vehicles])
+        self.shift_rpm = array([float(v.engine.shift_rpm) for v in vehicles])
+        self.max_gear = np.array(
+            [v.transmission.max_gear for v in vehicles], dtype=gear_dtype
+        )
+
+        # wheel rpm <-> mph
+        self.wheel_ratio = array([v.wheel.mph_per_rpm for v in vehicles])
+
+        # gearing by gear + 1 (reverse, neutral, 1st, 2nd, ...), padded with neutral
+        gears = int(self.max_gear.max()) + 2
+        self.input_ratio = np.zeros((self.size, gears), dtype=self.dtype)
+        self.output_ratio = np.zeros((self.size, gears), dtype=self.dtype)
+        for i, v in enumerate(vehicles):
+            count = v.transmission.max_gear + 2
+            self.input_ratio[i, :count] = v.transmission.input_ratio_vector()
+            self.output_ratio[i, :count] = v.transmission.output_ratio_vector()
+
+        # torque curves padded to the longest one, the padding is never selected
+        points = max(len(v.engine.torque_curve) for v in vehicles)
+        self.curve_rpm = np.full((self.size, points), np.inf, dtype=self.dtype)
+        self.curve_torque = np.zeros((self.size, points), dtype=self.dtype)
+        for i, v in enumerate(vehicles):
+            curve = v.engine.torque_curve
+            self.curve_rpm[i, : len(curve)] = [point[0] for point in curve]
+            self.curve_torque[i, : len(curve)] = [point[1] for point in curve]
+            self.curve_torque[i, len(curve) :] = curve[-1][1]
+        self.min_rpm = array([float(v.engine.min_rpm) for v in vehicles])
+        self.max_rpm = array([float(v.engine.max_rpm) for v in vehicles])
+
+        # dynamic state
+        self.ticks = np.array([v.ticks for v in vehicles], dtype=ticks_dtype)
+        self.current_gear = np.array(
+            [v.current_gear for v in vehicles], dtype=gear_dtype
+        )
+        self.current_speed_mph = array([float(v.current_speed_mph) for v in vehicles])
+        self.current_engine_rpm = array([float(v.current_engine_rpm) for v in vehicles])
+        self.current_throttle = array([v.current_throttle for v in vehicles])
+        self.odometer_miles = array([v.odometer_miles for v in vehicles])
+        self.last_accel = array([v.last_accel for v in vehicles])
+        self.last_decel = array([v.last_decel for v in vehicles])
+
+        self._rows = np.arange(self.size)
+
+    @property
+    def nbytes(self) -> int:
+        # memory of every per car array
+        return sum(
+            value.nbytes
+            for value in vars(self).values()
+            if isinstance(value, np.ndarray)
+        )
+
+    def torque(self, rpm: np.ndarray) -> np.ndarray:
+        # same as Engine.torque, the first segment that contains the rpm wins
+        segment = (self.curve_rpm < rpm[:, None]).sum(axis=1) - 1
+        segment = np.clip(segment, 0, self.curve_rpm.shape[1] - 2)
+
+        rpm1 = self.curve_rpm[self._rows, segment]
+        rpm2 = self.curve_rpm[self._rows, segment + 1]
+        torque1 = self.curve_torque[self._rows, segment]
+        torque2 = self.curve_torque[self._rows, segment + 1]
+
+        inside = (rpm >= self.min_rpm) & (rpm <= self.max_rpm)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            torque = torque1 + (torque2 - torque1) * (rpm - rpm1) / (rpm2 - rpm1)
+        return np.where(inside, torque, 0.0)
+
+    def horsepower(self, rpm: np.ndarray) -> np.ndarray:
+        return (self.torque(rpm) * rpm) / 5252
+
+    def step(self):
+        # one Vehicle.update() for every car in the fleet
+        self.ticks += 1
+
+        speed = self.current_speed_mph
+        throttle = self.current_throttle
+        gear_index = self.current_gear + 1
+
+        stopped = speed == 0
+        launching = stopped & (throttle > 0)
+
+        # acceleration
+        hp = self.horsepower(self.current_engine_rpm) * throttle
+        power_watts = hp * 745.7
+        speed_mps = speed * 0.44704
+        speed_mps = np.where(speed_mps < 0.1, 0.1, speed_mps)
+        force = power_watts / speed_mps
+        acceleration_mps2 = force / self.weight_kg
+        accel = acceleration_mps2 * 2.23694
+        accel *= self.tick_rate
+        accel *= self.drivetrain_efficiency
+        accel = np.where((throttle == 0) | stopped, 0.0, accel)
+
+        # deceleration
+        mass = self.weight_kg
+        iv = speed * 0.44704
+        F_rr = self.rolling_resistance * mass * 9.81
+        F_drag = (
+            0.5 * self.air_density * self.drag_coefficient * self.frontal_area * iv**2
+        )
+        F_total = F_rr + F_drag
+        a = -F_total / mass
+        decel = a * self.tick_rate
+        decel = decel * 2.23694
+
+        moving_speed = np.maximum(0.0, speed + (accel + decel))
+        launch_speed = self.wheel_ratio * (
+            self.current_engine_rpm * self.output_ratio[self._rows, gear_index]
+        )
+
+        moving = ~stopped
+        self.last_accel = np.where(moving, accel, self.last_accel)
+        self.last_decel = np.where(moving, decel, self.last_decel)
+
+        self.current_speed_mph = np.where(
+            moving, moving_speed, np.where(launching, launch_speed, speed)
+        )
+        self.odometer_miles = np.where(
+            moving,
+            self.odometer_miles + (moving_speed / 3600) * self.tick_rate,
+            self.odometer_miles,
+        )
+
+        wheel_rpm = self.current_speed_mph / self.wheel_ratio
+        self.current_engine_rpm = np.where(
+            moving,
+            wheel_rpm * self.input_ratio[self._rows, gear_index],
+            self.current_engine_rpm,
+        )
+
+    def auto_shift(self):
+        # shift up any car past its shift rpm, like the race drivers do
+        shifting = self.current_engine_rpm > self.shift_rpm
+        self.current_gear = np.where(
+            shifting,
+            np.minimum(self.max_gear, self.current_gear + 1),
+            self.current_gear,
+        )
+
+    def finish_times(
+        self, distance: float = 0.25, max_time: float = 600.0, log=None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (ET, trap speed) arrays of every car at full throttle to distance
+        (miles), interpolated across the finish line the way race.finish_time()
+        does it, inf and 0 for cars that never made it. log is a FleetLog to
+        capture every tick into.
+        """
+
+        et = np.full(self.size, np.inf)
+        trap = np.zeros(self.size)
+        done = np.zeros(self.size, dtype=bool)
+        max_ticks = (max_time / self.tick_rate.astype(float)).astype(int)
+
+        while not done.all():
+            self.step()
+            self.current_throttle[:] = 1.0
+            if log is not None:
+                log.capture(self)
+
+            crossed = ~done & (self.odometer_miles >= distance)
+            if crossed.any():
+                et[crossed], trap[crossed] = self._interpolate(crossed, distance)
+            done |= crossed | (self.ticks >= max_ticks)
+            self.auto_shift()
+
+        return et, trap
+
+    def _interpolate(self, cars: np.ndarray, distance: float):
+        # race.interpolate() of the selected cars, worked out in float64
+        tick_rate = self.tick_rate[cars].astype(float)
+        speed = self.current_speed_mph[cars].astype(float)
+        time = self.ticks[cars] * tick_rate
+        step = (speed / 3600) * tick_rate
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = 1.0 - (self.odometer_miles[cars].astype(float) - distance) / step
+        late = 1.0 - fraction
+        change = self.last_accel[cars].astype(float) + self.last_decel[cars].astype(
+            float
+        )
+        return (
+            np.where(step == 0, time, time - tick_rate * late),
+            np.where(step == 0, speed, speed - change * late),
+        )
+
+
+class FleetLog:
+    """
+    Every car's state each tick, in the fleet's dtype (gear as int8). Ticks
+    go into blocks of (ticks, cars) arrays of about block_bytes each, a full
+    block is kept as it is and a new one started, nothing is ever copied to
+    grow the log.
+    """
+
+    CHANNELS = ("LA", "LD", "RPM", "TPS", "Speed", "Distance")
+
+    def __init__(self, fleet: Fleet, block_bytes: int = 16 << 20):
+        self.size = fleet.size
+        self.dtype = fleet.dtype
+        self.ticks_dtype = fleet.ticks.dtype
+        self.tick_rate = fleet.tick_rate.astype(float)
+        self.tick_bytes = self.size * (
+            self.ticks_dtype.itemsize + 1 + len(self.CHANNELS) * self.dtype.itemsize
+        )
+        self.block = max(1, block_bytes // self.tick_bytes)
+        self.blocks = []  # [{"Ticks": array, "Gear": array, channel: array...}]
+        self.length = 0
+
+    def capture(self, fleet: Fleet):
+        row = self.length % self.block
+        if row == 0:
+            shape = (self.block, self.size)
+            block = {name: np.empty(shape, dtype=self.dtype) for name in self.CHANNELS}
+            block["Ticks"] = np.empty(shape, dtype=self.ticks_dtype)
+            block["Gear"] = np.empty(shape, dtype=np.int8)
+            self.blocks.append(block)
+        block = self.blocks[-1]
+        block["Ticks"][row] = fleet.ticks
+        block["Gear"][row] = fleet.current_gear
+        block["LA"][row] = fleet.last_accel
+        block["LD"][row] = fleet.last_decel
+        block["RPM"][row] = fleet.current_engine_rpm
+        block["TPS"][row] = fleet.current_throttle
+        block["Speed"][row] = fleet.current_speed_mph
+        block["Distance"][row] = fleet.odometer_miles
+        self.length += 1
+
+    def __len__(self) -> int:
+        return self.length
+
+    @property
+    def nbytes(self) -> int:
+        # memory of the ticks logged so far
+        return self.tick_bytes * self.length
+
+    def columns(self, car: int) -> dict:
+        # one car's channels like VehicleLog.columns() (without HP and WheelRPM)
+        columns = {
+            name: np.concatenate([block[name][:, car] for block in self.blocks])[
+                : self.length
+            ]
+            for name in self.CHANNELS + ("Ticks", "Gear")
+        }
+        columns["Ticks"] = columns["Ticks"].astype(int)
+        columns["Gear"] = columns["Gear"].astype(int)
+        columns["Time"] = columns["Ticks"] * self.tick_rate[car]
+        return columns
+
+
+def error_bound(
+    vehicles: list[Vehicle], distance: float = 0.25, dtype=np.float32
+) -> dict:
+    """
+    The worst ET and trap speed error of a dtype fleet against each car run
+    on its own with the float64 Vehicle.update() (race.finish_time()), plus
+    the memory the fleet took per car. The vehicles are left untouched.
+    """
+
+    fleet = Fleet(vehicles, dtype)
+    et, trap = fleet.finish_times(distance)
+    reference = np.array(
+        [race.finish_time(copy.deepcopy(v), distance) for v in vehicles]
+    ).reshape(-1, 2)
+
+    finished = np.isfinite(reference[:, 0])
+    if (np.isfinite(et) != finished).any():
+        # a car finished in one and not the other, nothing to compare
+        return {
+            "et": np.inf,
+            "trap": np.inf,
+            "bytes_per_car": fleet.nbytes / fleet.size,
+        }
+    return {
+        "et": float(np.max(np.abs(et - reference[:, 0])[finished], initial=0.0)),
+        "trap": float(np.max(np.abs(trap - reference[:, 1])[finished], initial=0.0)),
+        "bytes_per_car": fleet.nbytes / fleet.size,
+    }
+
+
+def choose_dtype(
+    vehicles: list[Vehicle],
+    distance: float = 0.25,
+    tolerance: dict | None = None,
+    sample: int = 64,
+    seed: int = 0,
+) -> tuple[np.dtype, dict]:
+    """
+    float32 for a batch of these vehicles at distance if it stays within
+    tolerance, float64 if not. The error is measured on a random sample of
+    the vehicles and float32 is only accepted with half the tolerance to
+    spare, for the cars that were not sampled. Returns (dtype, the bound).
+    """
+
+    tolerance = tolerance or TOLERANCE
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vehicles), min(sample, len(vehicles)), replace=False)
+    bound = error_bound([vehicles[i] for i in picks], distance)
+    accepted = all(bound[name] <= limit / 2 for name, limit in tolerance.items())
+    return np.dtype(np.float32 if accepted else np.float64), bound
+
+
+if __name__ == "__main__":
+    import time
+
+    import cars
+
+    # a fleet must finish exactly where each car does on its own
+    names = list(cars.CATALOG)
+    fleet = Fleet([cars.CATALOG[name]() for name in names])
+    finish = np.zeros(fleet.size)
+
+    while (finish == 0).any():
+        fleet.step()
+        fleet.current_throttle[:] = 1.0
+        crossed = (finish == 0) & (fleet.odometer_miles >= 0.25)
+        finish[crossed] = fleet.ticks[crossed] * fleet.tick_rate[crossed]
+        fleet.auto_shift()
+
+    for i, name in enumerate(names):
+        record = race.race_results(cars.CATALOG[name]())["QUARTER MILE"]
+        print(f"{name:<20} fleet {finish[i]:.3f} sec, vehicle {record['Time']:.3f} sec")
+
+    # what float32 costs in accuracy, and whether it is allowed, by distance
+    variants = []
+    rng = np.random.default_rng(0)
+    for i in range(200):
+        config = cars.get_config(names[i % len(names)])
+        config["weight_lbs"] *= rng.uniform(0.8, 1.2)
+        config["transmission"]["final_drive"] *= rng.uniform(0.9, 1.1)
+        variants.append(cars.from_config(config))
+    for distance in (0.25, 1.0, 5.0):
+        dtype, bound = choose_dtype(variants, distance)
+        print(
+            f"{distance:>5} mile float32 error: ET {bound['et']:.6f} sec,"
+            f" trap {bound['trap']:.6f} mph -> {dtype}"
+        )
+
+    # memory and step time of a big batch in either dtype
+    size = 100_000
+    vehicles = [variants[i % len(variants)] for i in range(size)]
+    for dtype in DTYPES:
+        fleet = Fleet(vehicles, dtype)
+        log = FleetLog(fleet)
+        fleet.current_throttle[:] = 1.0
+        start = time.perf_counter()
+        for _ in range(60):
+            fleet.step()
+            fleet.auto_shift()
+            log.capture(fleet)
+        elapsed = (time.perf_counter() - start) / 60
+        print(
+            f"{size} cars {dtype}: {fleet.nbytes / size:.0f} bytes per car,"
+            f" log {log.nbytes / size / len(log):.0f} bytes per car per tick,"
+            f" {elapsed * 1000:.1f} ms per step"
+        )
+
+    # frame cost as the field grows
+    for size in (1, 10, 50, 100):
+        fleet = Fleet([cars.CATALOG[names[i % len(names)]]() for i in range(size)])
+        fleet.current_throttle[:] = 1.0
+        start = time.perf_counter()
+        for _ in range(600):
+            fleet.step()
+            fleet.auto_shift()
+        elapsed = (time.perf_counter() - start) / 600
+        print(f"{size:>4} cars: {elapsed * 1e6:.1f} us per step")
@@ -0,0 +1,206 @@
+"""
+
+Where the time of a frame goes.
+
+The game loop calls mark(stage) as it finishes each part of a frame (events,
+physics, text, flip, ...) and end_frame() after the flip. With the profiler
+on, each stage's time goes into a history of the last frames, drawn as an
+overlay: a graph of frame times against the 60 Hz budget, frame time
+percentiles and the average of every stage. Tracing saves every stage of
+every frame as a Chrome trace (the json trace event format), which opens in
+chrome://tracing or ui.perfetto.dev.
+
+Switched off, mark() and end_frame() return straight away.
+
+"""
+
+import json
+import os
+import time
+from collections import deque
+
+FRAME_BUDGET_NS = 1_000_000_000 // 60
+
+# the most trace events kept, about an hour of frames with a handful of stages
+MAX_TRACE_EVENTS = 2_000_000
+
+
+def percentile(ordered: list, fraction: float):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class FrameProfiler:
+
+    def __init__(self, history: int = 300):
+        self.enabled = False  # collecting history and drawing the overlay
+        self.tracing = False
+        self.active = False  # either of them
+        self.frames = deque(maxlen=history)  # [(stage, start ns, end ns), ...]
+        self.marks = []
+        self.last = 0
+        self.trace = []
+        self.overlay = None  # cached text of the overlay, redrawn every few frames
+        self.font = None
+        self.panel = None
+        self.drawn = 0
+
+    def _update(self):
+        self.active = self.enabled or self.tracing
+        self.marks = []
+        self.last = time.perf_counter_ns()
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frames.clear()
+        self._update()
+
+    def start_trace(self):
+        self.trace = []
+        self.tracing = True
+        self._update()
+
+    def stop_trace(self, path: str) -> str:
+        # write what was traced to path as a Chrome trace
+        self.tracing = False
+        self._update()
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace, "displayTimeUnit": "ms"}, f)
+        self.trace = []
+        return path
+
+    def mark(self, stage: str):
+        # stage is done, it took the time since the last mark
+        if not self.active:
+            return
+        now = time.perf_counter_ns()
+        self.marks.append((stage, self.last, now))
+        self.last = now
+
+    def end_frame(self):
+        if not self.active:
+            return
+        marks, self.marks = self.marks, []
+        if not marks:
+            return
+        if self.enabled:
+            self.frames.append(marks)
+        if self.tracing and len(self.trace) < MAX_TRACE_EVENTS:
+            pid = os.getpid()
+            start = marks[0][1]
+            self.trace.append(
+                {
+                    "name": "frame",
+                    "ph": "X",
+                    "ts": start / 1000,
+                    "dur": (marks[-1][2] - start) / 1000,
+                    "pid": pid,
+                    "tid": 0,
+                }
+            )
+            self.trace.extend(
+                {
+                    "name": stage,
+                    "ph": "X",
+                    "ts": begin / 1000,
+                    "dur": (end - begin) / 1000,
+                    "pid": pid,
+                    "tid": 0,
+                }
+                for stage, begin, end in marks
+            )
+
+    def summary(self) -> dict:
+        # frame time percentiles and each stage's average, in ms, over the history
+        totals = sorted(marks[-1][2] - marks[0][1] for marks in self.frames)
+        stages = {}
+        for marks in self.frames:
+            for stage, begin, end in marks:
+                stages[stage] = stages.get(stage, 0) + end - begin
+        count = max(1, len(self.frames))
+        return {
+            "frames": len(totals),
+            "p50": percentile(totals, 0.50) / 1e6 if totals else 0.0,
+            "p95": percentile(totals, 0.95) / 1e6 if totals else 0.0,
+            "p99": percentile(totals, 0.99) / 1e6 if totals else 0.0,
+            "max": totals[-1] / 1e6 if totals else 0.0,
+            "stages": {stage: ns / count / 1e6 for stage, ns in stages.items()},
+        }
+
+    def draw(self, screen, scale_ms: float = 50.0):
+        # the overlay, in the top right corner of screen
+        import pygame
+
+        width, height = 420, 110
+        if self.font is None:
+            self.font = pygame.font.SysFont("monospace", 14)
+            # see through as a whole, cheaper to blit than per pixel alpha
+            self.panel = pygame.Surface((width, height + 20 * 4))
+            self.panel.set_alpha(170)
+        panel = self.panel
+        panel.fill((0, 0, 0))
+
+        # frame times, newest on the right, and the budget of a 60 Hz frame
+        budget = height - FRAME_BUDGET_NS / 1e6 / scale_ms * height
+        pygame.draw.line(panel, (255, 255, 0), (0, budget), (width, budget))
+        if len(self.frames) > 1:
+            step = width / (self.frames.maxlen - 1)
+            offset = self.frames.maxlen - len(self.frames)
+            points = [
+                (
+                    (offset + i) * step,
+                    max(0, height - (m[-1][2] - m[0][1]) / 1e6 / scale_ms * height),
+                )
+                for i, m in enumerate(self.frames)
+            ]
+            pygame.draw.lines(panel, (0, 255, 0), False, points)
+
+        # text is only worked out again every 15 frames, rendering it is not free
+        if self.overlay is None or self.drawn % 15 == 0:
+            summary = self.summary()
+            stages = list(summary["stages"].items())
+            lines = [
+                f"frame ms p50 {summary['p50']:.1f} p95 {summary['p95']:.1f}"
+                f" p99 {summary['p99']:.1f} max {summary['max']:.1f}"
+            ] + [
+                "  ".join(f"{stage} {ms:.2f}" for stage, ms in stages[i : i + 4])
+                for i in range(0, len(stages), 4)
+            ]
+            self.overlay = [
+                self.font.render(line, True, (255, 255, 255)) for line in lines[:4]
+            ]
+        for i, text in enumerate(self.overlay):
+            panel.blit(text, (4, height + 2 + 20 * i))
+
+        screen.blit(panel, (screen.get_width() - width - 10, 10))
+        self.drawn += 1
+
+
+if __name__ == "__main__":
+    # the cost of leaving the calls in the game loop with the profiler off
+    profiler = FrameProfiler()
+    stages = ("wait", "events", "update", "draw", "text", "gauges", "flip")
+    frames = 100_000
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        for stage in stages:
+            profiler.mark(stage)
+        profiler.end_frame()
+    off = (time.perf_counter() - start) / frames
+
+    profiler.toggle()
+    profiler.start_trace()
+    start = time.perf_counter()
+    for _ in range(frames):
+        for stage in stages:
+            profiler.mark(stage)
+        profiler.end_frame()
+    on = (time.perf_counter() - start) / frames
+    events = len(profiler.trace)
+    profiler.stop_trace(os.devnull)
+
+    print(
+        f"per frame with {len(stages)} stages: off {off * 1e6:.2f} us,"
+        f" on and tracing {on * 1e6:.2f} us ({events} trace events),"
+        f" off is {off / (FRAME_BUDGET_NS / 1e9):.4%} of a 60 Hz frame"
+    )
@@ -1,4 +1,5 @@
 from vehicle import Vehicle
+from driver import RpmShift, UntilDistance
 import cars
 from transmission import Transmission
 import datetime
@@ -27,7 +28,7 @@ def print_race_results(title: str, results):
         print(f"{name:<20} -  {f_timing} sec  @ {f_speed} mph")
 
 
-def main():
+def main(telemetry=None):
 
     vehicles = {
         "puffin": cars.puffin(),
@@ -37,31 +38,25 @@ def main():
         "painted_bunting": cars.painted_bunting(),
     }
 
-    while True:
-        for _, v in vehicles.items():
-            v.update()
-            v.current_throttle = 1.0  # Full throttle
-
-        # if vehicles["blue_jay"].ticks % 20 == 0:
-        #     print_readout(vehicles)
-
-        # check if any engine needs to be shifted up
-        for _, v in vehicles.items():
-            if v.current_engine_rpm > v.engine.shift_rpm:
-                v.current_gear += 1
-
-                # dont try to shift out of the max gear
-                v.current_gear = min(v.transmission.max_gear, v.current_gear)
-
-        # check if all vehicles have done a quarter mile
-        all_done = True
-
-        for _, v in vehicles.items():
-            if v.odometer_miles < 5:
-                all_done = False
-
-        if all_done:
-            break
+    # run every car out to five miles in its own tight loop
+    for name, v in vehicles.items():
+        if telemetry is None:
+            v.run(until=UntilDistance(5), shift_policy=RpmShift())
+            continue
+
+        # the same loop a few ticks at a time, sampling in between
+        stop = UntilDistance(5)
+        while not v.run(telemetry.every, until=stop, shift_policy=RpmShift())[
+            "Stopped"
+        ]:
+            telemetry.sample(name, v)
+        telemetry.flush()
+
+    # then bring them all up to the same tick so the merged log lines up
+    last_tick = max(v.ticks for v in vehicles.values())
+    for _, v in vehicles.items():
+        if v.ticks < last_tick:
+            v.run(last_tick - v.ticks, shift_policy=RpmShift())
 
     # print_readout(vehicles)
     print("All vehicles have completed the race.")
@@ -71,20 +66,15 @@ def main():
     five_mile_results = {}
 
     for name, v in vehicles.items():
-        for record in v.log:
-            if record["Distance"] >= 5:
-                five_mile_results[name] = record
-                break
-
-        for record in v.log:
-            if record["Distance"] >= 1:
-                standing_mile_results[name] = record
-                break
-
-        for record in v.log:
-            if record["Distance"] >= 0.25:
-                quarter_mile_results[name] = record
-                break
+        # the first logged tick at or past each distance
+        for distance, results in (
+            (5, five_mile_results),
+            (1, standing_mile_results),
+            (0.25, quarter_mile_results),
+        ):
+            record = v.log.crossing(distance)
+            if record is not None:
+                results[name] = record
 
     print_race_results("QUARTER MILE", quarter_mile_results)
     print_race_results("STANDING MILE", standing_mile_results)
@@ -140,4 +130,13 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    import sys
+
+    if "--telemetry" in sys.argv:
+        from telemetry import Telemetry
+
+        telemetry = Telemetry()
+        main(telemetry)
+        telemetry.close()
+    else:
+        main()
@@ -0,0 +1,271 @@
+"""
+
+Launch control, what launch rpm gets each car off the line quickest?
+
+The main simulation dumps the clutch at the launch rpm and the tires always
+hook, so a higher launch rpm would always be better. Here the launch gets a
+grip model built on the TCS:
+
+* the tires can put down at most grip * mu * weight, grip ramping up from the
+  TCS's min_grip to 1.0 over its slip time
+* the harder the tires are overpowered at the dump (wheel force at the launch
+  rpm over mu * weight), the longer the TCS takes to bring the grip back
+* the clutch slips, holding the engine at the launch rpm, until the car is
+  fast enough for the rpm in 1st to catch up
+
+so too low a launch bogs and too high a launch spins the tires.
+
+Every candidate launch rpm runs a short pass that is retired at 330 ft, only
+the quickest few go on to the 1/8 mile. The finalists are then launched again
+and again at a randomized rpm around their setting (the driver never hits the
+exact number) to see how forgiving each choice is. All passes of a stage go
+to a process pool as one batch.
+
+"""
+
+import argparse
+import math
+import random
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+
+import cars
+import race
+from tcs import TCS, TCS_MODE_QUADRATIC
+
+
+def launch_pass(
+    config: dict,
+    launch_rpm: float,
+    distance: float,
+    tcs: TCS,
+    mu: float = 1.0,
+) -> dict:
+    """
+    One full throttle pass from a launch at launch_rpm, with the grip model.
+
+    Returns {milestone: (time, speed)} for the milestones up to distance.
+    """
+
+    vehicle = cars.from_config(config)
+    vehicle.logging = False
+    engine = vehicle.engine
+    transmission = vehicle.transmission
+    wheel = vehicle.wheel
+    tick_rate = vehicle.tick_rate
+
+    # how hard the dump overpowers the tires, stretches the time to full grip
+    radius_feet = wheel.get_diameter_inches() / 24
+    wheel_force = (
+        engine.torque(launch_rpm)
+        * transmission.input_ratio(1)
+        * vehicle.drivetrain_efficiency
+        / radius_feet
+    )
+    overpower = max(1.0, wheel_force / (mu * vehicle.weight_lbs))
+    grip_accel = mu * 9.81 * 2.23694 * tick_rate  # mph per tick at full grip
+
+    marks = sorted((d, name) for name, d in race.MILESTONES.items() if d <= distance)
+    if distance not in (mark[0] for mark in marks):
+        marks.append((distance, "FINISH"))
+    results = {}
+
+    vehicle.current_engine_rpm = launch_rpm
+    vehicle.current_throttle = 1.0
+    max_ticks = int(60.0 / tick_rate)
+
+    while len(results) < len(marks) and vehicle.ticks < max_ticks:
+        vehicle.ticks += 1
+        time = vehicle.ticks * tick_rate
+        gear = vehicle.current_gear
+        speed = vehicle.current_speed_mph
+
+        # the engine is held at the launch rpm until the clutch locks up in 1st
+        locked_rpm = transmission.input_rpm(wheel.rpm_from_speed(speed), gear)
+        rpm = locked_rpm
+        if gear == 1 and locked_rpm < launch_rpm:
+            rpm = launch_rpm
+
+        speed_mps = max(0.1, speed * 0.44704)
+        accel = (
+            engine.horsepower(rpm)
+            * 745.7
+            / speed_mps
+            / vehicle.weight_kg
+            * 2.23694
+            * tick_rate
+            * vehicle.drivetrain_efficiency
+        )
+        accel = min(accel, grip_accel * tcs.grip_level(time / overpower))
+        decel = vehicle.calculate_deceleration() if speed > 0 else 0.0
+
+        vehicle.last_accel = accel
+        vehicle.current_speed_mph = max(0.0, speed + accel + decel)
+        vehicle.odometer_miles += (vehicle.current_speed_mph / 3600) * tick_rate
+        vehicle.current_engine_rpm = max(
+            rpm if gear == 1 else 0.0,
+            transmission.input_rpm(
+                wheel.rpm_from_speed(vehicle.current_speed_mph), gear
+            ),
+        )
+
+        for mark, name in marks:
+            if name not in results and vehicle.odometer_miles >= mark:
+                results[name] = race.interpolate(vehicle.log_record(), mark, tick_rate)
+
+        if vehicle.current_engine_rpm > engine.shift_rpm:
+            vehicle.current_gear = min(transmission.max_gear, gear + 1)
+
+    return results
+
+
+def _mark(results: dict, name: str) -> float:
+    # the time at a milestone, inf for a pass that gave up before it
+    return results[name][0] if name in results else math.inf
+
+
+def _run(task: tuple) -> dict:
+    return launch_pass(*task)
+
+
+def _run_all(tasks: list, workers: int | None) -> list:
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(_run, tasks, chunksize=max(1, len(tasks) // 32)))
+
+
+def optimize(
+    cars_or_configs: list,
+    tcs: TCS | None = None,
+    mu: float = 1.0,
+    candidates: int = 40,
+    finalists: int = 5,
+    jitter: float = 200.0,
+    samples: int = 64,
+    workers: int | None = None,
+    seed: int = 0,
+) -> dict:
+    """
+    Best launch rpm of every car.
+
+    Returns {car: {"current", "best_60ft", "best_eighth", "robust",
+    "passes"}}, each pick a dict of its launch rpm, times and (for the
+    finalists) the spread of its 60 ft time under a +/- jitter rpm launch.
+    """
+
+    if tcs is None:
+        tcs = TCS(slip_time=0.5, min_grip=0.4, mode=TCS_MODE_QUADRATIC)
+    rng = random.Random(seed)
+    short = race.MILESTONES["330 FT"]
+    eighth = race.MILESTONES["1/8 MILE"]
+
+    configs = {}
+    for car in cars_or_configs:
+        name = car if isinstance(car, str) else cars.config_key(car)[:8]
+        configs[name] = cars.get_config(car)
+
+    # stage 1, every candidate to 330 ft
+    grids = {}
+    tasks = []
+    for name, config in configs.items():
+        low = min(point[0] for point in config["engine"]["torque_curve"])
+        high = config["engine"]["shift_rpm"]
+        grids[name] = [
+            low + (high - low) * i / (candidates - 1) for i in range(candidates)
+        ]
+        tasks += [(config, rpm, short, tcs, mu) for rpm in grids[name]]
+    short_results = iter(_run_all(tasks, workers))
+
+    report = {}
+    stage_2 = []
+    for name, config in configs.items():
+        passes = [(rpm, next(short_results)) for rpm in grids[name]]
+        passes.sort(key=lambda p: _mark(p[1], "330 FT"))
+        report[name] = {"passes": passes, "current": config["engine"]["launch_rpm"]}
+        # a launch that never made 330 ft is no finalist
+        finished = [rpm for rpm, result in passes if "330 FT" in result]
+        stage_2 += [(name, rpm) for rpm in finished[:finalists]]
+        stage_2.append((name, report[name]["current"]))
+
+    # stage 2, the finalists (and the car as set up) to the 1/8 mile, plus
+    # the randomized launches around every finalist
+    tasks = [(configs[name], rpm, eighth, tcs, mu) for name, rpm in stage_2]
+    for name, rpm in stage_2:
+        low = min(point[0] for point in configs[name]["engine"]["torque_curve"])
+        high = configs[name]["engine"]["shift_rpm"]
+        for _ in range(samples):
+            jittered = min(high, max(low, rng.gauss(rpm, jitter)))
+            tasks.append((configs[name], jittered, short, tcs, mu))
+
+    results = _run_all(tasks, workers)
+    full = results[: len(stage_2)]
+    spread = results[len(stage_2) :]
+
+    picks = {}
+    for i, (name, rpm) in enumerate(stage_2):
+        sixty = [_mark(r, "60 FT") for r in spread[i * samples : (i + 1) * samples]]
+        # any jittered launch that never got to 60 ft makes the spread inf too
+        finished = math.inf not in sixty
+        picks.setdefault(name, []).append(
+            {
+                "launch_rpm": rpm,
+                "60 FT": _mark(full[i], "60 FT"),
+                "330 FT": _mark(full[i], "330 FT"),
+                "1/8 MILE": _mark(full[i], "1/8 MILE"),
+                "jitter_mean": statistics.fmean(sixty) if finished else math.inf,
+                "jitter_stdev": statistics.pstdev(sixty) if finished else math.inf,
+                "jitter_worst": max(sixty),
+            }
+        )
+
+    for name, rows in picks.items():
+        current = rows.pop()
+        # no finalists at all, the car as set up is all there is
+        rows = rows or [current]
+        report[name]["current"] = current
+        report[name]["best_60ft"] = min(rows, key=lambda r: r["60 FT"])
+        report[name]["best_eighth"] = min(rows, key=lambda r: r["1/8 MILE"])
+        report[name]["robust"] = min(rows, key=lambda r: r["jitter_mean"])
+
+    return report
+
+
+def print_report(report: dict):
+    for name, row in report.items():
+        print("*" * 86)
+        print(name)
+        print("-" * 86)
+        print(
+            f"{'':<14}{'launch rpm':>12}{'60 ft':>10}{'330 ft':>10}{'1/8 mile':>10}"
+            f"{'60 ft +/-':>14}{'worst':>10}"
+        )
+        for pick in ("current", "best_60ft", "best_eighth", "robust"):
+            values = row[pick]
+            print(
+                f"{pick:<14}{values['launch_rpm']:>12.0f}{values['60 FT']:>10.3f}"
+                f"{values['330 FT']:>10.3f}{values['1/8 MILE']:>10.3f}"
+                f"{values['jitter_mean']:>8.3f} {values['jitter_stdev']:>5.3f}"
+                f"{values['jitter_worst']:>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="Launch rpm optimizer")
+    parser.add_argument("cars", nargs="*", default=list(cars.CATALOG))
+    parser.add_argument("--mu", type=float, default=1.0)
+    parser.add_argument("--candidates", type=int, default=40)
+    parser.add_argument("--jitter", type=float, default=200.0)
+    parser.add_argument("--samples", type=int, default=64)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    report = optimize(
+        args.cars,
+        mu=args.mu,
+        candidates=args.candidates,
+        jitter=args.jitter,
+        samples=args.samples,
+    )
+    print_report(report)
+    print(f"done in {time.perf_counter() - start:.2f} sec")
@@ -2,13 +2,21 @@
 #
 # draw sprite instead of red box
 # draw a better looking track
-# add engine sfx
+
+import time
+
+STARTUP = time.perf_counter()  # time to first frame is measured from here
 
 import pygame
 from pygame.locals import *
 import math
-import time
-# import winsound
+import random
+
+import cars
+from assets import AssetManager
+from frame_profiler import FrameProfiler
+
+# numpy (through fleet) is only imported once opponents are added to a race
 
 # Constants
 SCREEN_WIDTH = 1280
@@ -30,7 +38,23 @@ MASS = CAR_WEIGHT / 32.174  # convert to slugs
 MAX_RPM = 7400
 MIN_RPM = 2000
 QUARTER_MILE_FEET = 1320  # 1/4 mile in feet
-TIME_START = time.time()
+
+# the player's car is simulated on its own 1 ms tick, not once per frame, and
+# every input is applied on the tick it happened in
+PHYSICS_TICK_NS = 1_000_000
+PHYSICS_TICK = PHYSICS_TICK_NS / 1e9
+FRAME_NS = 1_000_000_000 // 60
+INPUT_POLL = 0.0005  # seconds between looks at the event queue while waiting
+
+# AI opponents
+MAX_OPPONENTS = 48
+OPPONENT_LANES_TOP = 40
+OPPONENT_LANES_HEIGHT = 200
+OPPONENT_SPRITES = {
+    "puffin": "econobox.png",
+    "blue_jay": "rally.png",
+    "cardinal": "cardinal.png",
+}
 
 
 def calculate_rpm(speed_fps, gear):
@@ -60,20 +84,92 @@ def calculate_force(torque, gear):
     return (torque * gear_ratio * FINAL_DRIVE) / TIRE_RADIUS
 
 
-def main():
-    global TIME_START
-
+def step_player(speed_fps: float, position_ft: float, gear: int, throttle: bool):
+    # one physics tick of the player's car
+    rpm = calculate_rpm(speed_fps, gear)
+    torque = power = force = 0.0
+    if throttle:
+        torque = calculate_torque(rpm)
+        power = torque * max(2000, rpm) / 5252
+        force = calculate_force(power, gear)
+        speed_fps += (force / MASS) * PHYSICS_TICK
+    position_ft += speed_fps * PHYSICS_TICK
+    return speed_fps, position_ft, rpm, torque, power, force
+
+
+def poll_input(inputs: list, ticks_offset_ns: int):
+    """
+    Move waiting events to inputs as (perf_counter_ns stamp, event). An event
+    SDL timestamped (ms since pygame.init) keeps that time, pygame-ce does not
+    pass it on so the others are stamped now, the more often this is called
+    the closer that is to when they happened.
+    """
+
+    for event in pygame.event.get():
+        timestamp = getattr(event, "timestamp", None)
+        if timestamp is None:
+            inputs.append((time.perf_counter_ns(), event))
+        else:
+            inputs.append((timestamp * 1_000_000 + ticks_offset_ns, event))
+
+
+def wait_for_frame(
+    deadline_ns: int, inputs: list, ticks_offset_ns: int, idle=None
+) -> int:
+    # wait for the next frame like clock.tick() would, but keep polling the
+    # input (and calling idle) every INPUT_POLL meanwhile, returns the time
+    # the frame starts
+    while True:
+        poll_input(inputs, ticks_offset_ns)
+        if idle is not None:
+            idle()
+        now = time.perf_counter_ns()
+        if now >= deadline_ns:
+            return now
+        time.sleep(min(INPUT_POLL, (deadline_ns - now) / 1e9))
+
+
+def build_opponents(count: int):
+    # opponents cycle through the catalog with randomized shift points and
+    # reaction times so the field does not move in lockstep
+    import numpy as np
+    from fleet import Fleet
+
+    names = [list(cars.CATALOG)[i % len(cars.CATALOG)] for i in range(count)]
+    fleet = Fleet([cars.CATALOG[name]() for name in names])
+    fleet.shift_rpm *= np.array([random.uniform(0.94, 1.0) for _ in names])
+    reaction_ticks = np.array([random.randint(10, 30) for _ in names])
+    finish = np.zeros(count)
+    return names, fleet, reaction_ticks, finish
+
+
+def main(
+    telemetry_enabled: bool = False, profile: bool = False, trace: str | None = None
+):
+    # small mixer buffers so the engine sound follows the rpm closely
+    pygame.mixer.pre_init(44100, -16, 1, 256)
     pygame.init()
+    # SDL's millisecond clock on the perf_counter_ns one
+    ticks_offset_ns = time.perf_counter_ns() - pygame.time.get_ticks() * 1_000_000
+
+    # start decoding the race images while the display comes up
+    assets = AssetManager()
+    assets.preload_screen("race")
+
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Drag Racing Simulator")
-    clock = pygame.time.Clock()
     font = pygame.font.SysFont("Arial", 24)
 
-    car_image = pygame.image.load("car.png").convert_alpha()
+    car_image = assets.get("car.png")
     car_width = car_image.get_width()
-    track_image = pygame.image.load("track.png").convert_alpha()
+    track_image = assets.get("track.png")
+    opponent_images = {
+        name: assets.get(OPPONENT_SPRITES.get(name, "car.png")) for name in cars.CATALOG
+    }
+    first_frame = True
 
     sound_enabled = False
+    engine_sound = None  # see engine_sound.py, made the first time sound is on
 
     track_x = (SCREEN_WIDTH - TRACK_LENGTH_PX) // 2
     track_y = (SCREEN_HEIGHT - TRACK_HEIGHT_PX) // 2
@@ -104,11 +200,48 @@ def main():
     car_y = 250
     car_x = track_x - car_width
 
+    # opponents, stepped together once per simulation tick
+    opponent_count = 0
+    opponents = None
+    opponent_finish = None
+    race_elapsed = 0.0
+
+    # the race clock, in physics ticks from the green
+    start_ns = 0
+    tick = 0
+    race_inputs = []  # (stamp, key, pressed) waiting for their tick
+    input_latency = []  # ns from each race input happening to reaching the physics
+    inputs = []
+    next_frame_ns = time.perf_counter_ns()
+
+    # live telemetry of the player's car, see telemetry.py
+    telemetry = None
+    if telemetry_enabled:
+        from telemetry import Telemetry
+
+        telemetry = Telemetry()
+
+    # frame profiler, [F3] for the overlay, [F4] to start / stop a trace
+    profiler = FrameProfiler()
+    if profile:
+        profiler.toggle()
+    if trace:
+        profiler.start_trace()
+
     while running:
-        dt = clock.tick(60) / 1000.0
+        now_ns = wait_for_frame(
+            next_frame_ns,
+            inputs,
+            ticks_offset_ns,
+            engine_sound.pump if sound_enabled else None,
+        )
+        # a frame that ran late moves the schedule on instead of rushing the next ones
+        next_frame_ns = max(next_frame_ns + FRAME_NS, now_ns)
+        profiler.mark("wait")
 
         # draw the track
         screen.blit(track_image)
+        profiler.mark("track")
 
         # screen.fill(BG_COLOR)
         # pygame.draw.rect(
@@ -120,16 +253,45 @@ def main():
         held = pygame.key.get_pressed()
         if held[K_ESCAPE]:
             running = False
-        throttle = held[K_UP]
+        if state != STATE_RACING:
+            throttle = held[K_UP]
         # Event handling
-        for event in pygame.event.get():
+        events, inputs = inputs, []
+        for stamp, event in events:
             if event.type == QUIT:
                 running = False
 
             if event.type == KEYDOWN:
 
+                if event.key == K_F3:
+                    profiler.toggle()
+                elif event.key == K_F4:
+                    if profiler.tracing:
+                        path = profiler.stop_trace(
+                            f"frame_trace_{time.strftime('%Y-%m-%d_%H-%M-%S')}.json"
+                        )
+                        print(f"Saved frame trace to {path}")
+                    else:
+                        profiler.start_trace()
+
                 if event.key == K_s:
                     sound_enabled = not sound_enabled
+                    if sound_enabled and engine_sound is None:
+                        try:
+                            from engine_sound import EngineSound
+
+                            engine_sound = EngineSound()
+                        except pygame.error as e:
+                            print(f"No engine sound: {e}")
+                            sound_enabled = False
+                    elif not sound_enabled and engine_sound is not None:
+                        engine_sound.stop()
+
+                if state == STATE_STAGING:
+                    if event.key in (K_EQUALS, K_PLUS, K_KP_PLUS):
+                        opponent_count = min(MAX_OPPONENTS, opponent_count + 1)
+                    elif event.key in (K_MINUS, K_KP_MINUS):
+                        opponent_count = max(0, opponent_count - 1)
 
                 if state == STATE_RESULTS:
                     if event.key == K_RETURN:
@@ -139,23 +301,27 @@ def main():
 
                     if event.key == K_RIGHT:
                         state = STATE_RACING
-                        TIME_START = time.time()
+                        # the tree drops the moment the key went down
+                        start_ns = stamp
+                        tick = 0
+                        race_inputs = []
+                        input_latency = []
+                        race_elapsed = 0.0
+                        opponents = None
+                        if opponent_count > 0:
+                            opponents = build_opponents(opponent_count)
+                            opponent_finish = opponents[3]
 
                 elif state == STATE_RACING:
+                    # applied by the physics on the tick they happened in
+                    if event.key in (K_UP, K_LEFT, K_RIGHT):
+                        race_inputs.append((stamp, event.key, True))
 
-                    if event.type == KEYDOWN:
-                        if event.key == K_UP:
-                            throttle = True
-                            if reaction_time == 0.0:
-                                reaction_time = time.time() - TIME_START
-                        elif event.key == K_LEFT and current_gear > 1:
-                            current_gear -= 1
-                        elif event.key == K_RIGHT and current_gear < 5:
-                            current_gear += 1
-                    elif event.type == KEYUP and event.key == K_UP:
-                        throttle = False
+            if event.type == KEYUP and event.key == K_UP and state == STATE_RACING:
+                race_inputs.append((stamp, K_UP, False))
 
         # end of event handling
+        profiler.mark("events")
 
         # update and draw the scene based on state
 
@@ -172,6 +338,16 @@ def main():
                 f"Travel Time: {quarter_mile_time - reaction_time:.3f} seconds",
                 "Press [enter] to restart",
             ]
+            if input_latency:
+                results.insert(
+                    -1,
+                    f"Input latency: {sum(input_latency) / len(input_latency) / 1e6:.1f}"
+                    f" ms avg, {max(input_latency) / 1e6:.1f} ms max",
+                )
+            if opponents is not None:
+                finished = opponent_finish[opponent_finish > 0]
+                place = 1 + int((finished < quarter_mile_time).sum())
+                results.insert(0, f"Finished {place} of {opponent_count + 1}")
             text_y = SCREEN_HEIGHT // 2 - 50
             text_x = 800
             for text in results:
@@ -197,11 +373,13 @@ def main():
                 running = True
                 rpm = 0
                 speed_mph = 0.0
+                opponents = None
 
             messages = [
                 "Press [->] to start and upshift",
                 "Press [UP] to throttle",
                 "Press [<-] to downshift",
+                f"Press [+]/[-] for opponents ({opponent_count})",
             ]
             text_color = (0, 0, 0)
             text_x = 800
@@ -213,37 +391,102 @@ def main():
 
         elif state == STATE_RACING:
 
-            # Physics calculations
-            rpm = calculate_rpm(speed_fps, current_gear)
-            # rpm = max(0, min(rpm, MAX_RPM))
-
-            if throttle:
-                torque = calculate_torque(rpm)
-                power = torque * max(2000, rpm) / 5252
-                force = calculate_force(power, current_gear)
-                # force = calculate_force(torque, current_gear)
-                speed_fps += (force / MASS) * dt
-
-            position_ft += speed_fps * dt
-            if position_ft >= QUARTER_MILE_FEET:
-                state = STATE_RESULTS
-                quarter_mile_time = time.time() - TIME_START
-                quarter_mile_speed = speed_fps * 0.681818  # fps to mph
-
-                print(f"Race Over! Time: {time.time() - TIME_START:.3f} seconds")
-                # running = False
+            # advance the opponents to the race clock, one batched step per tick
+            race_elapsed = (now_ns - start_ns) / 1e9
+            if opponents is not None:
+                _, fleet, reaction_ticks, _ = opponents
+                while fleet.ticks[0] * fleet.tick_rate[0] < race_elapsed:
+                    fleet.step()
+                    fleet.current_throttle = (fleet.ticks >= reaction_ticks) * 1.0
+                    crossed = (opponent_finish == 0) & (
+                        fleet.odometer_miles >= QUARTER_MILE_FEET / 5280
+                    )
+                    opponent_finish[crossed] = fleet.ticks[crossed] * fleet.tick_rate[0]
+                    fleet.auto_shift()
+            profiler.mark("opponents")
+
+            # and the player's car tick by tick, each input on the tick it
+            # happened in however late this frame is
+            race_inputs.sort()
+            while start_ns + tick * PHYSICS_TICK_NS < now_ns:
+                tick_end_ns = start_ns + (tick + 1) * PHYSICS_TICK_NS
+                while race_inputs and race_inputs[0][0] < tick_end_ns:
+                    stamp, key, pressed = race_inputs.pop(0)
+                    input_latency.append(now_ns - stamp)
+                    if key == K_UP:
+                        throttle = pressed
+                        if pressed and reaction_time == 0.0:
+                            reaction_time = max(0, stamp - start_ns) / 1e9
+                    elif key == K_LEFT and current_gear > 1:
+                        current_gear -= 1
+                    elif key == K_RIGHT and current_gear < 5:
+                        current_gear += 1
+
+                last_position_ft = position_ft
+                speed_fps, position_ft, rpm, torque, power, force = step_player(
+                    speed_fps, position_ft, current_gear, throttle
+                )
+                tick += 1
+
+                if position_ft >= QUARTER_MILE_FEET:
+                    # the finish is somewhere inside this tick
+                    fraction = (QUARTER_MILE_FEET - last_position_ft) / (
+                        position_ft - last_position_ft
+                    )
+                    quarter_mile_time = (tick - 1 + fraction) * PHYSICS_TICK
+                    quarter_mile_speed = speed_fps * 0.681818  # fps to mph
+                    state = STATE_RESULTS
+                    print(f"Race Over! Time: {quarter_mile_time:.3f} seconds")
+                    break
+            profiler.mark("physics")
 
             # Convert speed to MPH
             speed_mph = speed_fps * 0.681818  # fps to mph
 
+            if telemetry is not None:
+                telemetry.push(
+                    "player",
+                    (
+                        race_elapsed,
+                        rpm,
+                        speed_mph,
+                        current_gear,
+                        power,
+                        position_ft / 5280,
+                    ),
+                )
+
             # Draw car
             car_x = (
                 track_x
                 + (position_ft / QUARTER_MILE_FEET) * TRACK_LENGTH_PX
                 - car_width
             )
+        profiler.mark("update")
         screen.blit(car_image, (car_x, car_y))
+
+        if opponents is not None:
+            names, fleet, _, _ = opponents
+            lane_height = OPPONENT_LANES_HEIGHT / len(names)
+            opponent_x = (
+                track_x
+                + (fleet.odometer_miles * 5280 / QUARTER_MILE_FEET) * TRACK_LENGTH_PX
+            )
+            screen.blits(
+                [
+                    (
+                        opponent_images[name],
+                        (
+                            opponent_x[i] - opponent_images[name].get_width(),
+                            OPPONENT_LANES_TOP + i * lane_height,
+                        ),
+                    )
+                    for i, name in enumerate(names)
+                ],
+                doreturn=False,
+            )
         # pygame.draw.rect(screen, CAR_COLOR, (car_x, car_y, CAR_SIZE, CAR_SIZE))
+        profiler.mark("cars")
 
         # draw the game
         # Draw text readouts
@@ -263,6 +506,7 @@ def main():
             text_surface = font.render(text, True, (255, 255, 255))
             screen.blit(text_surface, (text_x, text_y))
             text_y += 30
+        profiler.mark("text")
 
         # draw rpm and speed gauges
         gauge_x = 200
@@ -271,8 +515,8 @@ def main():
         display_rpm = max(rpm, 1000)
 
         if sound_enabled:
-            pass
-            # winsound.Beep(int(display_rpm), 1)
+            engine_sound.update(display_rpm, throttle)
+            engine_sound.pump()
         pygame.draw.rect(screen, (255, 255, 0), (gauge_x, gauge_y, gauge_width, 20))
         pygame.draw.rect(
             screen,
@@ -289,10 +533,49 @@ def main():
             (gauge_x, gauge_y, int(speed_mph / 200 * gauge_width), 20),
         )
 
+        profiler.mark("gauges")
+
+        if profiler.enabled:
+            profiler.draw(screen)
+            profiler.mark("overlay")
+
+        # anything that came in while drawing, before flip() can block on vsync
+        poll_input(inputs, ticks_offset_ns)
+        if sound_enabled:
+            engine_sound.pump()
         pygame.display.flip()
+        profiler.mark("flip")
+        profiler.end_frame()
+
+        if first_frame:
+            first_frame = False
+            print(f"First frame in {(time.perf_counter() - STARTUP) * 1000:.0f} ms")
+
+            # the other screens are decoded in the background from here on
+            for other in ("title", "menu", "shop"):
+                assets.preload_screen(other)
 
+    if profiler.tracing:
+        print(
+            f"Saved frame trace to {profiler.stop_trace(trace or 'frame_trace.json')}"
+        )
+    if engine_sound is not None:
+        print(f"Engine sound: {engine_sound.stats()}")
+    if telemetry is not None:
+        telemetry.close()
+    assets.shutdown()
     pygame.quit()
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Drag Racing Simulator")
+    parser.add_argument("--telemetry", action="store_true", help="see telemetry.py")
+    parser.add_argument(
+        "--profile", action="store_true", help="start with the frame profiler on"
+    )
+    parser.add_argument("--trace", help="save a frame trace of the session here")
+    args = parser.parse_args()
+
+    main(args.telemetry, args.profile, args.trace)
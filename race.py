@@ -0,0 +1,154 @@
+"""
+
+A single full throttle pass down the strip, shifting at the engine's shift rpm.
+
+This is the same driving loop game.py uses for its races, pulled out so the
+other tools can run one car at a time and stop as soon as it reaches the
+distance they care about.
+
+"""
+
+from vehicle import Vehicle
+from vehicle_pool import borrow
+
+FEET_PER_MILE = 5280
+
+# distances (miles) we report times and speeds at
+MILESTONES = {
+    "60 FT": 60 / FEET_PER_MILE,
+    "330 FT": 330 / FEET_PER_MILE,
+    "1/8 MILE": 0.125,
+    "1000 FT": 1000 / FEET_PER_MILE,
+    "QUARTER MILE": 0.25,
+    "STANDING MILE": 1.0,
+    "FIVE MILE": 5.0,
+}
+
+
+def run_pass(
+    vehicle: Vehicle,
+    distance: float = 0.25,
+    milestones: list | dict | None = None,
+    max_time: float = 600.0,
+    on_tick=None,
+    on_shift=None,
+):
+    """
+    Drive the vehicle at full throttle until it has covered distance (miles).
+
+    Yields (milestone name, log record) as each milestone is crossed, the
+    record is the first tick at or past the milestone just like the results
+    game.py prints. milestones are names from MILESTONES or a dict of
+    {name: distance} of your own. A distance that is not a milestone is
+    reported as FINISH.
+    on_tick(vehicle) is called after every update, for sampling without a log,
+    and on_shift(vehicle) right after every shift, before the next update.
+    """
+
+    if milestones is None:
+        milestones = [name for name, d in MILESTONES.items() if d <= distance]
+
+    if isinstance(milestones, dict):
+        marks = [(mark, name) for name, mark in milestones.items()]
+    else:
+        marks = [(MILESTONES[name], name) for name in milestones]
+
+    # always finish at the requested distance, even if it is not a milestone
+    if distance not in (mark[0] for mark in marks):
+        marks.append((distance, "FINISH"))
+
+    marks.sort()
+    next_mark = 0
+    max_ticks = int(max_time / vehicle.tick_rate)
+
+    while next_mark < len(marks) and vehicle.ticks < max_ticks:
+        vehicle.update()
+        vehicle.current_throttle = 1.0  # Full throttle
+
+        if on_tick is not None:
+            on_tick(vehicle)
+
+        while next_mark < len(marks) and vehicle.odometer_miles >= marks[next_mark][0]:
+            yield marks[next_mark][1], vehicle.log_record()
+            next_mark += 1
+
+        if vehicle.current_engine_rpm > vehicle.engine.shift_rpm:
+            gear = vehicle.current_gear
+            vehicle.current_gear += 1
+
+            # dont try to shift out of the max gear
+            vehicle.current_gear = min(
+                vehicle.transmission.max_gear, vehicle.current_gear
+            )
+
+            if on_shift is not None and vehicle.current_gear != gear:
+                on_shift(vehicle)
+
+
+def interpolate(record: dict, distance: float, tick_rate: float) -> tuple[float, float]:
+    # (time, speed) at distance, interpolated between the tick that crossed it
+    # and the one before (worked back from the step the crossing tick took)
+    step = (record["Speed"] / 3600) * tick_rate
+    if step == 0:
+        return record["Time"], record["Speed"]
+
+    fraction = 1.0 - (record["Distance"] - distance) / step
+    time = record["Time"] - tick_rate * (1.0 - fraction)
+    speed = record["Speed"] - (record["LA"] + record["LD"]) * (1.0 - fraction)
+    return time, speed
+
+
+def finish_time(
+    vehicle: Vehicle, distance: float = 0.25, on_shift=None
+) -> tuple[float, float]:
+    # interpolated (time, speed) at distance
+    for _, record in run_pass(vehicle, distance, milestones=[], on_shift=on_shift):
+        return interpolate(record, distance, vehicle.tick_rate)
+
+    # never made it (ran out of max_time)
+    return float("inf"), 0.0
+
+
+def finish_times(vehicle: Vehicle, distances: list, on_shift=None) -> dict:
+    # interpolated {distance: (time, speed)} at every distance, all from one
+    # pass out to the furthest. Separate finish_time() calls on the same
+    # vehicle are not the same: each stops before its last tick's shift
+    marks = {str(distance): distance for distance in distances}
+    results = {distance: (float("inf"), 0.0) for distance in distances}
+    for name, record in run_pass(
+        vehicle, max(distances), milestones=marks, on_shift=on_shift
+    ):
+        results[marks[name]] = interpolate(record, marks[name], vehicle.tick_rate)
+    return results
+
+
+def evaluate(config: dict, distance: float | list = 0.25):
+    """
+    One full throttle pass of config on a vehicle from this process' pool,
+    the pass function of every tool that runs configs in worker processes.
+    Returns (time, speed) at distance, or {distance: (time, speed)} when
+    given a list of distances (all timed from the one pass).
+    """
+
+    with borrow(config) as vehicle:
+        if isinstance(distance, (list, tuple)):
+            return finish_times(vehicle, distance)
+        return finish_time(vehicle, distance)
+
+
+def race_results(vehicle: Vehicle, distance: float = 0.25, **kwargs) -> dict:
+    # run a pass and collect every milestone into a dict
+    return {name: record for name, record in run_pass(vehicle, distance, **kwargs)}
+
+
+if __name__ == "__main__":
+    import cars
+
+    for name, factory in cars.CATALOG.items():
+        print("*" * 60)
+        print(name)
+        print("-" * 40)
+        for milestone, record in run_pass(factory(), 1.0):
+            print(
+                f"{milestone:<16} {record['Time']:>8.3f} sec @ {record['Speed']:>6.1f} mph"
+            )
@@ -0,0 +1,371 @@
+"""
+
+A small local race server, simulations on demand for other tools.
+
+The protocol is newline delimited json over plain TCP. A client sends one
+request per line:
+
+    {"id": 1, "car": "cardinal", "distance": 0.25}
+
+where car is either a catalog name from cars.py or a full config as built by
+cars.to_config(), and distance / milestones are optional race parameters.
+The server answers with one line per milestone as the car crosses it, then a
+final line with "done": true. Requests on one connection may be pipelined,
+their answers are tagged with the request id.
+
+Simulations run in a process pool. Identical requests that arrive while one
+is already running join it instead of starting another, and finished races
+are kept in a small cache. The queue of waiting races is bounded, once it is
+full the server stops reading from clients until there is room again.
+
+"""
+
+import asyncio
+import json
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import cars
+import race
+from vehicle_pool import borrow
+
+DEFAULT_PORT = 8765
+
+# the events queue of the worker process, set by _init_worker
+_events = None
+
+
+def _init_worker(events):
+    global _events
+    _events = events
+
+
+def _simulate(key: str, config: dict, distance: float, milestones: list) -> list:
+    # runs in a worker process, each milestone is sent back as soon as it is
+    # crossed and the full list is returned once the pass is finished
+    results = []
+    with borrow(config) as vehicle:
+        for name, record in race.run_pass(vehicle, distance, milestones):
+            results.append((name, record))
+            _events.put((key, name, record))
+
+    return results
+
+
+class _Job:
+    def __init__(self, key: str, config: dict, distance: float, milestones: list):
+        self.key = key
+        self.config = config
+        self.distance = distance
+        self.milestones = milestones
+        self.events = []
+        self.subscribers = []
+
+    def publish(self, event):
+        self.events.append(event)
+        for subscriber in self.subscribers:
+            subscriber.put_nowait(event)
+
+    def subscribe(self) -> asyncio.Queue:
+        # late joiners get everything published so far first
+        subscriber = asyncio.Queue()
+        for event in self.events:
+            subscriber.put_nowait(event)
+        self.subscribers.append(subscriber)
+        return subscriber
+
+
+class RaceServer:
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PORT,
+        workers: int | None = None,
+        queue_size: int = 64,
+        cache_size: int = 1024,
+    ):
+        self.host = host
+        self.port = port
+        self.workers = workers or multiprocessing.cpu_count()
+        self.queue_size = queue_size
+        self.cache_size = cache_size
+
+        self.cache = OrderedDict()
+        self.inflight = {}
+        self.stats = {
+            "requests": 0,
+            "simulated": 0,
+            "coalesced": 0,
+            "cached": 0,
+            "failed": 0,
+        }
+
+        self._pending = None
+        self._pool = None
+        self._events = None
+        self._server = None
+        self._tasks = []
+        self._reader = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+
+        self._pending = asyncio.Queue(maxsize=self.queue_size)
+
+        # forked workers would inherit (and hold open) client sockets, spawn them
+        context = multiprocessing.get_context("spawn")
+        self._events = context.Queue()
+        self._pool = ProcessPoolExecutor(
+            self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self._events,),
+        )
+
+        # forward milestone events from the workers into the event loop
+        self._reader = threading.Thread(
+            target=self._read_events, args=(loop,), daemon=True
+        )
+        self._reader.start()
+
+        # one dispatcher per worker so the pool is never oversubscribed
+        self._tasks = [
+            asyncio.create_task(self._dispatch()) for _ in range(self.workers)
+        ]
+
+        self._server = await asyncio.start_server(
+            self._handle_client, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        self._events.put(None)
+        self._reader.join()
+        self._pool.shutdown()
+
+    def _read_events(self, loop):
+        while True:
+            event = self._events.get()
+            if event is None:
+                break
+            loop.call_soon_threadsafe(self._on_event, event)
+
+    def _on_event(self, event):
+        key, name, record = event
+        job = self.inflight.get(key)
+
+        # events of a job that already finished have been replayed from its result
+        if job is not None:
+            job.publish({"milestone": name, **record})
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            job = await self._pending.get()
+
+            try:
+                results = await loop.run_in_executor(
+                    self._pool,
+                    _simulate,
+                    job.key,
+                    job.config,
+                    job.distance,
+                    job.milestones,
+                )
+            except Exception as e:
+                job.publish({"error": str(e)})
+                results = None
+
+            del self.inflight[job.key]
+
+            if results is None:
+                self.stats["failed"] += 1
+            else:
+                self.stats["simulated"] += 1
+                # the result can beat some of its own events here, catch up
+                for name, record in results[len(job.events) :]:
+                    job.publish({"milestone": name, **record})
+
+                self.cache[job.key] = list(job.events)
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+            job.publish(None)
+            self._pending.task_done()
+
+    async def submit(self, request: dict):
+        """
+        Start (or join) the race for a request.
+
+        Returns a queue of milestone dicts ending with None. Waits while the
+        pending queue is full, that wait is what pushes back on clients.
+        """
+
+        self.stats["requests"] += 1
+
+        config = cars.get_config(request["car"])
+        distance = float(request.get("distance", 0.25))
+        milestones = request.get("milestones")
+        if milestones is None:
+            milestones = [n for n, d in race.MILESTONES.items() if d <= distance]
+
+        for name in milestones:
+            if name not in race.MILESTONES:
+                raise ValueError(
+                    f"Unknown milestone: {name}. Must be one of {list(race.MILESTONES)}."
+                )
+
+        key = cars.config_key(
+            {"config": config, "distance": distance, "milestones": milestones}
+        )
+
+        if key in self.cache:
+            self.stats["cached"] += 1
+            self.cache.move_to_end(key)
+            done = asyncio.Queue()
+            for event in self.cache[key]:
+                done.put_nowait(event)
+            done.put_nowait(None)
+            return done, "cached"
+
+        if key in self.inflight:
+            self.stats["coalesced"] += 1
+            return self.inflight[key].subscribe(), "coalesced"
+
+        job = _Job(key, config, distance, milestones)
+        self.inflight[key] = job
+        subscriber = job.subscribe()
+        await self._pending.put(job)
+        return subscriber, "simulated"
+
+    async def _handle_client(self, reader, writer):
+        lock = asyncio.Lock()
+        streams = []
+
+        async def send(message: dict):
+            async with lock:
+                writer.write((json.dumps(message) + "\n").encode("utf-8"))
+                await writer.drain()
+
+        async def stream(request_id, events, source):
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                await send({"id": request_id, **event})
+            await send({"id": request_id, "done": True, "source": source})
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("A request must be a json object.")
+                    request_id = request.get("id")
+                    events, source = await self.submit(request)
+                except (ValueError, KeyError, TypeError) as e:
+                    await send({"id": request_id, "error": str(e), "done": True})
+                    continue
+
+                streams.append(asyncio.create_task(stream(request_id, events, source)))
+
+            await asyncio.gather(*streams)
+        except ConnectionError:
+            for task in streams:
+                task.cancel()
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+
+async def request_race(
+    car: str | dict,
+    distance: float = 0.25,
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PORT,
+):
+    # client side helper, yields each milestone message as it arrives
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(
+        (json.dumps({"id": 0, "car": car, "distance": distance}) + "\n").encode()
+    )
+    await writer.drain()
+
+    try:
+        while True:
+            message = json.loads(await reader.readline())
+            if "error" in message:
+                raise ValueError(message["error"])
+            yield message
+            if message.get("done"):
+                break
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def _benchmark(clients: int = 200):
+    server = RaceServer(port=0)
+    await server.start()
+
+    names = list(cars.CATALOG)
+    first_latency = []
+    latency = []
+
+    async def client(i: int):
+        start = time.perf_counter()
+        first = None
+        async for message in request_race(
+            names[i % len(names)], 0.25, port=server.port
+        ):
+            if first is None:
+                first = time.perf_counter() - start
+        first_latency.append(first)
+        latency.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    await server.stop()
+
+    latency.sort()
+    first_latency.sort()
+    print(f"{clients} concurrent requests in {elapsed:.3f} sec")
+    print(f"first milestone p50 {first_latency[len(first_latency) // 2] * 1000:.1f} ms")
+    print(f"complete        p50 {latency[len(latency) // 2] * 1000:.1f} ms")
+    print(f"complete        p95 {latency[int(len(latency) * 0.95)] * 1000:.1f} ms")
+    print("stats:", server.stats)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        asyncio.run(_benchmark())
+    else:
+
+        async def serve():
+            server = RaceServer()
+            await server.start()
+            print(f"Race server listening on {server.host}:{server.port}")
+            await asyncio.Event().wait()
+
+        asyncio.run(serve())
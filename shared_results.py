@@ -0,0 +1,267 @@
+"""
+
+Parallel sweeps that hand results back through shared memory.
+
+Sending each run's log (a list of dicts) back from a worker means pickling it
+in the worker and unpickling it in the parent, for big sweeps that costs more
+than the simulations. Here the parent allocates one results matrix in shared
+memory, configs x milestones x metrics, and the workers write their numbers
+straight into their row. Nothing but a row count comes back through the pool.
+
+Telemetry is optional. Every worker gets its own fixed size ring buffer in
+shared memory and writes a sample every few ticks, the newest samples
+overwrite the oldest, so memory stays the same however many runs there are.
+
+Configs can be a list, or a picklable function config_for(index) together
+with a count, so a million run study never has to build every config in the
+parent.
+
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import cars
+import race
+
+METRICS = ("Time", "Speed", "RPM", "Gear")
+TELEMETRY = ("Run", "Time", "Speed", "RPM", "Gear", "Distance")
+
+
+class SharedArray:
+    # a numpy array living in a shared memory block, attachable by name
+    def __init__(self, shape: tuple, name: str | None = None, fill: float = np.nan):
+        self.shape = tuple(shape)
+        size = max(1, int(np.prod(self.shape)) * 8)
+
+        self.owner = name is None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name, track=False)
+
+        self.array = np.ndarray(self.shape, dtype=np.float64, buffer=self.memory.buf)
+        if self.owner:
+            self.array.fill(fill)
+
+    @property
+    def spec(self) -> tuple:
+        # what a worker needs to attach
+        return (self.shape, self.memory.name)
+
+    @classmethod
+    def attach(cls, spec: tuple) -> "SharedArray":
+        shape, name = spec
+        return cls(shape, name)
+
+    def close(self):
+        # drop the numpy view first, the block cannot close while it is exported
+        self.array = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+class SharedTelemetryRing:
+    """
+    One ring buffer of telemetry samples per worker.
+
+    Row 0 of every ring holds the write counter, samples go in rows 1..capacity.
+    """
+
+    def __init__(self, workers: int, capacity: int, spec: tuple | None = None):
+        self.capacity = capacity
+        if spec is None:
+            self.shared = SharedArray((workers, capacity + 1, len(TELEMETRY)), fill=0.0)
+        else:
+            self.shared = SharedArray.attach(spec)
+
+    @property
+    def spec(self) -> tuple:
+        return self.shared.spec
+
+    def write(self, worker: int, sample: tuple):
+        ring = self.shared.array[worker]
+        count = int(ring[0, 0])
+        ring[1 + count % self.capacity] = sample
+        ring[0, 0] = count + 1
+
+    def latest(self, worker: int) -> np.ndarray:
+        # the samples still in a worker's ring, oldest first
+        ring = self.shared.array[worker]
+        count = int(ring[0, 0])
+        if count <= self.capacity:
+            return ring[1 : 1 + count].copy()
+        start = count % self.capacity
+        return np.concatenate([ring[1 + start :], ring[1 : 1 + start]])
+
+    def close(self):
+        self.shared.close()
+
+
+# worker process state, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(results_spec, milestones, telemetry_spec, capacity, slots, lock):
+    _worker["results"] = SharedArray.attach(results_spec)
+    _worker["milestones"] = {name: i for i, name in enumerate(milestones)}
+    _worker["distance"] = max(race.MILESTONES[name] for name in milestones)
+
+    _worker["telemetry"] = None
+    if telemetry_spec is not None:
+        _worker["telemetry"] = SharedTelemetryRing(0, capacity, telemetry_spec)
+
+    # every worker claims its own ring
+    with lock:
+        _worker["slot"] = slots.value
+        slots.value += 1
+
+
+def _run_range(start: int, stop: int, configs, config_for, telemetry_every: int):
+    results = _worker["results"].array
+    columns = _worker["milestones"]
+    telemetry = _worker["telemetry"]
+    slot = _worker["slot"]
+
+    for index in range(start, stop):
+        config = configs[index - start] if configs is not None else config_for(index)
+        vehicle = cars.from_config(config)
+        vehicle.logging = False
+
+        on_tick = None
+        if telemetry is not None and telemetry_every > 0:
+
+            def on_tick(v, index=index):
+                if v.ticks % telemetry_every == 0:
+                    telemetry.write(
+                        slot,
+                        (
+                            index,
+                            v.ticks * v.tick_rate,
+                            v.current_speed_mph,
+                            v.current_engine_rpm,
+                            v.current_gear,
+                            v.odometer_miles,
+                        ),
+                    )
+
+        row = results[index]
+        for name, record in race.run_pass(
+            vehicle, _worker["distance"], list(columns), on_tick=on_tick
+        ):
+            if name in columns:
+                row[columns[name]] = [record[metric] for metric in METRICS]
+
+    return stop - start
+
+
+def sweep(
+    configs: list | None = None,
+    milestones: list | None = None,
+    config_for=None,
+    count: int | None = None,
+    workers: int | None = None,
+    chunk: int = 64,
+    telemetry_every: int = 0,
+    telemetry_capacity: int = 4096,
+):
+    """
+    Run every config and return (SharedArray of results, SharedTelemetryRing or None).
+
+    results.array[i, m, k] is metric METRICS[k] of config i at milestones[m],
+    nan if the car never got there. Close both when done with them.
+    """
+
+    if milestones is None:
+        milestones = ["60 FT", "1/8 MILE", "QUARTER MILE"]
+    if configs is not None:
+        count = len(configs)
+    elif config_for is None or count is None:
+        raise ValueError("sweep() needs configs, or config_for and count.")
+
+    workers = workers or multiprocessing.cpu_count()
+    results = SharedArray((count, len(milestones), len(METRICS)))
+    telemetry = None
+    if telemetry_every > 0:
+        telemetry = SharedTelemetryRing(workers, telemetry_capacity)
+
+    context = multiprocessing.get_context()
+    try:
+        with ProcessPoolExecutor(
+            workers,
+            initializer=_init_worker,
+            initargs=(
+                results.spec,
+                milestones,
+                telemetry.spec if telemetry is not None else None,
+                telemetry_capacity,
+                context.Value("i", 0),
+                context.Lock(),
+            ),
+        ) as pool:
+            # keep only a few chunks in flight so pending configs stay bounded too
+            pending = set()
+            for start in range(0, count, chunk):
+                stop = min(count, start + chunk)
+                part = configs[start:stop] if configs is not None else None
+                pending.add(
+                    pool.submit(
+                        _run_range, start, stop, part, config_for, telemetry_every
+                    )
+                )
+                if len(pending) >= workers * 4:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+
+            for future in pending:
+                future.result()
+    except BaseException:
+        # nobody gets the blocks back if the sweep fails, free them here
+        results.close()
+        if telemetry is not None:
+            telemetry.close()
+        raise
+
+    return results, telemetry
+
+
+def weight_variant(index: int) -> dict:
+    # the demo study, a cardinal at a range of weights
+    config = cars.to_config(cars.cardinal())
+    config["weight_lbs"] = 2000 + index * 0.1
+    return config
+
+
+if __name__ == "__main__":
+    import time
+
+    count = 20000
+    milestones = ["60 FT", "1/8 MILE", "QUARTER MILE"]
+
+    start = time.perf_counter()
+    results, telemetry = sweep(
+        config_for=weight_variant,
+        count=count,
+        milestones=milestones,
+        telemetry_every=60,
+        telemetry_capacity=256,
+    )
+    elapsed = time.perf_counter() - start
+
+    quarter = results.array[:, milestones.index("QUARTER MILE"), :]
+    best = int(np.nanargmin(quarter[:, METRICS.index("Time")]))
+    print(f"{count} runs in {elapsed:.2f} sec ({count / elapsed:.0f} runs/sec)")
+    print(f"results matrix {results.array.nbytes / 1e6:.1f} MB in shared memory")
+    print(
+        f"quickest: run {best} at {weight_variant(best)['weight_lbs']:.1f} lbs,"
+        f" {quarter[best, 0]:.3f} sec @ {quarter[best, 1]:.1f} mph"
+    )
+    print(f"telemetry samples in worker 0's ring: {len(telemetry.latest(0))}")
+
+    results.close()
+    telemetry.close()
@@ -0,0 +1,258 @@
+"""
+
+Inverse solver, what does a car need to run a target time?
+
+Pick a car, a single parameter (torque curve scale, weight or final drive)
+and a target elapsed time. The solver guesses a starting value from the old
+ET ~ (weight / hp) ^ 1/3 rule of thumb, brackets the target and closes in with
+regula falsi (Illinois variant). Torque and weight usually take a handful
+of passes. Every pass is cached per car, later torque and weight solves start
+from the closest cached passes instead of from scratch.
+
+Final drive has no rule of thumb and is not monotonic (too short and too
+tall are both slow), so its bracket is walked out from the car's own ratio
+in both directions at once and the root closest to it is used, never more
+than MAX_SPREAD away. That takes more passes, usually under 10, and a
+target gearing cannot reach fails after about 15.
+
+Elapsed times are interpolated between the two ticks either side of the
+finish line, otherwise every answer would be rounded to a 1/60 s tick.
+
+"""
+
+import copy
+import math
+
+import cars
+import race
+
+# the bracket walk's step, as a factor of the value
+STEP = 1.1
+
+# final drive is only searched this factor either side of the car's own
+MAX_SPREAD = 2.0
+
+
+def _scale_torque(config: dict, value: float) -> dict:
+    config = copy.deepcopy(config)
+    config["engine"]["torque_curve"] = [
+        [rpm, torque * value] for rpm, torque in config["engine"]["torque_curve"]
+    ]
+    return config
+
+
+def _set_weight(config: dict, value: float) -> dict:
+    config = copy.deepcopy(config)
+    config["weight_lbs"] = value
+    return config
+
+
+def _set_final_drive(config: dict, value: float) -> dict:
+    config = copy.deepcopy(config)
+    config["transmission"]["final_drive"] = value
+    return config
+
+
+# parameter name -> (apply to config, baseline value of a config)
+PARAMETERS = {
+    "torque_scale": (_scale_torque, lambda config: 1.0),
+    "weight_lbs": (_set_weight, lambda config: config["weight_lbs"]),
+    "final_drive": (
+        _set_final_drive,
+        lambda config: config["transmission"]["final_drive"],
+    ),
+}
+
+
+class InverseSolver:
+
+    def __init__(self, car: str | dict, distance: float = 0.25):
+        self.config = cars.get_config(car)
+        self.distance = distance
+        self.baseline = race.evaluate(self.config, distance)[0]
+
+        # (parameter, value) -> elapsed time, shared by every solve
+        self.cache = {}
+        self.runs = 0
+
+    def evaluate(self, parameter: str, value: float) -> float:
+        key = (parameter, value)
+        if key not in self.cache:
+            apply, _ = PARAMETERS[parameter]
+            self.cache[key] = race.evaluate(apply(self.config, value), self.distance)[0]
+            self.runs += 1
+        return self.cache[key]
+
+    def _first_guess(self, parameter: str, target: float) -> float:
+        _, baseline_value = PARAMETERS[parameter]
+        base = baseline_value(self.config)
+
+        # ET scales roughly with the cube root of weight / power
+        ratio = (target / self.baseline) ** 3
+        if parameter == "torque_scale":
+            return base / ratio
+        if parameter == "weight_lbs":
+            return base * ratio
+        return base
+
+    def _cached_bracket(self, parameter: str, target: float):
+        # the closest cached passes either side of the target, if any
+        below = None
+        above = None
+        for (name, value), et in self.cache.items():
+            if name != parameter:
+                continue
+            if et <= target and (below is None or et > below[1]):
+                below = (value, et)
+            if et >= target and (above is None or et < above[1]):
+                above = (value, et)
+        return below, above
+
+    def _walk_both_ways(self, parameter: str, target: float, max_runs: int):
+        # step out from the car's own value both ways, one step each way at a
+        # time, until adjacent passes on one side straddle the target. The
+        # first side to do so holds the closest root
+        _, baseline_value = PARAMETERS[parameter]
+        base = baseline_value(self.config)
+        self.cache[(parameter, base)] = self.baseline
+        runs_before = self.runs
+        last = {STEP: (base, self.baseline), 1 / STEP: (base, self.baseline)}
+        steps = int(math.log(MAX_SPREAD) / math.log(STEP))
+
+        for _ in range(steps):
+            for factor, (value, et) in last.items():
+                if self.runs - runs_before >= max_runs:
+                    break
+                next_value = value * factor
+                next_et = self.evaluate(parameter, next_value)
+                last[factor] = (next_value, next_et)
+                if (et - target) * (next_et - target) <= 0:
+                    pair = sorted(
+                        [(value, et), (next_value, next_et)], key=lambda p: p[1]
+                    )
+                    return pair[0], pair[1]
+        raise ValueError(
+            f"Could not bracket {target} sec with {parameter} within"
+            f" x{MAX_SPREAD} of {base} in {self.runs - runs_before} runs."
+        )
+
+    def solve(
+        self,
+        parameter: str,
+        target: float,
+        tolerance: float = 0.001,
+        max_runs: int = 30,
+    ) -> dict:
+        """
+        Find the parameter value that runs target seconds over the distance.
+
+        final_drive is not monotonic (too short or too tall are both slow),
+        the solver finds the root closest to the car's current gearing. When
+        the target falls in a jump of ET (a shift point moving across a tick)
+        the closest value either side of the jump is returned.
+        """
+
+        if parameter not in PARAMETERS:
+            raise ValueError(
+                f"Unknown parameter: {parameter}. Must be one of {list(PARAMETERS)}."
+            )
+
+        runs_before = self.runs
+        if parameter == "final_drive":
+            # cached passes can sit either side of the optimum, not a bracket
+            below, above = self._walk_both_ways(parameter, target, max_runs)
+        else:
+            below, above = self._cached_bracket(parameter, target)
+
+        if below is None or above is None:
+            # start from the rule of thumb and walk out until the target is bracketed
+            guess = self._first_guess(parameter, target)
+            et = self.evaluate(parameter, guess)
+            points = [(guess, et)]
+
+            _, baseline_value = PARAMETERS[parameter]
+            base = baseline_value(self.config)
+            if base != guess:
+                points.append((base, self.baseline))
+                self.cache[(parameter, base)] = self.baseline
+            else:
+                # no rule of thumb for this one, take a second point to get a slope
+                points.append((guess * 1.05, self.evaluate(parameter, guess * 1.05)))
+
+            while not (
+                any(p[1] <= target for p in points)
+                and any(p[1] >= target for p in points)
+            ):
+                if self.runs - runs_before >= max_runs:
+                    raise ValueError(
+                        f"Could not bracket {target} sec with {parameter} "
+                        f"in {max_runs} runs."
+                    )
+
+                # move the value whichever way the slope says is faster / slower
+                points.sort(key=lambda p: p[1])
+                fastest, slowest = points[0], points[-1]
+                slope_sign = 1.0 if fastest[0] > slowest[0] else -1.0
+                if target < fastest[1]:
+                    value = fastest[0] * STEP**slope_sign
+                else:
+                    value = slowest[0] * STEP**-slope_sign
+                points.append((value, self.evaluate(parameter, value)))
+
+            below, above = self._cached_bracket(parameter, target)
+
+        # Illinois regula falsi between the bracket ends
+        (x0, f0), (x1, f1) = below, above
+        f0 -= target
+        f1 -= target
+        side = 0
+        value, et = (x0, f0 + target) if abs(f0) < abs(f1) else (x1, f1 + target)
+
+        while abs(et - target) > tolerance and self.runs - runs_before < max_runs:
+            # shift points make ET jump, the target may sit inside a jump
+            if f1 == f0 or abs(x1 - x0) <= 1e-6 * max(abs(x0), abs(x1)):
+                break
+            value = x1 - f1 * (x1 - x0) / (f1 - f0)
+            et = self.evaluate(parameter, value)
+            f = et - target
+
+            if (f < 0) == (f0 < 0):
+                x0, f0 = value, f
+                if side == -1:
+                    f1 /= 2
+                side = -1
+            else:
+                x1, f1 = value, f
+                if side == 1:
+                    f0 /= 2
+                side = 1
+
+        return {
+            "parameter": parameter,
+            "value": value,
+            "elapsed_time": et,
+            "target": target,
+            "runs": self.runs - runs_before,
+        }
+
+
+if __name__ == "__main__":
+    for name in cars.CATALOG:
+        solver = InverseSolver(name)
+        print("*" * 60)
+        print(f"{name}: baseline {solver.baseline:.3f} sec")
+        print("-" * 40)
+
+        for parameter in PARAMETERS:
+            # gearing alone gains little, ask it for less and for slower too
+            scales = (0.98, 1.05) if parameter == "final_drive" else (0.95, 0.9)
+            for target in (solver.baseline * scale for scale in scales):
+                try:
+                    result = solver.solve(parameter, target)
+                except ValueError as e:
+                    print(f"{parameter:<14} {target:>7.3f} sec: {e}")
+                    continue
+                print(
+                    f"{parameter:<14} {target:>7.3f} sec -> {result['value']:>10.3f}"
+                    f"  ({result['elapsed_time']:.3f} sec in {result['runs']} runs)"
+                )
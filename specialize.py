@@ -0,0 +1,272 @@
+"""
+
+Per car specialized stepping functions.
+
+Vehicle.update() looks everything up through the engine, transmission and
+wheel objects every tick and recomputes values that never change for a given
+car. specialize() writes out python source for one configured vehicle with
+all of that folded into constants (the torque curve becomes an if / elif
+chain, the gear ratios a tuple) and compiles it.
+
+The generated code does the same float operations in the same order as the
+generic path, so the results are bit for bit the same, only faster.
+
+    fast = specialize(vehicle)
+    fast.step(vehicle)              # same as vehicle.update()
+    fast.run(vehicle, 0.25)         # full throttle pass like race.run_pass
+
+"""
+
+from vehicle import Vehicle
+
+
+def _segment_source(
+    curve: list, first: int, last: int, rpm: str, result: str, indent: str
+) -> list:
+    # binary search over segments first..last of a strictly increasing curve,
+    # an rpm right on a breakpoint goes to the lower segment like Engine.torque()
+    if first == last:
+        rpm1, torque1 = curve[first]
+        rpm2, torque2 = curve[first + 1]
+        return [
+            f"{indent}{result} = {torque1!r} + {torque2 - torque1!r}"
+            f" * ({rpm} - {rpm1!r}) / {rpm2 - rpm1!r}"
+        ]
+
+    middle = (first + last + 1) // 2
+    return (
+        [f"{indent}if {rpm} <= {curve[middle][0]!r}:"]
+        + _segment_source(curve, first, middle - 1, rpm, result, indent + "    ")
+        + [f"{indent}else:"]
+        + _segment_source(curve, middle, last, rpm, result, indent + "    ")
+    )
+
+
+def _torque_source(vehicle: Vehicle, rpm: str, result: str, indent: str) -> list:
+    # Engine.torque() unrolled, the segments become constants
+    curve = vehicle.engine.torque_curve
+    if len(curve) < 2:
+        return [f"{indent}{result} = 0.0"]
+
+    increasing = all(curve[i][0] < curve[i + 1][0] for i in range(len(curve) - 1))
+    if increasing:
+        return [
+            f"{indent}if {rpm} < {curve[0][0]!r} or {rpm} > {curve[-1][0]!r}:",
+            f"{indent}    {result} = 0.0",
+            f"{indent}else:",
+        ] + _segment_source(curve, 0, len(curve) - 2, rpm, result, indent + "    ")
+
+    # anything else gets the same linear scan as Engine.torque()
+    lines = []
+    for i in range(len(curve) - 1):
+        rpm1, torque1 = curve[i]
+        rpm2, torque2 = curve[i + 1]
+        keyword = "if" if i == 0 else "elif"
+        lines.append(f"{indent}{keyword} {rpm1!r} <= {rpm} <= {rpm2!r}:")
+        lines.append(
+            f"{indent}    {result} = {torque1!r} + {torque2 - torque1!r}"
+            f" * ({rpm} - {rpm1!r}) / {rpm2 - rpm1!r}"
+        )
+    lines.append(f"{indent}else:")
+    lines.append(f"{indent}    {result} = 0.0")
+    return lines
+
+
+def _update_source(vehicle: Vehicle, indent: str) -> list:
+    """
+    The body of Vehicle.update() working on locals:
+    ticks, gear, speed, rpm, throttle, odometer, last_accel, last_decel.
+    """
+
+    transmission = vehicle.transmission
+    gears = range(-1, transmission.max_gear + 1)
+    max_gear = transmission.max_gear
+
+    # folded constants, repr() round trips floats exactly
+    wheel_ratio = repr(vehicle.wheel.mph_per_rpm)
+    input_ratio = repr(tuple(transmission.input_ratio(gear) for gear in gears))
+    output_ratio = repr(tuple(transmission.output_ratio(gear) for gear in gears))
+    weight_kg = repr(vehicle.weight_kg)
+    tick_rate = repr(vehicle.tick_rate)
+    efficiency = repr(vehicle.drivetrain_efficiency)
+    f_rr = repr(vehicle.rolling_resistance * vehicle.weight_kg * 9.81)
+    drag = repr(
+        0.5 * vehicle.air_density * vehicle.drag_coefficient * vehicle.frontal_area
+    )
+
+    i = indent
+    lines = [
+        f"{i}ticks += 1",
+        f"{i}if speed == 0:",
+        f"{i}    if throttle > 0:",
+        f"{i}        if gear < -1 or gear > {max_gear}:",
+        f"{i}            _invalid_gear(gear)",
+        f"{i}        speed = {wheel_ratio} * (rpm * {output_ratio}[gear + 1])",
+        f"{i}else:",
+        f"{i}    if throttle == 0:",
+        f"{i}        accel = 0.0",
+        f"{i}    else:",
+    ]
+    lines += _torque_source(vehicle, "rpm", "torque", i + "        ")
+    lines += [
+        f"{i}        hp = ((torque * rpm) / 5252) * throttle",
+        f"{i}        speed_mps = speed * 0.44704",
+        f"{i}        if speed_mps < 0.1:",
+        f"{i}            speed_mps = 0.1",
+        f"{i}        accel = (hp * 745.7) / speed_mps / {weight_kg} * 2.23694",
+        f"{i}        accel *= {tick_rate}",
+        f"{i}        accel *= {efficiency}",
+        f"{i}    last_accel = accel",
+        f"{i}    iv = speed * 0.44704",
+        f"{i}    decel = -({f_rr} + {drag} * iv**2) / {weight_kg} * {tick_rate}",
+        f"{i}    decel = decel * 2.23694",
+        f"{i}    last_decel = decel",
+        f"{i}    speed += accel + decel",
+        f"{i}    if not speed > 0:",
+        f"{i}        speed = 0  # max(0, speed) without the call",
+        f"{i}    odometer += (speed / 3600) * {tick_rate}",
+        f"{i}    if gear < -1 or gear > {max_gear}:",
+        f"{i}        _invalid_gear(gear)",
+        f"{i}    rpm = (speed / {wheel_ratio}) * {input_ratio}[gear + 1]",
+    ]
+    return lines
+
+
+STATE = (
+    "ticks = v.ticks",
+    "gear = v.current_gear",
+    "speed = v.current_speed_mph",
+    "rpm = v.current_engine_rpm",
+    "throttle = v.current_throttle",
+    "odometer = v.odometer_miles",
+    "last_accel = v.last_accel",
+    "last_decel = v.last_decel",
+)
+
+
+# a VehicleLog row straight from the locals
+LOG_ROW = "(ticks, last_accel, last_decel, rpm, gear, throttle, speed, odometer)"
+
+
+def _store_state(indent: str) -> list:
+    # write the locals back, the reverse of STATE
+    return [
+        f"{indent}{line.split(' = ')[1]} = {line.split(' = ')[0]}" for line in STATE
+    ]
+
+
+def source(vehicle: Vehicle) -> str:
+    # python source of the specialized step() and run() for this vehicle
+    lines = ["def step(v):"]
+    lines += [f"    {line}" for line in STATE]
+    lines += _update_source(vehicle, "    ")
+    lines += _store_state("    ")
+    lines += [
+        "    if v.logging:",
+        f"        v.log.rows.append({LOG_ROW})",
+        "    else:",
+        "        v.log.clear()",
+        "",
+        "",
+        "def run(v, distance, max_ticks=None):",
+        "    # full throttle, shifting at the shift rpm, until distance (miles)",
+        "    if max_ticks is None:",
+        f"        max_ticks = {int(600.0 / vehicle.tick_rate)}",
+    ]
+    lines += [f"    {line}" for line in STATE]
+    lines += [
+        "    logging = v.logging",
+        "    rows = v.log.rows",
+        "    while odometer < distance and ticks < max_ticks:",
+    ]
+    lines += _update_source(vehicle, "        ")
+    lines += [
+        "        if logging:",
+        f"            rows.append({LOG_ROW})",
+        "        throttle = 1.0",
+        f"        if rpm > {vehicle.engine.shift_rpm!r}:",
+        "            gear += 1",
+        f"            gear = min({vehicle.transmission.max_gear}, gear)",
+    ]
+    lines += _store_state("    ")
+    lines += [
+        "    if not logging:",
+        "        v.log.clear()",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def _invalid_gear(gear: int):
+    raise ValueError(f"Invalid gear: {gear}: int. Must be between -1 and the max gear.")
+
+
+class Specialized:
+    # the compiled functions of one vehicle, see the module docstring
+    def __init__(self, vehicle: Vehicle):
+        self.source = source(vehicle)
+        self.namespace = {"_invalid_gear": _invalid_gear}
+        exec(
+            compile(self.source, f"<specialized {id(vehicle):x}>", "exec"),
+            self.namespace,
+        )
+
+        self.step = self.namespace["step"]
+        self.run = self.namespace["run"]
+
+
+def specialize(vehicle: Vehicle) -> Specialized:
+    return Specialized(vehicle)
+
+
+if __name__ == "__main__":
+    import time
+
+    import cars
+
+    def generic_run(v, distance):
+        while v.odometer_miles < distance:
+            v.update()
+            v.current_throttle = 1.0
+            if v.current_engine_rpm > v.engine.shift_rpm:
+                v.current_gear = min(v.transmission.max_gear, v.current_gear + 1)
+
+    for name, factory in cars.CATALOG.items():
+        # same log, tick for tick
+        generic = factory()
+        fast_vehicle = factory()
+        fast = specialize(fast_vehicle)
+        generic_run(generic, 1.0)
+        fast.run(fast_vehicle, 1.0)
+        same = generic.log == fast_vehicle.log
+
+        # and stepping one tick at a time
+        stepped = factory()
+        while stepped.odometer_miles < 1.0:
+            fast.step(stepped)
+            stepped.current_throttle = 1.0
+            if stepped.current_engine_rpm > stepped.engine.shift_rpm:
+                stepped.current_gear = min(
+                    stepped.transmission.max_gear, stepped.current_gear + 1
+                )
+        same = same and stepped.log == generic.log
+
+        # throughput without logging
+        generic = factory()
+        generic.logging = False
+        start = time.perf_counter()
+        generic_run(generic, 1.0)
+        generic_time = time.perf_counter() - start
+
+        fast_vehicle = factory()
+        fast_vehicle.logging = False
+        start = time.perf_counter()
+        fast.run(fast_vehicle, 1.0)
+        fast_time = time.perf_counter() - start
+
+        print(
+            f"{name:<20} identical: {same}  "
+            f"{generic.ticks / generic_time:>10.0f} -> "
+            f"{fast_vehicle.ticks / fast_time:>10.0f} ticks/sec "
+            f"({generic_time / fast_time:.1f}x)"
+        )
@@ -0,0 +1,287 @@
+"""
+
+Surrogate model of quarter mile ET and trap speed.
+
+A full pass costs a couple of milliseconds, fine for one car but not for a
+search that looks at millions of setups. train() runs full passes over
+configs sampled around the cars in the catalog and fits a quadratic ridge
+regression of log(ET) and log(trap speed) on a handful of features:
+
+    power to weight, torque at the wheels off the line, gear spread,
+    speed at the shift rpm in 1st and in top gear, shift rpm against the
+    power peak, Cd * A per weight and the number of gears
+
+Uncertainty comes from a bootstrap ensemble (how much models fitted on
+resampled data disagree) plus the residual scatter on held out samples, which
+is itself modelled (a linear fit of log |error|) so regions the quadratic fits
+badly get wider error bars than the ones it fits well.
+A config with a feature outside the range seen in training gets an infinite
+uncertainty, the model is not trusted to extrapolate.
+
+Optimizers call screen() to throw out candidates the model is sure are slow
+before spending full passes on them, evaluate() answers from the model when
+it is confident enough and runs the real pass when it is not.
+
+"""
+
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import cars
+import race
+
+FEATURES = (
+    "power_to_weight",
+    "launch_thrust",
+    "gear_spread",
+    "first_gear_speed",
+    "top_gear_speed",
+    "shift_vs_peak",
+    "drag_area",
+    "gears",
+)
+
+
+def features(config: dict) -> list:
+    # the feature vector of a config, all logs so products become sums
+    engine = config["engine"]
+    gears = config["transmission"]["forward_gears"]
+    final_drive = config["transmission"]["final_drive"]
+    diameter = config["wheel"]["diameter_inches"]
+    weight = config["weight_lbs"]
+
+    peak_hp, peak_rpm = max(
+        (torque * rpm / 5252, rpm) for rpm, torque in engine["torque_curve"]
+    )
+    max_torque = max(torque for _, torque in engine["torque_curve"])
+    shift_rpm = engine["shift_rpm"]
+    mph_per_wheel_rpm = math.pi * diameter * 60 / 63360
+
+    return [
+        math.log(peak_hp / weight),
+        math.log(max_torque * gears[0] * final_drive / (diameter / 24) / weight),
+        math.log(gears[0] / gears[-1]),
+        math.log(shift_rpm / (gears[0] * final_drive) * mph_per_wheel_rpm),
+        math.log(shift_rpm / (gears[-1] * final_drive) * mph_per_wheel_rpm),
+        math.log(shift_rpm / peak_rpm),
+        math.log(config["drag_coefficient"] * config["frontal_area"] / weight),
+        float(len(gears)),
+    ]
+
+
+def _expand(x: np.ndarray) -> np.ndarray:
+    # quadratic design matrix, constant + linear + every product of two
+    count = x.shape[1]
+    rows, cols = np.triu_indices(count)
+    return np.hstack([np.ones((len(x), 1)), x, x[:, rows] * x[:, cols]])
+
+
+def sample_config(rng: random.Random, cars_or_configs: list) -> dict:
+    # a random setup around one of the given cars
+    config = cars.get_config(rng.choice(cars_or_configs))
+    scale = rng.uniform(0.5, 2.0)
+    config["engine"]["torque_curve"] = [
+        [rpm, torque * scale] for rpm, torque in config["engine"]["torque_curve"]
+    ]
+    config["weight_lbs"] *= rng.uniform(0.7, 1.4)
+    config["transmission"]["final_drive"] *= rng.uniform(0.8, 1.25)
+    config["transmission"]["forward_gears"] = [
+        ratio * rng.uniform(0.9, 1.1)
+        for ratio in config["transmission"]["forward_gears"]
+    ]
+    config["wheel"]["diameter_inches"] *= rng.uniform(0.9, 1.1)
+    config["drag_coefficient"] *= rng.uniform(0.7, 1.3)
+    config["frontal_area"] *= rng.uniform(0.8, 1.2)
+    return config
+
+
+class Surrogate:
+
+    def __init__(self, distance: float = 0.25, ridge: float = 1e-3, members: int = 16):
+        self.distance = distance
+        self.ridge = ridge
+        self.members = members
+
+        # filled in by fit()
+        self.mean = None
+        self.scale = None
+        self.low = None
+        self.high = None
+        self.weights = None  # (members, terms, 2)
+        self.residual = None  # rms error of log(ET), log(trap) on held out samples
+        self.error_weights = None  # linear model of log |error| over the features
+        self.simulations = 0
+
+    def _standardize(self, x: np.ndarray) -> np.ndarray:
+        return (x - self.mean) / self.scale
+
+    def _solve(self, design: np.ndarray, y: np.ndarray) -> np.ndarray:
+        penalty = self.ridge * np.eye(design.shape[1])
+        penalty[0, 0] = 0.0  # dont shrink the constant
+        return np.linalg.solve(design.T @ design + penalty, design.T @ y)
+
+    def fit(self, configs: list, results: np.ndarray, seed: int = 0) -> "Surrogate":
+        """
+        Fit to configs and their (ET, trap speed) results. One fifth of
+        the samples are held out to measure the residual error.
+        """
+
+        x = np.array([features(config) for config in configs])
+        y = np.log(np.asarray(results, dtype=float))
+        finite = np.all(np.isfinite(y), axis=1)
+        x, y = x[finite], y[finite]
+
+        self.mean = x.mean(axis=0)
+        self.scale = np.where(x.std(axis=0) > 0, x.std(axis=0), 1.0)
+        self.low = x.min(axis=0)
+        self.high = x.max(axis=0)
+        design = _expand(self._standardize(x))
+
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(x))
+        held_out, train = order[: len(x) // 5], order[len(x) // 5 :]
+        check = self._solve(design[train], y[train])
+        errors = design[held_out] @ check - y[held_out]
+        self.residual = np.sqrt(np.mean(errors**2, axis=0))
+
+        # E[log |e|] of a normal error is log(sigma) - 0.635, undone in predict
+        linear = design[held_out, : 1 + x.shape[1]]
+        self.error_weights = self._solve(linear, np.log(np.abs(errors) + 1e-12))
+
+        # the ensemble, every member fitted on a bootstrap resample of everything
+        self.weights = np.array(
+            [
+                self._solve(design[picks], y[picks])
+                for picks in rng.integers(0, len(x), (self.members, len(x)))
+            ]
+        )
+        return self
+
+    def predict_many(self, configs: list) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (predictions, sigmas), both (len(configs), 2) arrays of ET and trap.
+        Sigmas are one standard deviation in seconds / mph, inf outside the
+        training range.
+        """
+
+        x = np.array([features(config) for config in configs])
+        design = _expand(self._standardize(x))
+        logs = np.einsum("nt,mtk->mnk", design, self.weights)
+
+        prediction = np.exp(logs.mean(axis=0))
+        local = np.exp(design[:, : 1 + x.shape[1]] @ self.error_weights + 0.635)
+        sigma = prediction * np.sqrt(logs.var(axis=0) + local**2)
+
+        outside = np.any((x < self.low) | (x > self.high), axis=1)
+        sigma[outside] = np.inf
+        return prediction, sigma
+
+    def predict(self, config: dict) -> tuple[float, float, float, float]:
+        # (ET, trap, ET sigma, trap sigma) of one config
+        prediction, sigma = self.predict_many([config])
+        return (*prediction[0].tolist(), *sigma[0].tolist())
+
+    def evaluate(self, config: dict, max_sigma: float = 0.01) -> dict:
+        # the model's answer when its ET sigma is within max_sigma of the ET, else a full pass
+        et, trap, et_sigma, trap_sigma = self.predict(config)
+        if et_sigma <= max_sigma * et:
+            return {"et": et, "trap": trap, "sigma": et_sigma, "simulated": False}
+
+        self.simulations += 1
+        et, trap = race.evaluate(config, self.distance)
+        return {"et": et, "trap": trap, "sigma": 0.0, "simulated": True}
+
+    def screen(self, configs: list, keep: int, sigmas: float = 2.0) -> list:
+        """
+        Indexes of the configs worth a full pass: the keep quickest predicted,
+        plus any whose optimistic ET (sigmas below the prediction) could
+        still beat the slowest of those.
+        """
+
+        prediction, sigma = self.predict_many(configs)
+        et = prediction[:, 0]
+        best = np.argsort(et)[:keep]
+        cutoff = et[best].max()
+        hopeful = np.flatnonzero(et - sigmas * sigma[:, 0] <= cutoff)
+        return sorted(set(best.tolist()) | set(hopeful.tolist()))
+
+
+def training_data(
+    samples: int,
+    cars_or_configs: list | None = None,
+    distance: float = 0.25,
+    workers: int | None = None,
+    seed: int = 0,
+) -> tuple[list, np.ndarray]:
+    # sampled configs and their full pass (ET, trap speed)
+    rng = random.Random(seed)
+    cars_or_configs = cars_or_configs or list(cars.CATALOG)
+    configs = [sample_config(rng, cars_or_configs) for _ in range(samples)]
+
+    with ProcessPoolExecutor(workers) as pool:
+        results = pool.map(
+            race.evaluate,
+            configs,
+            [distance] * samples,
+            chunksize=max(1, samples // 64),
+        )
+        return configs, np.array(list(results))
+
+
+def train(
+    samples: int = 3000,
+    cars_or_configs: list | None = None,
+    distance: float = 0.25,
+    workers: int | None = None,
+    seed: int = 0,
+) -> Surrogate:
+    configs, results = training_data(samples, cars_or_configs, distance, workers, seed)
+    return Surrogate(distance).fit(configs, results, seed)
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    model = train()
+    print(f"trained on 3000 passes in {time.perf_counter() - start:.1f} sec")
+    print(
+        f"held out rms error: ET {model.residual[0] * 100:.2f}%"
+        f"  trap {model.residual[1] * 100:.2f}%"
+    )
+
+    # fresh setups the model has not seen
+    configs, results = training_data(500, seed=1)
+    prediction, sigma = model.predict_many(configs)
+    error = np.abs(prediction - results)
+    inside = np.isfinite(sigma[:, 0])
+    print(
+        f"test: median ET error {np.median(error[inside, 0]):.3f} sec,"
+        f" median trap error {np.median(error[inside, 1]):.2f} mph,"
+        f" ET within 2 sigma {np.mean(error[inside, 0] <= 2 * sigma[inside, 0]):.0%},"
+        f" {np.sum(~inside)} outside the training range"
+    )
+
+    start = time.perf_counter()
+    for config in configs:
+        model.predict(config)
+    single = (time.perf_counter() - start) / len(configs)
+    start = time.perf_counter()
+    model.predict_many(configs)
+    batch = (time.perf_counter() - start) / len(configs)
+    print(
+        f"prediction: {single * 1e6:.0f} us one at a time, {batch * 1e6:.1f} us batched"
+    )
+
+    answers = [model.evaluate(config) for config in configs]
+    print(f"evaluate(): {model.simulations} of {len(answers)} fell back to a full pass")
+
+    kept = model.screen(configs, keep=10)
+    true_best = set(np.argsort(results[:, 0])[:10].tolist())
+    print(
+        f"screen(): {len(kept)} of {len(configs)} kept for full passes,"
+        f" {len(true_best & set(kept))} of the true 10 quickest among them"
+    )
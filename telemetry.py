@@ -0,0 +1,220 @@
+"""
+
+Live telemetry, watch RPM, speed, gear and HP while a race is running.
+
+Every vehicle gets a fixed size ring buffer of samples, the simulation writes
+a sample every few ticks and the newest overwrite the oldest, so it never
+allocates however long it runs. A publisher sends whatever is new in the
+rings as UDP datagrams to a local port a few times a second. The socket is
+non-blocking and anything that cannot be sent right away (or nobody is
+listening) is dropped, the simulation never waits for a viewer.
+
+    python telemetry.py view            # plot whatever arrives
+    python telemetry.py view --text     # or just print it
+    python game.py --telemetry          # and race
+
+"""
+
+import argparse
+import json
+import socket
+import time
+from array import array
+from collections import deque
+
+CHANNELS = ("Time", "RPM", "Speed", "Gear", "HP", "Distance")
+
+DEFAULT_PORT = 8766
+
+# samples per datagram, keeps every datagram well under a safe UDP size
+DATAGRAM_SAMPLES = 64
+
+
+class TelemetryRing:
+    # the last capacity samples of one vehicle, one float per channel
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self.width = len(CHANNELS)
+        self.data = array("d", bytes(8 * capacity * self.width))
+        self.written = 0
+
+    def push(self, sample: tuple):
+        start = (self.written % self.capacity) * self.width
+        self.data[start : start + self.width] = array("d", sample)
+        self.written += 1
+
+    def since(self, count: int) -> list:
+        # samples written after the first count, as many as are still in the ring
+        first = max(count, self.written - self.capacity)
+        samples = []
+        for i in range(first, self.written):
+            start = (i % self.capacity) * self.width
+            samples.append(self.data[start : start + self.width].tolist())
+        return samples
+
+
+class Publisher:
+    """
+    Sends new ring samples to host:port, at most once per interval seconds.
+    Never blocks, a datagram that would is dropped and counted.
+    """
+
+    def __init__(
+        self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, interval: float = 0.05
+    ):
+        self.target = (host, port)
+        self.interval = interval
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.sent = {}  # ring name -> samples already sent
+        self.last_publish = 0.0
+        self.dropped = 0
+
+    def publish(self, rings: dict, force: bool = False):
+        now = time.perf_counter()
+        if not force and now - self.last_publish < self.interval:
+            return
+        self.last_publish = now
+
+        for name, ring in rings.items():
+            samples = ring.since(self.sent.get(name, 0))
+            self.sent[name] = ring.written
+            for start in range(0, len(samples), DATAGRAM_SAMPLES):
+                message = {
+                    "car": name,
+                    "samples": samples[start : start + DATAGRAM_SAMPLES],
+                }
+                try:
+                    self.socket.sendto(json.dumps(message).encode(), self.target)
+                except OSError:
+                    # full send buffer or nobody listening, the viewer just misses these
+                    self.dropped += 1
+
+    def close(self):
+        self.socket.close()
+
+
+class Telemetry:
+    """
+    Rings for any number of vehicles and a publisher for them.
+
+    sample() takes every every-th tick of a Vehicle, push() takes a sample
+    of anything else (the player's car in main.py is not a Vehicle).
+    """
+
+    def __init__(
+        self,
+        every: int = 6,
+        capacity: int = 4096,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PORT,
+        interval: float = 0.05,
+    ):
+        self.every = every
+        self.capacity = capacity
+        self.rings = {}
+        self.publisher = Publisher(host, port, interval)
+
+    def ring(self, name: str) -> TelemetryRing:
+        if name not in self.rings:
+            self.rings[name] = TelemetryRing(self.capacity)
+        return self.rings[name]
+
+    def sample(self, name: str, vehicle):
+        if vehicle.ticks % self.every:
+            return
+        rpm = vehicle.current_engine_rpm
+        self.push(
+            name,
+            (
+                vehicle.ticks * vehicle.tick_rate,
+                rpm,
+                vehicle.current_speed_mph,
+                vehicle.current_gear,
+                vehicle.engine.horsepower(rpm),
+                vehicle.odometer_miles,
+            ),
+        )
+
+    def push(self, name: str, sample: tuple):
+        self.ring(name).push(sample)
+        self.publisher.publish(self.rings)
+
+    def flush(self):
+        # send whatever is left, at the end of a run
+        self.publisher.publish(self.rings, force=True)
+
+    def close(self):
+        self.flush()
+        self.publisher.close()
+
+
+def receive(sock: socket.socket, traces: dict, window: int) -> bool:
+    # drain every datagram waiting on sock into traces, True if anything came
+    received = False
+    while True:
+        try:
+            data = sock.recv(65536)
+        except BlockingIOError:
+            return received
+        message = json.loads(data)
+        trace = traces.setdefault(message["car"], deque(maxlen=window))
+        trace.extend(message["samples"])
+        received = True
+
+
+def view(port: int = DEFAULT_PORT, window: int = 2000, text: bool = False):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", port))
+    sock.setblocking(False)
+    traces = {}
+    print(f"Listening for telemetry on udp port {port}")
+
+    if text:
+        while True:
+            if receive(sock, traces, window):
+                print(
+                    "  ".join(
+                        f"{name}: {trace[-1][1]:>6.0f} rpm {trace[-1][2]:>6.1f} mph"
+                        f" gear {trace[-1][3]:.0f}"
+                        for name, trace in traces.items()
+                    )
+                )
+            time.sleep(0.05)
+
+    import matplotlib.pyplot as plt
+
+    plotted = ("RPM", "Speed", "Gear", "HP")
+    figure, axes = plt.subplots(len(plotted), 1, sharex=True)
+    figure.canvas.manager.set_window_title("dragster telemetry")
+    for axis, channel in zip(axes, plotted):
+        axis.set_ylabel(channel)
+    axes[-1].set_xlabel("Time (s)")
+    lines = {}
+
+    plt.ion()
+    plt.show()
+    while plt.fignum_exists(figure.number):
+        if receive(sock, traces, window):
+            for name, trace in traces.items():
+                if name not in lines:
+                    lines[name] = [axis.plot([], [], label=name)[0] for axis in axes]
+                    axes[0].legend(loc="upper left")
+                columns = list(zip(*trace))
+                for line, channel in zip(lines[name], plotted):
+                    line.set_data(columns[0], columns[CHANNELS.index(channel)])
+            for axis in axes:
+                axis.relim()
+                axis.autoscale_view()
+        plt.pause(0.05)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live telemetry viewer")
+    parser.add_argument("command", choices=["view"])
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--window", type=int, default=2000)
+    parser.add_argument("--text", action="store_true")
+    args = parser.parse_args()
+
+    view(args.port, args.window, args.text)
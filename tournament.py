@@ -0,0 +1,277 @@
+"""
+
+Elimination bracket tournaments.
+
+A field of car variants races heads-up, the winner of every pair goes on to
+the next round until one is left. Two sets of rules:
+
+heads-up   first to the finish line wins, reaction time included
+bracket    every car runs against its own dial-in (the ET it says it will
+           run), the slower dial gets a head start of the difference. A car
+           that runs quicker than its dial has broken out and loses, unless
+           both did, then the smaller breakout wins
+
+Leaving before the light (a negative reaction time) is a red light and
+loses, if both go red the first one to go loses. A car that never makes it
+to the finish has no dial-in and loses to one that does, if neither does
+the quicker reaction wins.
+
+The air density can change from round to round as the weather does, a
+car's dial-in comes from its time trial in the first round's air.
+
+A pass only depends on the car and the conditions (distance and air
+density), so each is simulated once per set of conditions and memoized,
+however many rounds a car wins. Every round the passes it is missing go to a
+process pool as one batch, a 1024 car bracket with the same conditions all
+day costs 1024 passes for its 1023 matches.
+
+"""
+
+import argparse
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import cars
+import race
+
+RULES = ("heads-up", "bracket")
+
+
+def run_pass(config: dict, distance: float, air_density: float) -> tuple[float, float]:
+    # (ET, trap speed) of one pass, runs in the worker processes
+    return race.evaluate(config | {"air_density": air_density}, distance)
+
+
+class Entry:
+    # one car in the field, and its driver
+    def __init__(
+        self,
+        name: str,
+        config: dict,
+        reaction: float = 0.05,
+        consistency: float = 0.03,
+        dial_margin: float = 0.02,
+    ):
+        self.name = name
+        self.config = config
+        self.key = cars.config_key(config)
+        self.reaction = reaction  # mean reaction time off the tree
+        self.consistency = consistency  # spread of the reaction time
+        self.dial_margin = dial_margin  # how much slower than the car runs to dial in
+
+
+class Tournament:
+
+    def __init__(
+        self,
+        entries: list,
+        rules: str = "heads-up",
+        distance: float = 0.25,
+        air_density: float | list = 1.225,
+        workers: int | None = None,
+        seed: int = 0,
+    ):
+        if rules not in RULES:
+            raise ValueError(f"Unknown rules: {rules}. Must be one of {list(RULES)}.")
+
+        self.entries = list(entries)
+        self.rules = rules
+        self.distance = distance
+        # one air density per round, the last one repeats
+        if isinstance(air_density, (int, float)):
+            air_density = [air_density]
+        self.air_density = list(air_density)
+        self.workers = workers
+        self.rng = random.Random(seed)
+
+        # (config key, distance, air density) -> (ET, trap speed)
+        self.passes = {}
+        self.simulated = 0
+        self.rounds = []
+
+    def round_air_density(self, number: int) -> float:
+        return self.air_density[min(number, len(self.air_density) - 1)]
+
+    def conditions(self, entry: Entry, number: int) -> tuple:
+        return (entry.key, self.distance, self.round_air_density(number))
+
+    def simulate(self, entries: list, number: int, pool: ProcessPoolExecutor):
+        # every pass these entries need in this round that is not memoized yet,
+        # and their time trials, as one batch
+        missing = {}
+        for entry in entries:
+            for key in (self.conditions(entry, 0), self.conditions(entry, number)):
+                if key not in self.passes and key not in missing:
+                    missing[key] = entry.config
+
+        results = pool.map(
+            run_pass,
+            missing.values(),
+            [self.distance] * len(missing),
+            [key[2] for key in missing],
+            chunksize=max(1, len(missing) // 64),
+        )
+        for key, result in zip(missing, results):
+            self.passes[key] = result
+        self.simulated += len(missing)
+
+    def dial_in(self, entry: Entry) -> float | None:
+        # the car's ET plus the driver's margin, rounded up to a hundredth,
+        # None for a car that never finished its time trial
+        et = self.passes[self.conditions(entry, 0)][0]
+        if not math.isfinite(et):
+            return None
+        return -(-round((et + entry.dial_margin) * 1000) // 10) / 100
+
+    def match(self, left: Entry, right: Entry, number: int) -> dict:
+        # one heads-up race in round number, returns the winner and both lanes
+        lanes = []
+        for entry in (left, right):
+            et, speed = self.passes[self.conditions(entry, number)]
+            reaction = self.rng.gauss(entry.reaction, entry.consistency)
+            dial = self.dial_in(entry) if self.rules == "bracket" else 0.0
+            lanes.append(
+                {
+                    "entry": entry,
+                    "reaction": reaction,
+                    "et": et,
+                    "speed": speed,
+                    "dial": dial,
+                }
+            )
+
+        # the slower dial leaves first, both clocks start at the quicker car's green
+        dials = [lane["dial"] for lane in lanes if lane["dial"] is not None]
+        quickest = min(dials, default=0.0)
+        for lane in lanes:
+            lane["start"] = quickest - lane["dial"] if lane["dial"] is not None else 0.0
+            lane["finish"] = lane["start"] + lane["reaction"] + lane["et"]
+            lane["finished"] = math.isfinite(lane["et"])
+            lane["breakout"] = (
+                self.rules == "bracket"
+                and lane["dial"] is not None
+                and lane["et"] < lane["dial"]
+            )
+
+        a, b = lanes
+        if a["reaction"] < 0 or b["reaction"] < 0:
+            # red light, the one who left earliest loses
+            winner = b if a["reaction"] < b["reaction"] else a
+            reason = "red light"
+        elif not (a["finished"] and b["finished"]):
+            if a["finished"] or b["finished"]:
+                winner = a if a["finished"] else b
+            else:
+                winner = a if a["reaction"] <= b["reaction"] else b
+            reason = "did not finish"
+        elif a["breakout"] and b["breakout"]:
+            winner = a if a["dial"] - a["et"] < b["dial"] - b["et"] else b
+            reason = "smaller breakout"
+        elif a["breakout"] or b["breakout"]:
+            winner = b if a["breakout"] else a
+            reason = "breakout"
+        else:
+            winner = a if a["finish"] <= b["finish"] else b
+            reason = "first to the line"
+
+        return {"winner": winner["entry"], "lanes": lanes, "reason": reason}
+
+    def run(self) -> Entry:
+        field = list(self.entries)
+        with ProcessPoolExecutor(self.workers) as pool:
+            while len(field) > 1:
+                number = len(self.rounds)
+                self.simulate(field, number, pool)
+
+                matches = []
+                winners = []
+                for i in range(0, len(field) - 1, 2):
+                    result = self.match(field[i], field[i + 1], number)
+                    matches.append(result)
+                    winners.append(result["winner"])
+                if len(field) % 2:
+                    # odd one out gets a bye
+                    winners.append(field[-1])
+
+                self.rounds.append(matches)
+                field = winners
+
+        return field[0]
+
+
+def variant_field(size: int, seed: int = 0) -> list:
+    # size entries, each a catalog car with its own small changes and driver
+    rng = random.Random(seed)
+    names = list(cars.CATALOG)
+    entries = []
+    for i in range(size):
+        car = names[i % len(names)]
+        config = cars.get_config(car)
+        scale = rng.uniform(0.9, 1.1)
+        config["engine"]["torque_curve"] = [
+            [rpm, torque * scale] for rpm, torque in config["engine"]["torque_curve"]
+        ]
+        config["weight_lbs"] *= rng.uniform(0.95, 1.05)
+        config["transmission"]["final_drive"] *= rng.uniform(0.95, 1.05)
+        entries.append(
+            Entry(
+                f"{car}-{i}",
+                config,
+                reaction=rng.uniform(0.02, 0.12),
+                consistency=rng.uniform(0.01, 0.05),
+                dial_margin=rng.uniform(0.0, 0.05),
+            )
+        )
+    rng.shuffle(entries)
+    return entries
+
+
+def print_final(tournament: Tournament):
+    final = tournament.rounds[-1][0]
+    print("*" * 80)
+    print(f"FINAL ({tournament.rules}, {tournament.distance} mile)")
+    print("-" * 80)
+    for lane in final["lanes"]:
+        dial = ""
+        if tournament.rules == "bracket":
+            dial = (
+                "dial  --   " if lane["dial"] is None else f"dial {lane['dial']:.2f}  "
+            )
+        print(
+            f"{lane['entry'].name:<24} {dial}RT {lane['reaction']:.3f}"
+            f"  ET {lane['et']:.3f} @ {lane['speed']:.1f} mph"
+        )
+    print(f"winner: {final['winner'].name} ({final['reason']})")
+
+
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="Elimination bracket tournament")
+    parser.add_argument("--entries", type=int, default=1024)
+    parser.add_argument("--rules", choices=RULES, default="heads-up")
+    parser.add_argument("--distance", type=float, default=0.25)
+    parser.add_argument(
+        "--air-density", type=float, nargs="+", default=[1.225], help="per round"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tournament = Tournament(
+        variant_field(args.entries, args.seed),
+        args.rules,
+        args.distance,
+        args.air_density,
+        seed=args.seed,
+    )
+    start = time.perf_counter()
+    tournament.run()
+    elapsed = time.perf_counter() - start
+
+    print_final(tournament)
+    matches = sum(len(matches) for matches in tournament.rounds)
+    print(
+        f"{matches} matches in {len(tournament.rounds)} rounds,"
+        f" {tournament.simulated} passes simulated, {elapsed:.2f} sec"
+    )
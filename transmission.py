@@ -13,6 +13,10 @@ class Transmission:
         self.final_drive = final_drive
         self.max_gear = len(forward_gears)
 
+        # the ratio vectors, built by the first array call (the scalar path
+        # never needs numpy)
+        self._vectors = None
+
     def output_rpm(self, input_rpm: float, gear: int) -> float:
         o_r = self.output_ratio(gear)
         return input_rpm * o_r
@@ -43,6 +47,64 @@ class Transmission:
                 f"Invalid gear: {gear}: int. Must be between -1 and {self.max_gear}."
             )
 
+    # array versions, numpy arrays of gears (and rpms) converted in one go.
+    # the ratio vectors (built once, read only) are indexed by gear + 1:
+    # reverse, neutral, 1st, 2nd, ...
+
+    def _ratio_vectors(self) -> tuple:
+        if self._vectors is None:
+            import numpy as np
+
+            ratios = np.array(
+                [self.reverse_gear, 0.0] + list(self.forward_gears), dtype=float
+            )
+            input_ratios = self.final_drive * ratios
+            with np.errstate(divide="ignore"):
+                output_ratios = np.where(input_ratios == 0.0, 0.0, 1.0 / input_ratios)
+            for vector in (ratios, input_ratios, output_ratios):
+                vector.flags.writeable = False
+            self._vectors = (ratios, input_ratios, output_ratios)
+        return self._vectors
+
+    def ratio_vector(self):
+        return self._ratio_vectors()[0]
+
+    def input_ratio_vector(self):
+        return self._ratio_vectors()[1]
+
+    def output_ratio_vector(self):
+        return self._ratio_vectors()[2]
+
+    def _gear_index(self, gears):
+        import numpy as np
+
+        gears = np.asarray(gears)
+        bad = (gears < -1) | (gears > self.max_gear)
+        if gears.dtype.kind == "f":
+            # 0.5 (or nan) is no gear, astype(int) would quietly make it neutral
+            bad |= gears != np.floor(gears)
+        if np.any(bad):
+            gear = gears[bad].flat[0]
+            raise ValueError(
+                f"Invalid gear: {gear}: int. Must be between -1 and {self.max_gear}."
+            )
+        return gears.astype(int) + 1
+
+    def gear_ratio_array(self, gears):
+        return self.ratio_vector()[self._gear_index(gears)]
+
+    def input_ratio_array(self, gears):
+        return self.input_ratio_vector()[self._gear_index(gears)]
+
+    def output_ratio_array(self, gears):
+        return self.output_ratio_vector()[self._gear_index(gears)]
+
+    def input_rpm_array(self, output_rpm, gears):
+        return output_rpm * self.input_ratio_array(gears)
+
+    def output_rpm_array(self, input_rpm, gears):
+        return input_rpm * self.output_ratio_array(gears)
+
     def gear_name(self, gear: int) -> str:
         if gear == -1:
             return "R"
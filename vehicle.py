@@ -1,5 +1,7 @@
+from driver import RpmShift, UntilDistance
 from engine import Engine
 from transmission import Transmission
+from vehicle_log import RECORD, VehicleLog
 from wheel import Wheel
 
 KG_TO_LBS: float = 2.20462
@@ -23,21 +25,26 @@ class Vehicle:
         self.weight_kg: float = self.weight_lbs / KG_TO_LBS
         self.drag_coefficient = drag_coefficient
         self.drivetrain_efficiency = drivetrain_efficiency
+        self.tick_rate = 1 / 60  # simulation rate (Hz)
+        self.rolling_resistance = 0.015
+        self.frontal_area = 2.0  # m^2
+        self.air_density = 1.225  # kg/m^3
+        self.max_gear = self.transmission.max_gear
+        self.logging = True
+        self.log = VehicleLog(self)
+        self.reset()
+
+    def reset(self):
+        # back on the start line, the log is emptied but the same one is kept
         self.ticks: int = 0
         self.current_gear: int = 1
         self.current_speed_mph = 0.0
         self.current_engine_rpm = self.engine.launch_rpm
         self.current_throttle = 0.0
-        self.tick_rate = 1 / 60  # simulation rate (Hz)
-        self.rolling_resistance = 0.015
-        self.frontal_area = 2.0  # m^2
-        self.air_density = 1.225  # kg/m^3
         self.last_accel = 0.0
         self.last_decel = 0.0
         self.odometer_miles: float = 0.0
-        self.max_gear = self.transmission.max_gear
-        self.logging = True
-        self.log = []
+        self.log.clear()
 
     def log_record(self) -> dict:
         return {
@@ -53,13 +60,56 @@ class Vehicle:
             "Ticks": self.ticks,
         }
 
-    def readout(self) -> str:
+    # everything update() changes, the rest of a vehicle is its configuration
+    STATE = (
+        "ticks",
+        "current_gear",
+        "current_speed_mph",
+        "current_engine_rpm",
+        "current_throttle",
+        "last_accel",
+        "last_decel",
+        "odometer_miles",
+    )
 
-        message = []
-        for key, value in self.log_record().items():
-            message.append(f"{key}: {value}")
+    def snapshot(self) -> dict:
+        # a checkpoint of the dynamic state, and of which log and how far
+        state = {name: getattr(self, name) for name in self.STATE}
+        state["log"] = self.log
+        state["log_length"] = len(self.log)
+        return state
+
+    def restore(self, state: dict):
+        """
+        Go back to a snapshot. Restored into the vehicle it was taken from,
+        the log is cut back to where it was then. Restored into a different
+        vehicle (the same car with a changed setup) that vehicle's log is
+        cleared, none of its history led up to the snapshot, and it logs
+        only the ticks it runs from there on.
+        """
+
+        for name in self.STATE:
+            setattr(self, name, state[name])
+        if state["log"] is self.log:
+            del self.log[state["log_length"] :]
+        else:
+            self.log.clear()
 
-        return ", ".join(message)
+    def readout(self) -> str:
+        # formatted straight from the state, without building a record first
+        values = (
+            self.ticks * self.tick_rate,
+            self.last_accel,
+            self.last_decel,
+            self.current_engine_rpm,
+            self.current_gear,
+            self.current_throttle,
+            self.engine.horsepower(self.current_engine_rpm),
+            self.current_speed_mph,
+            self.odometer_miles,
+            self.ticks,
+        )
+        return ", ".join(f"{key}: {value}" for key, value in zip(RECORD, values))
 
     def update(self):
         self.ticks += 1
@@ -83,11 +133,117 @@ class Vehicle:
 
             self.current_engine_rpm = self.engine_rpm_from_speed_and_gear()
 
+        # log the raw state, see vehicle_log.py for the derived channels
         if self.logging:
-            self.log.append(self.log_record())
-        else:
+            self.log.rows.append(
+                (
+                    self.ticks,
+                    self.last_accel,
+                    self.last_decel,
+                    self.current_engine_rpm,
+                    self.current_gear,
+                    self.current_throttle,
+                    self.current_speed_mph,
+                    self.odometer_miles,
+                )
+            )
+        elif self.log.rows:
             # clear the log if not logging
-            self.log = []
+            self.log.rows.clear()
+
+    def run(
+        self,
+        n_ticks: int | None = None,
+        until=None,
+        shift_policy=None,
+        throttle: float | None = 1.0,
+        logging: bool | None = None,
+        max_time: float = 600.0,
+    ) -> dict:
+        """
+        Advance many ticks in one loop, the way the race drivers do.
+
+        Each tick: update(), set the throttle (None leaves it alone), let the
+        shift policy pick the gear, then stop once until(vehicle) is True or
+        n_ticks have run. The shift policy defaults to shifting at the
+        engine's shift rpm, see driver.py for the others. logging overrides
+        self.logging for the duration of the run. Without n_ticks the run
+        gives up after max_time seconds of its own whether until was met or
+        not ("Stopped" is False then).
+
+        Returns a summary of where the run ended up.
+        """
+
+        if n_ticks is None and until is None:
+            raise ValueError("run() needs n_ticks, until or both.")
+
+        if shift_policy is None:
+            shift_policy = RpmShift()
+
+        start_ticks = self.ticks
+        if n_ticks is None:
+            # an until that is never met (a car that cannot reach the speed,
+            # NoShift on the limiter) still ends, like run_pass's max_time
+            n_ticks = int(max_time / self.tick_rate)
+        max_ticks = self.ticks + n_ticks
+        top_speed = self.current_speed_mph
+        shifts = 0
+        stopped = False
+
+        # the built in shift policy and stop condition are checked inline
+        update = self.update
+        rpm_shift = type(shift_policy) is RpmShift
+        shift_rpm = self.engine.shift_rpm
+        if rpm_shift and shift_policy.shift_rpm is not None:
+            shift_rpm = shift_policy.shift_rpm
+        max_gear = self.transmission.max_gear
+        stop_miles = until.miles if type(until) is UntilDistance else None
+
+        was_logging = self.logging
+        if logging is not None:
+            self.logging = logging
+        try:
+            while self.ticks < max_ticks:
+                update()
+
+                if throttle is not None:
+                    self.current_throttle = throttle
+
+                gear = self.current_gear
+                if rpm_shift:
+                    if self.current_engine_rpm > shift_rpm:
+                        gear = min(max_gear, gear + 1)
+                else:
+                    gear = shift_policy(self)
+
+                if gear != self.current_gear:
+                    self.current_gear = gear
+                    shifts += 1
+
+                if self.current_speed_mph > top_speed:
+                    top_speed = self.current_speed_mph
+
+                if stop_miles is not None:
+                    if self.odometer_miles >= stop_miles:
+                        stopped = True
+                        break
+                elif until is not None and until(self):
+                    stopped = True
+                    break
+        finally:
+            self.logging = was_logging
+
+        return {
+            "Ticks": self.ticks - start_ticks,
+            "Time": self.ticks * self.tick_rate,
+            "Speed": self.current_speed_mph,
+            "TopSpeed": top_speed,
+            "Distance": self.odometer_miles,
+            "Gear": self.current_gear,
+            "RPM": self.current_engine_rpm,
+            "Shifts": shifts,
+            "Stopped": stopped,
+        }
 
     def calculate_acceleration(self) -> float:
         # calculate and return the acceleration of the vehicle
@@ -142,7 +298,7 @@ class Vehicle:
         """
         # unit conversions
         mass = self.weight_kg  # kg
-        Ad = 1.225  # kg/m^3 (standard air density at sea level)
+        Ad = self.air_density  # kg/m^3 (1.225 is standard at sea level)
         iv = self.current_speed_mph * 0.44704  # Convert mph to m/s
         g = 9.81  # m/s^2 (gravity)
         Cd = self.drag_coefficient
@@ -209,21 +365,15 @@ if __name__ == "__main__":
     print(vehicle.readout())
 
     print("...")
-    while (
-        vehicle.current_speed_mph > 0
-        and vehicle.current_speed_mph < 120
-        and vehicle.odometer_miles < 0.25
-    ):
-        # if vehicle.ticks == 50:
-        # vehicle.current_throttle = 0.0
-        if vehicle.ticks % 20 == 0:
-            print(vehicle.readout())
-
-        if vehicle.current_engine_rpm > vehicle.engine.shift_rpm:
-            vehicle.current_gear += 1
 
-        # if vehicle.current_speed_mph > 100:
-        #     vehicle.current_throttle = 0.0
+    # run to a quarter mile (or 120 mph), printing every 20 ticks
+    def stop(v: Vehicle) -> bool:
+        return v.current_speed_mph >= 120 or v.odometer_miles >= 0.25
 
-        vehicle.update()
+    while True:
+        print(vehicle.readout())
+        summary = vehicle.run(20, until=stop)
+        if summary["Stopped"]:
+            break
     print(vehicle.readout())
+    print(summary)
@@ -0,0 +1,107 @@
+"""
+
+The per tick log of a vehicle, kept as raw state.
+
+Logging used to build a dict for every tick, horsepower included. Now a tick
+is logged as one tuple of the raw state and the derived channels (Time and
+HP) are only worked out when the log is read. Reading it still gives the same
+dicts as Vehicle.log_record(), so code that loops over a log or writes it to
+csv does not change. columns() gives every channel as numpy arrays instead,
+the derived ones computed for the whole log at once.
+
+Derived channels use the vehicle's engine and tick rate at the time of
+reading.
+
+"""
+
+from bisect import bisect_left
+from operator import itemgetter
+
+# what a row holds, in order (Vehicle.update() and specialize.LOG_ROW write them)
+RAW = ("Ticks", "LA", "LD", "RPM", "Gear", "TPS", "Speed", "Distance")
+
+# the order of a log_record() dict
+RECORD = ("Time", "LA", "LD", "RPM", "Gear", "TPS", "HP", "Speed", "Distance", "Ticks")
+
+_distance = itemgetter(RAW.index("Distance"))
+
+
+class VehicleLog:
+
+    def __init__(self, vehicle):
+        self.vehicle = vehicle
+        self.rows = []
+
+    def record(self, row: tuple) -> dict:
+        # the log_record() dict of a row
+        ticks, la, ld, rpm, gear, tps, speed, distance = row
+        return {
+            "Time": ticks * self.vehicle.tick_rate,
+            "LA": la,
+            "LD": ld,
+            "RPM": rpm,
+            "Gear": gear,
+            "TPS": tps,
+            "HP": self.vehicle.engine.horsepower(rpm),
+            "Speed": speed,
+            "Distance": distance,
+            "Ticks": ticks,
+        }
+
+    def append(self, record: dict):
+        # a log_record() style dict, for code that still builds them
+        self.rows.append(tuple(record[name] for name in RAW))
+
+    def clear(self):
+        self.rows.clear()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __bool__(self) -> bool:
+        return bool(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.record(row) for row in self.rows[index]]
+        return self.record(self.rows[index])
+
+    def __delitem__(self, index):
+        del self.rows[index]
+
+    def __iter__(self):
+        record = self.record
+        for row in self.rows:
+            yield record(row)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, VehicleLog):
+            return self.rows == other.rows
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    def crossing(self, distance: float) -> dict | None:
+        # the first record at or past distance (miles), None if it never got there
+        index = bisect_left(self.rows, distance, key=_distance)
+        if index == len(self.rows):
+            return None
+        return self.record(self.rows[index])
+
+    def columns(self) -> dict:
+        # every channel of the whole log as a numpy array, keyed like a record,
+        # plus WheelRPM
+        import numpy as np
+
+        raw = np.array(self.rows, dtype=float).reshape(-1, len(RAW))
+        columns = {name: raw[:, i] for i, name in enumerate(RAW)}
+        columns["Ticks"] = columns["Ticks"].astype(int)
+        columns["Gear"] = columns["Gear"].astype(int)
+        columns["Time"] = columns["Ticks"] * self.vehicle.tick_rate
+        columns["HP"] = self.vehicle.engine.horsepower_array(columns["RPM"])
+        columns["WheelRPM"] = self.vehicle.wheel.rpm_from_speed_array(columns["Speed"])
+        return {name: columns[name] for name in RECORD + ("WheelRPM",)}
+
+    def readout(self, index: int = -1) -> str:
+        # one logged tick formatted like Vehicle.readout(), only when asked for
+        return ", ".join(f"{key}: {value}" for key, value in self[index].items())
@@ -0,0 +1,154 @@
+"""
+
+Reusable vehicles for processes that run many passes.
+
+Building a vehicle from a config builds its Engine, Transmission and Wheel
+and copies the torque curve and gears, for every pass. A VehiclePool keeps
+the vehicles it handed out once they are given back, and hands the same one
+out again, reset, the next time that config is asked for. Configs that only
+differ in cars.SETTINGS (air density and the like) share vehicles, those are
+set again on every acquire.
+
+Each worker process gets its own pool the first time it calls borrow(), the
+configs it saw most recently stay pooled.
+
+"""
+
+import json
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import cars
+from vehicle import Vehicle
+
+# what a vehicle has for a setting the config leaves out
+_BUILT = {key: getattr(Vehicle(), key) for key in cars.SETTINGS}
+
+
+def build_key(config: dict) -> str:
+    # identity of everything that needs building, settings left out. Only
+    # compared inside one process, the json itself will do (no hashing)
+    return json.dumps(
+        {key: value for key, value in config.items() if key not in cars.SETTINGS},
+        sort_keys=True,
+    )
+
+
+class VehiclePool:
+
+    def __init__(self, configs: int = 64):
+        self.configs = configs  # how many configs to keep vehicles for
+        # build key -> vehicles given back, least recent first
+        self.idle = OrderedDict()
+        self.keys = {}  # id of a vehicle handed out -> its build key
+        self.built = 0
+        self.reused = 0
+
+    def acquire(self, config: dict, logging: bool = True) -> Vehicle:
+        # a vehicle of config on the start line, give it back with release()
+        key = build_key(config)
+        idle = self.idle.get(key)
+        if idle:
+            vehicle = idle.pop()
+            self.idle.move_to_end(key)
+            vehicle.reset()
+            for setting in cars.SETTINGS:
+                setattr(vehicle, setting, config.get(setting, _BUILT[setting]))
+            self.reused += 1
+        else:
+            vehicle = cars.from_config(config)
+            self.built += 1
+
+        vehicle.logging = logging
+        self.keys[id(vehicle)] = key
+        return vehicle
+
+    def release(self, vehicle: Vehicle):
+        key = self.keys.pop(id(vehicle), None)
+        if key is None:
+            raise ValueError("That vehicle did not come from this pool.")
+
+        self.idle.setdefault(key, []).append(vehicle)
+        self.idle.move_to_end(key)
+        while len(self.idle) > self.configs:
+            self.idle.popitem(last=False)
+
+    @contextmanager
+    def vehicle(self, config: dict, logging: bool = True):
+        vehicle = self.acquire(config, logging)
+        try:
+            yield vehicle
+        finally:
+            self.release(vehicle)
+
+
+# the pool of this process
+_pool = None
+
+
+def borrow(config: dict, logging: bool = False):
+    """
+    with borrow(config) as vehicle: ... a vehicle from this process' pool,
+    not logging unless asked to.
+    """
+
+    global _pool
+    if _pool is None:
+        _pool = VehiclePool()
+    return _pool.vehicle(config, logging)
+
+
+if __name__ == "__main__":
+    import gc
+    import time
+
+    import race
+
+    # the same few cars over and over, like a tournament or a batch with
+    # several conditions per car
+    configs = [cars.get_config(name) for name in cars.CATALOG]
+    densities = (1.225, 1.15, 1.1)
+    passes = [
+        (config | {"air_density": density}, 0.25)
+        for _ in range(20)
+        for config in configs
+        for density in densities
+    ]
+
+    def fresh(config, distance):
+        vehicle = cars.from_config(config)
+        vehicle.logging = False
+        return race.finish_time(vehicle, distance)
+
+    def pooled(config, distance):
+        with borrow(config) as vehicle:
+            return race.finish_time(vehicle, distance)
+
+    for name, run in (("fresh", fresh), ("pooled", pooled)):
+        gc.collect()
+        collections = sum(stats["collections"] for stats in gc.get_stats())
+        start = time.perf_counter()
+        results = [run(config, distance) for config, distance in passes]
+        elapsed = time.perf_counter() - start
+        collections = sum(s["collections"] for s in gc.get_stats()) - collections
+        print(
+            f"{name:<8} {len(passes)} passes {elapsed:.2f} sec,"
+            f" {collections} gc collections"
+        )
+        if name == "fresh":
+            expected = results
+    print(f"same results: {results == expected}")
+    print(f"built {_pool.built} vehicles, reused {_pool.reused} times")
+
+    # and what building costs next to a reset
+    config = configs[2]
+    count = 2000
+    start = time.perf_counter()
+    for _ in range(count):
+        cars.from_config(config)
+    build = (time.perf_counter() - start) / count
+    start = time.perf_counter()
+    for _ in range(count):
+        _pool.release(_pool.acquire(config))
+    reuse = (time.perf_counter() - start) / count
+    print(f"from_config {build * 1e6:.1f} us, acquire + release {reuse * 1e6:.1f} us")
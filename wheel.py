@@ -49,12 +49,29 @@ class Wheel:
     def get_diameter_inches(self) -> float:
         return self.__diameter_inches
 
+    @property
+    def mph_per_rpm(self) -> float:
+        # speed_mph(1.0), for code that does the conversion itself
+        return self.__rpm_to_mph_ratio
+
     def speed_mph(self, input_rpm: float) -> float:
         return self.__rpm_to_mph_ratio * input_rpm
 
     def rpm_from_speed(self, speed_mph: float) -> float:
         return speed_mph / self.__rpm_to_mph_ratio
 
+    # array versions, numpy arrays (or anything numpy takes) of rpms / speeds
+
+    def speed_mph_array(self, input_rpm):
+        import numpy as np
+
+        return self.__rpm_to_mph_ratio * np.asarray(input_rpm, dtype=float)
+
+    def rpm_from_speed_array(self, speed_mph):
+        import numpy as np
+
+        return np.asarray(speed_mph, dtype=float) / self.__rpm_to_mph_ratio
+
 
 def wheel_report(wheel: Wheel, title: str | None = None) -> str:
 